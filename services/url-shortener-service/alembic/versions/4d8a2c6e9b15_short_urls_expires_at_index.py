@@ -0,0 +1,60 @@
+"""short_urls expires_at index for the expiry sweeper
+
+Revision ID: 4d8a2c6e9b15
+Revises: 7b1e4d9a3f20
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitioning import partitioned_index_ddl, partitions_of
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d8a2c6e9b15'
+down_revision: Union[str, Sequence[str], None] = '7b1e4d9a3f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _partitions() -> Optional[list[str]]:
+    # Offline SQL is rendered for a plain short_urls.
+    if op.get_context().as_sql:
+        return None
+    return partitions_of(op.get_bind(), 'short_urls')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    partitions = _partitions()
+    with op.get_context().autocommit_block():
+        if partitions is not None:
+            for ddl in partitioned_index_ddl(
+                'ix_short_urls_expires_at', 'short_urls', '(expires_at) WHERE expires_at IS NOT NULL', partitions
+            ):
+                op.execute(ddl)
+            return
+        op.create_index(
+            'ix_short_urls_expires_at',
+            'short_urls',
+            ['expires_at'],
+            unique=False,
+            postgresql_where=sa.text('expires_at IS NOT NULL'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # A partitioned index cannot be dropped concurrently; dropping it takes
+    # the partitions' indexes with it.
+    concurrently = _partitions() is None
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_short_urls_expires_at',
+            table_name='short_urls',
+            postgresql_concurrently=concurrently,
+        )
@@ -0,0 +1,107 @@
+"""schema catch-up and covering redirect index
+
+Revision ID: 7b1e4d9a3f20
+Revises: 2c3f6d51c164
+Create Date: 2026-10-19 09:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7b1e4d9a3f20'
+down_revision: Union[str, Sequence[str], None] = '2c3f6d51c164'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('role', sa.String(length=50), server_default='user', nullable=False))
+    op.alter_column(
+        'users', 'created_at',
+        type_=sa.DateTime(timezone=True),
+        server_default=sa.text('now()'),
+        postgresql_using="created_at AT TIME ZONE 'UTC'",
+    )
+    op.alter_column(
+        'users', 'last_login_at',
+        type_=sa.DateTime(timezone=True),
+        postgresql_using="last_login_at AT TIME ZONE 'UTC'",
+    )
+
+    op.add_column('short_urls', sa.Column('click_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('short_urls', sa.Column('is_active', sa.Boolean(), server_default=sa.true(), nullable=False))
+    op.add_column('short_urls', sa.Column('user_id', sa.Integer(), nullable=True))
+    op.add_column('short_urls', sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_foreign_key(
+        'short_urls_user_id_fkey', 'short_urls', 'users',
+        ['user_id'], ['id'], ondelete='SET NULL',
+    )
+    op.create_index(op.f('ix_short_urls_is_active'), 'short_urls', ['is_active'], unique=False)
+    op.create_index(op.f('ix_short_urls_user_id'), 'short_urls', ['user_id'], unique=False)
+
+    op.drop_constraint('ck_short_urls_redirect_type', 'short_urls', type_='check')
+    op.create_check_constraint(
+        'ck_short_urls_redirect_type', 'short_urls',
+        'redirect_type IN (301, 302, 303)',
+    )
+
+    op.create_index(op.f('ix_short_urls_short_code'), 'short_urls', ['short_code'], unique=True)
+    op.drop_constraint('short_urls_short_code_key', 'short_urls', type_='unique')
+
+    # Built outside the migration transaction so a large table keeps taking
+    # writes while the index is created.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_short_urls_redirect_lookup',
+            'short_urls',
+            ['short_code'],
+            unique=False,
+            postgresql_include=['original_url', 'redirect_type', 'expires_at'],
+            postgresql_where=sa.text('is_active'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_short_urls_redirect_lookup',
+            table_name='short_urls',
+            postgresql_concurrently=True,
+        )
+
+    op.create_unique_constraint('short_urls_short_code_key', 'short_urls', ['short_code'])
+    op.drop_index(op.f('ix_short_urls_short_code'), table_name='short_urls')
+
+    op.drop_constraint('ck_short_urls_redirect_type', 'short_urls', type_='check')
+    op.create_check_constraint(
+        'ck_short_urls_redirect_type', 'short_urls',
+        'redirect_type IN (301, 302)',
+    )
+
+    op.drop_index(op.f('ix_short_urls_user_id'), table_name='short_urls')
+    op.drop_index(op.f('ix_short_urls_is_active'), table_name='short_urls')
+    op.drop_constraint('short_urls_user_id_fkey', 'short_urls', type_='foreignkey')
+    op.drop_column('short_urls', 'updated_at')
+    op.drop_column('short_urls', 'user_id')
+    op.drop_column('short_urls', 'is_active')
+    op.drop_column('short_urls', 'click_count')
+
+    op.alter_column(
+        'users', 'last_login_at',
+        type_=sa.DateTime(),
+        postgresql_using="last_login_at AT TIME ZONE 'UTC'",
+    )
+    op.alter_column(
+        'users', 'created_at',
+        type_=sa.DateTime(),
+        server_default=None,
+        postgresql_using="created_at AT TIME ZONE 'UTC'",
+    )
+    op.drop_column('users', 'role')
@@ -0,0 +1,110 @@
+"""cold link archive table and last_accessed_at
+
+Revision ID: 9c3e7f1a2b48
+Revises: 4d8a2c6e9b15
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.db.partitioning import partitioned_index_ddl, partitions_of
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c3e7f1a2b48'
+down_revision: Union[str, Sequence[str], None] = '4d8a2c6e9b15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _partitions() -> Optional[list[str]]:
+    # Offline SQL is rendered for a plain short_urls.
+    if op.get_context().as_sql:
+        return None
+    return partitions_of(op.get_bind(), 'short_urls')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # now() is evaluated once here, so existing rows start their idle clock
+    # at migration time without rewriting the table.
+    op.add_column(
+        'short_urls',
+        sa.Column('last_accessed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+
+    # The mirror trigger of an unfinished partition migration copies every
+    # model column, last_accessed_at included.
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('short_urls_new') IS NOT NULL THEN
+                ALTER TABLE short_urls_new ADD COLUMN IF NOT EXISTS last_accessed_at timestamp with time zone DEFAULT now() NOT NULL;
+            END IF;
+        END $$;
+        """
+    )
+
+    op.create_table(
+        'short_urls_archive',
+        sa.Column('short_code', sa.String(length=12), nullable=False),
+        sa.Column('original_url', sa.String(length=2048), nullable=False),
+        sa.Column('normalized_url', sa.String(length=2048), nullable=False),
+        sa.Column('redirect_type', sa.Integer(), nullable=False),
+        sa.Column('click_count', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('last_accessed_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('short_code'),
+    )
+    op.create_index(op.f('ix_short_urls_archive_user_id'), 'short_urls_archive', ['user_id'], unique=False)
+
+    partitions = _partitions()
+    with op.get_context().autocommit_block():
+        if partitions is not None:
+            for ddl in partitioned_index_ddl(
+                'ix_short_urls_last_accessed_at', 'short_urls', '(last_accessed_at)', partitions
+            ):
+                op.execute(ddl)
+            return
+        op.create_index(
+            'ix_short_urls_last_accessed_at',
+            'short_urls',
+            ['last_accessed_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # A partitioned index cannot be dropped concurrently.
+    concurrently = _partitions() is None
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_short_urls_last_accessed_at',
+            table_name='short_urls',
+            postgresql_concurrently=concurrently,
+        )
+
+    op.drop_index(op.f('ix_short_urls_archive_user_id'), table_name='short_urls_archive')
+    op.drop_table('short_urls_archive')
+    op.execute(
+        """
+        DO $$
+        BEGIN
+            IF to_regclass('short_urls_new') IS NOT NULL THEN
+                ALTER TABLE short_urls_new DROP COLUMN IF EXISTS last_accessed_at;
+            END IF;
+        END $$;
+        """
+    )
+    op.drop_column('short_urls', 'last_accessed_at')
@@ -3,6 +3,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 
+from app.db.routing import pin_user_to_primary_if_recent_write
 from app.db.session import get_db
 from app.models.url_models import User
 from app.repositories.user_repo import UserRepository
@@ -48,6 +49,8 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    await pin_user_to_primary_if_recent_write(db, int(user_id))
+
     user_repo = UserRepository(db)
     user = user_repo.get_by_id(int(user_id))
 
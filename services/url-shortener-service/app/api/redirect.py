@@ -4,6 +4,7 @@ from fastapi.responses import RedirectResponse
 from sqlalchemy.orm import Session
 import logging
 
+from app.core.deadline import DeadlineExceeded
 from app.db.session import get_db
 from app.repositories.short_url_repo import ShortUrlRepository
 from app.services.short_url_service import ShortUrlService
@@ -57,7 +58,7 @@ async def redirect_to_original(
             status_code=short_url.redirect_type
         )
 
-    except HTTPException:
+    except (HTTPException, DeadlineExceeded):
         raise
     except Exception as e:
         logger.error(f"Redirect error: {str(e)}", exc_info=True)
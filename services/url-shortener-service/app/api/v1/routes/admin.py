@@ -0,0 +1,118 @@
+import asyncio
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from app.api.deps import require_role
+from app.core import memory, profiler
+from app.core.loop_monitor import loop_monitor
+from app.core.memory import allocation_tracker
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.redis_keys import request_profile_key
+from app.core.settings import settings
+from app.events.publisher import event_publisher
+from app.models.url_models import User
+from app.services.url_cache import hot_keys, hot_url_pins, local_url_cache
+
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+# Hot links as this worker sees them, with their decayed read rate; each
+# worker tracks its own traffic.
+@router.get("/hot-keys")
+async def list_hot_keys(current_user: User = Depends(require_role("admin"))):
+    return hot_keys.status()
+
+
+# Recent times the event loop was caught blocked, with the stack that held
+# it; needs LOOP_BLOCK_CAPTURE_ENABLED.
+@router.get("/loop-blocks")
+async def list_loop_blocks(current_user: User = Depends(require_role("admin"))):
+    return {**loop_monitor.status(), "blocks": list(loop_monitor.blocks)}
+
+
+# Samples every thread of the worker that happens to serve this request and
+# returns collapsed stacks, e.g. for flamegraph.pl or speedscope.
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=settings.PROFILING_MAX_SECONDS),
+    interval_ms: float = Query(settings.PROFILING_INTERVAL_MS, ge=1, le=1000),
+    current_user: User = Depends(require_role("admin")),
+):
+    samples = await profiler.profile_worker(seconds, interval_ms / 1000)
+    if samples is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running in this worker")
+    return PlainTextResponse(
+        profiler.collapsed(samples),
+        headers={"Content-Disposition": f'attachment; filename="worker-{os.getpid()}.collapsed"'},
+    )
+
+
+# A single request's profile, recorded because it carried X-Profile-Token.
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_request_profile(profile_id: str, current_user: User = Depends(require_role("admin"))):
+    try:
+        body = await RedisSingleton.execute(lambda r: r.get(request_profile_key(profile_id)))
+    except RedisUnavailableError:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Profile store unavailable")
+    if body is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found or expired")
+    return PlainTextResponse(
+        body,
+        headers={"Content-Disposition": f'attachment; filename="request-{profile_id}.collapsed"'},
+    )
+
+
+# What this worker holds on to. The usual suspects for growth are listed by
+# name; with orm=true the garbage collector is also searched for live
+# sessions and the rows in their identity maps, which is slower and runs in
+# a thread so the walk does not stall the event loop.
+@router.get("/memory")
+async def memory_counters(
+    orm: bool = Query(False),
+    current_user: User = Depends(require_role("admin")),
+):
+    result = {
+        **memory.counters(),
+        "pending_publish_tasks": event_publisher.pending,
+        "spooled_events": event_publisher.spooled,
+        "local_url_cache": len(local_url_cache),
+        "hot_url_pins": len(hot_url_pins),
+        "hot_keys_tracked": hot_keys.status()["tracked"],
+        "tracemalloc": allocation_tracker.tracing,
+    }
+    if orm:
+        result["orm"] = await asyncio.to_thread(memory.orm_counters)
+    return result
+
+
+# Starts tracemalloc in this worker and takes the baseline that later
+# reports compare against; if it is already running, only the baseline
+# moves. frames > 1 keeps deeper tracebacks at a higher cost.
+@router.post("/memory/tracemalloc", status_code=status.HTTP_204_NO_CONTENT)
+async def start_tracemalloc(
+    frames: int = Query(1, ge=1, le=50),
+    current_user: User = Depends(require_role("admin")),
+):
+    await asyncio.to_thread(allocation_tracker.start, frames)
+
+
+# Top allocation sites and the ones that grew since the baseline. With
+# reset=true the baseline moves to now, so polling shows growth per interval.
+@router.get("/memory/tracemalloc")
+async def tracemalloc_report(
+    limit: int = Query(25, ge=1, le=500),
+    reset: bool = Query(False),
+    current_user: User = Depends(require_role("admin")),
+):
+    report = await asyncio.to_thread(allocation_tracker.report, limit, reset)
+    if report is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="tracemalloc is not running in this worker")
+    return report
+
+
+@router.delete("/memory/tracemalloc", status_code=status.HTTP_204_NO_CONTENT)
+async def stop_tracemalloc(current_user: User = Depends(require_role("admin"))):
+    allocation_tracker.stop()
@@ -11,6 +11,7 @@ from app.api.v1.schema_dtos import (
     UserResponse,
     MessageResponse,
 )
+from app.core.deadline import DeadlineExceeded
 from app.db.session import get_db
 from app.repositories.user_repo import UserRepository
 from app.services.auth_service import AuthService
@@ -38,6 +39,8 @@ async def register(payload: UserRegisterRequest, db: Session = Depends(get_db)):
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e),
         )
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"Registration error: {str(e)}", exc_info=True)
         raise HTTPException(
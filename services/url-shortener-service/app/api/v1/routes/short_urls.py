@@ -8,13 +8,17 @@ from app.api.v1.schema_dtos import (
     ShortURLCreateResponse,
     ShortURLUpdateRequest,
     ShortURLListResponse,
+    ShortURLResolveRequest,
+    ShortURLResolveResponse,
+    ResolvedShortURL,
     MessageResponse,
 )
+from app.core.deadline import DeadlineExceeded
 from app.core.settings import settings
 from app.core.redis import RedisSingleton
 from app.repositories.short_url_repo import ShortUrlRepository
 from app.services.short_url_service import ShortUrlService
-from app.models.url_models import ShortUrl, User
+from app.models.url_models import User, expiry_passed
 from app.db.session import get_db
 from app.api.deps import get_current_user, get_current_user_optional
 
@@ -23,7 +27,8 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/short-urls", tags=["short-urls"])
 
 
-def _build_short_url_response(short_url: ShortUrl) -> ShortURLCreateResponse:
+# Takes a ShortUrl, an ArchivedShortUrl or a listing row.
+def _build_short_url_response(short_url, archived: bool = False) -> ShortURLCreateResponse:
     domain = str(settings.SHORT_URL_DOMAIN or 'http://localhost:8000').rstrip('/')
     return ShortURLCreateResponse(
         short_url=f"{domain}/{short_url.short_code}",
@@ -32,9 +37,10 @@ def _build_short_url_response(short_url: ShortUrl) -> ShortURLCreateResponse:
         created_at=short_url.created_at,
         expires_at=short_url.expires_at,
         redirect_type=short_url.redirect_type,
-        active=short_url.is_active and not short_url.is_expired(),
+        active=short_url.is_active and not expiry_passed(short_url.expires_at),
         click_count=short_url.click_count,
         user_id=short_url.user_id,
+        archived=archived,
     )
 
 
@@ -57,7 +63,7 @@ async def list_short_urls(
     )
 
     return ShortURLListResponse(
-        items=[_build_short_url_response(item) for item in result["items"]],
+        items=[_build_short_url_response(item, archived=item.archived) for item in result["items"]],
         total=result["total"],
         page=result["page"],
         page_size=result["page_size"],
@@ -72,16 +78,19 @@ async def get_short_url(
     db: Session = Depends(get_db),
 ):
     repo = ShortUrlRepository(db)
-    service = ShortUrlService(repo, RedisSingleton)
 
-    short_url = await service.get_short_url_by_code(short_code)
-    if not short_url:
+    short_url = repo.get_by_code_active(short_code)
+    if short_url:
+        return _build_short_url_response(short_url)
+
+    archived = repo.get_archived_active(short_code)
+    if not archived:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Short URL not found"
         )
 
-    return _build_short_url_response(short_url)
+    return _build_short_url_response(archived, archived=True)
 
 
 @router.post("", response_model=ShortURLCreateResponse, status_code=status.HTTP_201_CREATED)
@@ -106,6 +115,8 @@ async def create_short_url(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e),
         )
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -116,6 +127,37 @@ async def create_short_url(
     return _build_short_url_response(short_url)
 
 
+# For services that resolve many codes per job: one request, one Redis
+# round trip and one query for the misses instead of a GET per code. Does
+# not count as a visit.
+@router.post("/resolve", response_model=ShortURLResolveResponse, response_model_exclude_none=True)
+async def resolve_short_urls(
+    payload: ShortURLResolveRequest,
+    current_user: Optional[User] = Depends(get_current_user_optional),
+    db: Session = Depends(get_db),
+):
+    repo = ShortUrlRepository(db)
+    service = ShortUrlService(repo, RedisSingleton)
+
+    resolved = await service.resolve_many(payload.codes)
+
+    links, missing, expired = {}, [], []
+    for short_code in dict.fromkeys(payload.codes):
+        link = resolved.get(short_code)
+        if link is None:
+            missing.append(short_code)
+        elif expiry_passed(link.expires_at):
+            expired.append(short_code)
+        else:
+            links[short_code] = ResolvedShortURL(
+                url=link.original_url,
+                redirect_type=link.redirect_type,
+                expires_at=link.expires_at,
+            )
+
+    return ShortURLResolveResponse(links=links, missing=missing, expired=expired)
+
+
 @router.patch("/{short_code}", response_model=ShortURLCreateResponse)
 async def update_short_url(
     short_code: str,
@@ -172,7 +214,6 @@ async def delete_short_url(
             detail="You do not have permission to delete this URL"
         )
 
-    await service.invalidate_cache(short_code)
     await service.delete_short_url(short_url)
 
     return {"message": "Short URL deleted successfully"}
@@ -200,7 +241,6 @@ async def disable_short_url(
             detail="You do not have permission to disable this URL"
         )
 
-    await service.invalidate_cache(short_code)
     await service.disable_short_url(short_url)
 
     return {"message": "Short URL disabled successfully"}
@@ -21,6 +21,7 @@ class ShortURLCreateResponse(BaseModel):
     active: bool
     click_count: int
     user_id: Optional[int] = None
+    archived: bool = False
 
 
 class ShortURLUpdateRequest(BaseModel):
@@ -36,11 +37,31 @@ class ShortURLListResponse(BaseModel):
     total_pages: int
 
 
+RESOLVE_MAX_CODES = 1000
+
+
+class ShortURLResolveRequest(BaseModel):
+    codes: list[str] = Field(..., min_length=1, max_length=RESOLVE_MAX_CODES)
+
+
+class ResolvedShortURL(BaseModel):
+    url: str
+    redirect_type: int
+    expires_at: Optional[datetime] = None
+
+
+class ShortURLResolveResponse(BaseModel):
+    links: dict[str, ResolvedShortURL]
+    missing: list[str]
+    expired: list[str]
+
+
 class ShortURLCacheModel(BaseModel):
     short_code: str
     original_url: str
     redirect_type: int
     expires_at: Optional[datetime]
+    version: int = 0
 
 
 class UserRegisterRequest(BaseModel):
@@ -0,0 +1,83 @@
+import threading
+import time
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 10.0,
+        half_open_max_calls: int = 1,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            self._maybe_half_open()
+
+            if self._state == self.CLOSED:
+                return True
+
+            if self._state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return True
+
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._half_open_calls = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._half_open_calls = 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            self._maybe_half_open()
+            retry_in = 0.0
+            if self._state == self.OPEN:
+                retry_in = max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "retry_in_seconds": round(retry_in, 3),
+            }
+
+    def _maybe_half_open(self) -> None:
+        if self._state == self.CLOSED:
+            return
+
+        # A probe that never reported back (cancelled, non-Redis error) must not
+        # wedge the breaker, so every recovery window hands out fresh probes.
+        now = time.monotonic()
+        if now - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._opened_at = now
+            self._half_open_calls = 0
@@ -0,0 +1,123 @@
+# Packed binary form of a cached link, for the compact cache storage mode.
+#
+#   byte 0      format (high nibble) and flags (low nibble)
+#   bytes 1-4   version, uint32 big-endian
+#   bytes 5-8   cached_until, unix seconds, uint32 big-endian
+#   byte 9      redirect_type - 300
+#   bytes 10-17 expires_at in unix microseconds, int64, NO_EXPIRY if unset
+#   bytes 18-   original_url, raw or deflated against URL_DICTIONARY
+#
+# Big-endian so CACHE_HSET_SCRIPT can read the version and cached_until with
+# string.byte. Hash fields have no TTL of their own before Redis 7.4, so the
+# entry carries cached_until and readers treat anything past it as a miss.
+from datetime import datetime, timezone
+from typing import NamedTuple, Optional
+import struct
+import zlib
+
+
+FORMAT = 0x10
+FORMAT_MASK = 0xF0
+FLAG_TOMBSTONE = 0x01
+FLAG_DEFLATED = 0x02
+
+HEADER = struct.Struct(">BIIBq")
+NO_EXPIRY = -(2 ** 63)
+
+# Preset dictionary for deflating URLs: fragments that recur across links,
+# most common last. Changing it makes every compressed entry unreadable, so
+# it must come with a new FORMAT.
+URL_DICTIONARY = (
+    b"utm_content=utm_term=utm_campaign=utm_medium=utm_source="
+    b"?id=&ref=&page=/index.html/blog//products//search?q="
+    b".org/.net/.io/.co.uk/.de/"
+    b"https://youtube.com/watch?v=https://docs.google.com/"
+    b"https://github.com/https://www.amazon.com/dp/"
+    b"http://www.https://www..com/"
+)
+
+
+class PackedLink(NamedTuple):
+    version: int
+    tombstone: bool
+    cached_until: int
+    redirect_type: int
+    expires_at: Optional[datetime]
+    original_url: str
+
+
+def _deflate(url: bytes) -> bytes:
+    compressor = zlib.compressobj(level=9, wbits=-15, zdict=URL_DICTIONARY)
+    return compressor.compress(url) + compressor.flush()
+
+
+def _inflate(data: bytes) -> bytes:
+    decompressor = zlib.decompressobj(wbits=-15, zdict=URL_DICTIONARY)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def _encode_expiry(expires_at: Optional[datetime]) -> int:
+    if expires_at is None:
+        return NO_EXPIRY
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return int(expires_at.timestamp() * 1_000_000)
+
+
+# compress_min_length of 0 stores URLs as they are; otherwise URLs at least
+# that long are deflated when it makes them shorter.
+def pack_link(
+    version: int,
+    cached_until: int,
+    redirect_type: int,
+    expires_at: Optional[datetime],
+    original_url: str,
+    compress_min_length: int = 0,
+) -> bytes:
+    flags = 0
+    url = original_url.encode()
+    if compress_min_length and len(url) >= compress_min_length:
+        deflated = _deflate(url)
+        if len(deflated) < len(url):
+            url = deflated
+            flags |= FLAG_DEFLATED
+    return HEADER.pack(FORMAT | flags, version, cached_until, redirect_type - 300, _encode_expiry(expires_at)) + url
+
+
+def pack_tombstone(version: int, cached_until: int) -> bytes:
+    return HEADER.pack(FORMAT | FLAG_TOMBSTONE, version, cached_until, 0, NO_EXPIRY)
+
+
+# None for anything this build cannot read, which callers treat as a miss.
+def unpack(raw: bytes) -> Optional[PackedLink]:
+    if len(raw) < HEADER.size:
+        return None
+    head, version, cached_until, redirect_code, expires_us = HEADER.unpack_from(raw)
+    if head & FORMAT_MASK != FORMAT:
+        return None
+
+    url = raw[HEADER.size:]
+    if head & FLAG_DEFLATED:
+        try:
+            url = _inflate(url)
+        except zlib.error:
+            return None
+
+    return PackedLink(
+        version=version,
+        tombstone=bool(head & FLAG_TOMBSTONE),
+        cached_until=cached_until,
+        redirect_type=redirect_code + 300,
+        expires_at=None if expires_us == NO_EXPIRY else datetime.fromtimestamp(expires_us / 1_000_000, tz=timezone.utc),
+        original_url=url.decode(),
+    )
+
+
+# Enough buckets to hold expected_links at entries_per_bucket each.
+def bucket_count(expected_links: int, entries_per_bucket: int) -> int:
+    return max(1, -(-expected_links // entries_per_bucket))
+
+
+# Stable across processes and restarts, unlike hash().
+def bucket_for(short_code: str, buckets: int) -> int:
+    return zlib.crc32(short_code.encode()) % buckets
@@ -0,0 +1,49 @@
+from collections import defaultdict
+from contextvars import ContextVar, Token
+from typing import Optional
+import time
+
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+_exhausted: defaultdict[str, int] = defaultdict(int)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage: str):
+        self.stage = stage
+        super().__init__(f"Request deadline exceeded during {stage}")
+
+
+def start(budget_seconds: float) -> Token:
+    return _deadline.set(time.monotonic() + budget_seconds)
+
+
+def clear() -> Token:
+    return _deadline.set(None)
+
+
+def reset(token: Token) -> None:
+    _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def record_exhausted(stage: str) -> None:
+    _exhausted[stage] += 1
+
+
+def ensure(stage: str) -> Optional[float]:
+    left = remaining()
+    if left is not None and left <= 0:
+        record_exhausted(stage)
+        raise DeadlineExceeded(stage)
+    return left
+
+
+def exhaustion_counts() -> dict[str, int]:
+    return dict(_exhausted)
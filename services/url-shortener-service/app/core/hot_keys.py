@@ -0,0 +1,91 @@
+from typing import Optional
+import logging
+import math
+import random
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+# Finds keys read often enough to overload the one Redis node that owns
+# their slot. Only a sample of reads is counted, each standing for
+# 1 / sample_rate reads, into a score that decays exponentially with
+# decay_seconds as its time constant, so score / decay_seconds approximates
+# the key's current read rate in this worker.
+#
+# A key turns hot at threshold_rps and cools down below half of it, so a
+# link hovering around the threshold does not flap.
+class HotKeyTracker:
+    def __init__(self, sample_rate: float, threshold_rps: float, decay_seconds: float, max_tracked: int):
+        self.sample_rate = sample_rate
+        self.threshold_rps = threshold_rps
+        self.decay_seconds = decay_seconds
+        self.max_tracked = max_tracked
+        self._scores: dict[str, tuple[float, float]] = {}
+        self._hot: set[str] = set()
+        self.promotions = 0
+
+    def _rate(self, key: str, now: float) -> float:
+        entry = self._scores.get(key)
+        if entry is None:
+            return 0.0
+        score, updated_at = entry
+        return score * math.exp(-(now - updated_at) / self.decay_seconds) / self.decay_seconds
+
+    # Returns whether key is hot. Unsampled reads only pay for a set lookup,
+    # plus a decay check for keys that are currently hot.
+    def record(self, key: str) -> bool:
+        now = time.monotonic()
+        if random.random() >= self.sample_rate:
+            return key in self._hot and self._still_hot(key, now)
+
+        rate = self._rate(key, now) + 1.0 / self.sample_rate / self.decay_seconds
+        self._scores[key] = (rate * self.decay_seconds, now)
+
+        if key in self._hot:
+            return self._still_hot(key, now)
+        if rate >= self.threshold_rps:
+            self._hot.add(key)
+            self.promotions += 1
+            logger.info(f"Hot key detected: {key} at ~{rate:.0f} reads/s")
+
+        if len(self._scores) > self.max_tracked:
+            self._prune(now)
+        return key in self._hot
+
+    def _still_hot(self, key: str, now: float) -> bool:
+        if self._rate(key, now) >= self.threshold_rps / 2:
+            return True
+        self._hot.discard(key)
+        logger.info(f"Hot key cooled down: {key}")
+        return False
+
+    # Keeps the hot keys and the busiest half of the rest.
+    def _prune(self, now: float) -> None:
+        cold = sorted(
+            (key for key in self._scores if key not in self._hot),
+            key=lambda key: self._rate(key, now),
+            reverse=True,
+        )
+        for key in cold[self.max_tracked // 2:]:
+            del self._scores[key]
+
+    def is_hot(self, key: str) -> bool:
+        return key in self._hot and self._still_hot(key, time.monotonic())
+
+    def rate(self, key: str) -> Optional[float]:
+        if key not in self._scores:
+            return None
+        return self._rate(key, time.monotonic())
+
+    def status(self) -> dict:
+        now = time.monotonic()
+        return {
+            "hot": {key: round(self._rate(key, now), 1) for key in sorted(self._hot)},
+            "tracked": len(self._scores),
+            "promotions": self.promotions,
+            "sample_rate": self.sample_rate,
+            "threshold_rps": self.threshold_rps,
+            "decay_seconds": self.decay_seconds,
+        }
@@ -0,0 +1,91 @@
+# Per-request count of SQL statements and Redis round trips and the time
+# spent in each. Statements are counted from the engines' cursor execute
+# events and Redis round trips in RedisSingleton.execute, where a pipeline
+# or script is one round trip however many commands it carries.
+#
+# The stats live in a ContextVar. Handlers that hop to a thread or spawn a
+# task carry a copy of the context, which still points at the same
+# IOStats, so their I/O is counted towards the request that caused it.
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Iterator, Optional
+
+
+class IOStats:
+    __slots__ = ("db_statements", "db_seconds", "redis_calls", "redis_seconds", "parent")
+
+    def __init__(self, parent: Optional["IOStats"] = None):
+        self.db_statements = 0
+        self.db_seconds = 0.0
+        self.redis_calls = 0
+        self.redis_seconds = 0.0
+        self.parent = parent
+
+    def server_timing(self) -> str:
+        return (
+            f'db;dur={self.db_seconds * 1000:.2f};desc="count={self.db_statements}", '
+            f'redis;dur={self.redis_seconds * 1000:.2f};desc="count={self.redis_calls}"'
+        )
+
+    def log_fields(self) -> str:
+        return (
+            f"db={self.db_statements}/{self.db_seconds * 1000:.2f}ms "
+            f"redis={self.redis_calls}/{self.redis_seconds * 1000:.2f}ms"
+        )
+
+
+_current: ContextVar[Optional[IOStats]] = ContextVar("io_stats", default=None)
+
+
+def start() -> tuple[IOStats, Token]:
+    stats = IOStats(parent=_current.get())
+    return stats, _current.set(stats)
+
+
+def reset(token: Token) -> None:
+    _current.reset(token)
+
+
+# Nested scopes (an io_budget inside a request) count towards every
+# enclosing scope as well.
+def record_db(seconds: float) -> None:
+    stats = _current.get()
+    while stats is not None:
+        stats.db_statements += 1
+        stats.db_seconds += seconds
+        stats = stats.parent
+
+
+def record_redis(seconds: float) -> None:
+    stats = _current.get()
+    while stats is not None:
+        stats.redis_calls += 1
+        stats.redis_seconds += seconds
+        stats = stats.parent
+
+
+class IOBudgetExceeded(AssertionError):
+    pass
+
+
+# Test helper: fails when the block issues more SQL statements or Redis
+# round trips than allowed, so an N+1 or an extra refresh() shows up as a
+# failing test rather than as latency in production.
+#
+#   with io_budget(db=1, redis=0):
+#       repo.increment_clicks("abc")
+@contextmanager
+def io_budget(db: Optional[int] = None, redis: Optional[int] = None) -> Iterator[IOStats]:
+    stats, token = start()
+    try:
+        yield stats
+    finally:
+        reset(token)
+
+    over = []
+    if db is not None and stats.db_statements > db:
+        over.append(f"{stats.db_statements} SQL statements (budget {db})")
+    if redis is not None and stats.redis_calls > redis:
+        over.append(f"{stats.redis_calls} Redis round trips (budget {redis})")
+    if over:
+        raise IOBudgetExceeded("I/O budget exceeded: " + ", ".join(over))
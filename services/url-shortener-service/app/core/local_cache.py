@@ -0,0 +1,42 @@
+from collections import OrderedDict
+from typing import Any, Optional
+import time
+
+
+class LocalCache:
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,66 @@
+# Logging setup for the service. Records are put on an in-memory queue on
+# the event loop and formatted and written to stderr by a QueueListener
+# thread, so a slow or blocked stderr never stalls request handling.
+#
+# LOG_FORMAT=json writes one JSON object per line. Access log records carry
+# their fields in record.access, which the JSON formatter lifts into the
+# object instead of leaving them in the message.
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+import atexit
+import json
+import logging
+import queue
+
+from app.core.settings import settings
+
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        access = getattr(record, "access", None)
+        if access:
+            entry.update(access)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# The stock QueueHandler formats the message on the calling thread so the
+# record can be pickled. This queue never leaves the process, so the record
+# goes over as it is and all formatting happens on the listener thread.
+# Loggers here pass immutable values as arguments, which is what makes
+# deferring the formatting safe.
+class DeferredQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging() -> None:
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL)
+    root.addHandler(DeferredQueueHandler(records))
+
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    # Drains what is still queued when the process exits.
+    atexit.register(_listener.stop)
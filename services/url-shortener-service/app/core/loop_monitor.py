@@ -0,0 +1,109 @@
+# Measures how late the event loop runs its callbacks. A coroutine sleeps
+# for interval and records how much later than that it woke up: that lag
+# is what every other request on this worker waited for at the same time,
+# mostly on sync SQLAlchemy, bcrypt or DNS lookups inside async handlers.
+#
+# With capture_blocks, a watchdog thread also notices when the loop has not
+# come back for block_threshold and records the loop thread's stack at that
+# moment, so the blocking call is caught in the act rather than inferred.
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from app.core.metrics import event_loop_blocks, event_loop_lag
+from app.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+
+# The route of the request whose frames are on the stack. Every ASGI layer
+# holds the same scope dict, which the router stamps with the matched route.
+def _route_of(frame) -> str:
+    while frame is not None:
+        scope = frame.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") == "http":
+            route = scope.get("route")
+            return route.path if route is not None else "unmatched"
+        frame = frame.f_back
+    return "background"
+
+
+class LoopMonitor:
+    def __init__(self, block_threshold: float, capture_blocks: bool, keep_blocks: int = 50):
+        self.block_threshold = block_threshold
+        self.capture_blocks = capture_blocks
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.blocks: deque[dict] = deque(maxlen=keep_blocks)
+        self._heartbeat = time.monotonic()
+        self._interval = 0.0
+        self._loop_thread: Optional[int] = None
+
+    async def run(self, interval: float) -> None:
+        self._interval = interval
+        self._loop_thread = threading.get_ident()
+        stop = threading.Event()
+        if self.capture_blocks:
+            threading.Thread(target=self._watch, args=(stop,), name="loop-watchdog", daemon=True).start()
+
+        try:
+            while True:
+                self._heartbeat = time.monotonic()
+                await asyncio.sleep(interval)
+                lag = max(0.0, time.monotonic() - self._heartbeat - interval)
+                event_loop_lag.observe(lag)
+                self.last_lag = lag
+                self.max_lag = max(self.max_lag, lag)
+                if lag >= self.block_threshold:
+                    self.stalls += 1
+        finally:
+            stop.set()
+
+    def _watch(self, stop: threading.Event) -> None:
+        captured = None
+        while not stop.wait(self.block_threshold / 2):
+            heartbeat = self._heartbeat
+            late = time.monotonic() - heartbeat - self._interval
+            if late >= self.block_threshold and heartbeat != captured:
+                captured = heartbeat
+                self._capture(late)
+
+    def _capture(self, late: float) -> None:
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return
+        route = _route_of(frame)
+        stack = traceback.format_stack(frame)
+        event_loop_blocks.labels(route).inc()
+        self.blocks.append({
+            "at": datetime.now(timezone.utc).isoformat(),
+            "route": route,
+            "blocked_ms": round(late * 1000, 1),
+            "stack": [line.rstrip() for line in stack],
+        })
+        logger.warning(
+            f"Event loop blocked for {late * 1000:.0f}ms+ in {route}:\n{''.join(stack[-settings.LOOP_BLOCK_STACK_DEPTH:])}"
+        )
+
+    def status(self) -> dict:
+        return {
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "stalls": self.stalls,
+            "block_threshold_ms": self.block_threshold * 1000,
+            "capturing_blocks": self.capture_blocks,
+        }
+
+
+loop_monitor = LoopMonitor(
+    block_threshold=settings.LOOP_BLOCK_THRESHOLD_MS / 1000,
+    capture_blocks=settings.LOOP_BLOCK_CAPTURE_ENABLED,
+)
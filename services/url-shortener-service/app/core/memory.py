@@ -0,0 +1,149 @@
+# Memory diagnostics behind the /api/v1/admin/memory endpoints.
+#
+# counters() is cheap enough to poll: resident size, live asyncio tasks and
+# threads. orm_counters() walks every object the garbage collector knows
+# about to find SQLAlchemy sessions and the rows they hold, which takes tens
+# of milliseconds on a warm worker; it is meant for a human looking at one
+# worker, not for a scrape.
+#
+# AllocationTracker wraps tracemalloc. Tracing slows allocation-heavy code
+# down by a large factor, so it only runs between an explicit start and
+# stop. start() also takes the baseline that later snapshots are compared
+# to, so a leak shows up as the lines whose allocations keep growing.
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Optional
+import asyncio
+import gc
+import os
+import threading
+import tracemalloc
+
+from sqlalchemy.orm import Session
+
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return None
+
+
+def counters() -> dict:
+    try:
+        tasks = len(asyncio.all_tasks())
+    except RuntimeError:
+        tasks = 0
+    return {
+        "rss_bytes": rss_bytes(),
+        "gc_counts": gc.get_count(),
+        "asyncio_tasks": tasks,
+        "threads": threading.active_count(),
+    }
+
+
+def orm_counters(top: int = 10) -> dict:
+    sessions = 0
+    identity_map = 0
+    by_class: Counter[str] = Counter()
+    objects = gc.get_objects()
+    for obj in objects:
+        if isinstance(obj, Session):
+            sessions += 1
+            for instance in obj.identity_map.values():
+                identity_map += 1
+                by_class[type(instance).__name__] += 1
+    return {
+        "gc_tracked_objects": len(objects),
+        "sessions": sessions,
+        "identity_map_objects": identity_map,
+        "identity_map_by_class": dict(by_class.most_common(top)),
+    }
+
+
+def _site(stat) -> dict:
+    frame = stat.traceback[0]
+    return {
+        "file": frame.filename,
+        "line": frame.lineno,
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+
+
+def _diff_site(stat) -> dict:
+    return {
+        **_site(stat),
+        "size_diff_bytes": stat.size_diff,
+        "count_diff": stat.count_diff,
+    }
+
+
+class AllocationTracker:
+    def __init__(self):
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[str] = None
+        self._lock = threading.Lock()
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = 1) -> None:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._take_baseline()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._baseline = None
+            self._baseline_at = None
+            tracemalloc.stop()
+
+    def _take_baseline(self) -> None:
+        self._baseline = self._snapshot()
+        self._baseline_at = datetime.now(timezone.utc).isoformat()
+
+    # Allocations made by tracemalloc itself are left out of every snapshot.
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    # Top allocation sites by size now, and the sites that grew most since
+    # the baseline. With reset, the baseline moves to this snapshot, so
+    # repeated calls show the growth between calls. Snapshots take a while
+    # on a large heap; call this from a thread.
+    def report(self, limit: int = 25, reset: bool = False) -> Optional[dict]:
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                return None
+            snapshot = self._snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            top = snapshot.statistics("lineno")[:limit]
+            growth = []
+            if self._baseline is not None:
+                growth = [
+                    stat for stat in snapshot.compare_to(self._baseline, "lineno")
+                    if stat.size_diff > 0
+                ][:limit]
+            report = {
+                "traced_bytes": current,
+                "traced_peak_bytes": peak,
+                "baseline_at": self._baseline_at,
+                "top": [_site(stat) for stat in top],
+                "growth": [_diff_site(stat) for stat in growth],
+            }
+            if reset:
+                self._baseline = snapshot
+                self._baseline_at = datetime.now(timezone.utc).isoformat()
+            return report
+
+
+allocation_tracker = AllocationTracker()
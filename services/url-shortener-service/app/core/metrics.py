@@ -0,0 +1,138 @@
+# Prometheus metrics for the request path and its dependencies.
+#
+# With several workers, set PROMETHEUS_MULTIPROC_DIR to a directory that is
+# emptied before the workers start: each worker then writes its samples to
+# memory-mapped files there and /metrics sums them across workers. The
+# variable is read when prometheus_client is imported, so it has to be in
+# the environment, not only in .env.
+import os
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client import multiprocess
+
+
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Redirects are answered in well under a millisecond from a cache, so the
+# default buckets (starting at 5ms) would put all of them in the first one.
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "Time to answer a request, by route template and status",
+    ["method", "route", "status"],
+    buckets=FAST_BUCKETS,
+)
+
+cache_lookups = Counter(
+    "url_cache_lookups_total",
+    "Short URL lookups by cache tier and outcome",
+    ["tier", "result"],
+)
+
+db_query_duration = Histogram(
+    "db_query_duration_seconds",
+    "Time spent executing SQL statements, by database",
+    ["database"],
+    buckets=FAST_BUCKETS,
+)
+
+db_pool_checkout_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a connection from the pool, by database",
+    ["database"],
+    buckets=FAST_BUCKETS,
+)
+
+event_publish_duration = Histogram(
+    "event_publish_duration_seconds",
+    "XADD latency for click and link events",
+    buckets=FAST_BUCKETS,
+)
+
+events_degraded = Counter(
+    "events_degraded_total",
+    "Events that could not be published straight away, by what happened to them",
+    ["outcome"],
+)
+
+event_spool_depth = Gauge(
+    "event_spool_depth",
+    "Events waiting in the spool for Redis to come back",
+    multiprocess_mode="livesum",
+)
+
+event_publish_pending = Gauge(
+    "event_publish_pending_tasks",
+    "Fire-and-forget publish tasks that have not finished yet",
+    multiprocess_mode="livesum",
+)
+
+db_sessions_live = Gauge(
+    "db_sessions_live",
+    "SQLAlchemy sessions that have not been garbage collected yet",
+    multiprocess_mode="livesum",
+)
+
+rate_limit_rejections = Counter(
+    "rate_limit_rejections_total",
+    "Requests answered with 429 by the rate limiter",
+)
+
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds",
+    "Time spent in bcrypt, by operation",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+event_loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer that was due",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+
+event_loop_blocks = Counter(
+    "event_loop_blocks_total",
+    "Times the event loop was caught blocked past LOOP_BLOCK_THRESHOLD_MS, by route",
+    ["route"],
+)
+
+# Bound once here so the redirect path does not look the label values up on
+# every request.
+REDIS_HIT = cache_lookups.labels("redis", "hit")
+REDIS_MISS = cache_lookups.labels("redis", "miss")
+LOCAL_HIT = cache_lookups.labels("local", "hit")
+LOCAL_MISS = cache_lookups.labels("local", "miss")
+HOT_PIN_HIT = cache_lookups.labels("hot_pin", "hit")
+HOT_PIN_MISS = cache_lookups.labels("hot_pin", "miss")
+SNAPSHOT_HIT = cache_lookups.labels("snapshot", "hit")
+SNAPSHOT_MISS = cache_lookups.labels("snapshot", "miss")
+
+EVENTS_SPOOLED = events_degraded.labels("spooled")
+EVENTS_DROPPED = events_degraded.labels("dropped")
+
+BCRYPT_HASH = password_hash_duration.labels("hash")
+BCRYPT_VERIFY = password_hash_duration.labels("verify")
+
+
+def render() -> tuple[bytes, str]:
+    registry = REGISTRY
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+# Lets the live gauges of a worker that is going away drop out of the sum.
+def mark_process_dead() -> None:
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,252 @@
+# In-process sampling profiler. A daemon thread wakes every interval, reads
+# the other threads' stacks from sys._current_frames() and counts them, so
+# the profiled code runs untouched; the cost is one stack walk per sample.
+# Output is the collapsed-stack format read by flamegraph.pl, speedscope and
+# inferno: one "outer;...;inner count" line per distinct stack.
+#
+# Two modes:
+#   - a whole worker for a few seconds, from POST /api/v1/admin/profile
+#   - a single request, when it carries a valid X-Profile-Token header; see
+#     ProfilingMiddleware. Tokens are minted with
+#
+#       python -m app.core.profiler sign --ttl 600
+#
+#     and each profiles one request: its nonce is claimed in Redis on first
+#     use, so a token seen in a log or a proxy cannot be replayed.
+#
+# One profile runs per worker at a time.
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Optional
+from weakref import WeakSet
+import argparse
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import sys
+import threading
+import time
+
+from app.core.redis import RedisSingleton
+from app.core.redis_keys import profile_token_key
+from app.core.settings import settings
+
+
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+
+_busy = threading.Lock()
+
+# Tasks spawned on behalf of a profiled request, see _install_task_factory.
+_request_tasks: ContextVar[Optional[WeakSet]] = ContextVar("profiled_request_tasks", default=None)
+
+_path_prefixes = sorted({os.path.join(path, "") for path in sys.path if path}, key=len, reverse=True)
+
+
+def _short_path(filename: str) -> str:
+    for prefix in _path_prefixes:
+        if filename.startswith(prefix):
+            return filename[len(prefix):]
+    return filename
+
+
+class StackSampler:
+    # thread_id limits sampling to one thread; should_sample, when given, is
+    # asked before each sample whether it counts. With fine_switching the
+    # GIL switch interval is shortened while sampling, see start().
+    def __init__(
+        self,
+        interval: float,
+        thread_id: Optional[int] = None,
+        should_sample: Optional[Callable[[], bool]] = None,
+        fine_switching: bool = False,
+    ):
+        self.interval = interval
+        self.thread_id = thread_id
+        self.should_sample = should_sample
+        self.fine_switching = fine_switching
+        self._switch_interval: Optional[float] = None
+        self.samples: Counter[str] = Counter()
+        self._labels: dict = {}
+        self._thread_names: dict[int, str] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    # The sampler needs the GIL to read stacks and a busy thread only hands
+    # it over every switch interval (5ms by default), so samples bunch up
+    # wherever the profiled thread releases it on its own, typically in the
+    # event loop's select(). Shortening the interval keeps them where the
+    # time is actually spent, but it is process-wide and costs every thread
+    # extra switches, so only single-request profiles ask for it, and stop()
+    # restores it as soon as the request is done.
+    def start(self) -> None:
+        if self.fine_switching:
+            self._switch_interval = sys.getswitchinterval()
+            sys.setswitchinterval(min(self._switch_interval, self.interval))
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._switch_interval is not None:
+            sys.setswitchinterval(self._switch_interval)
+            self._switch_interval = None
+        self._thread.join()
+        return self.samples
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def _thread_name(self, thread_id: int) -> str:
+        if thread_id not in self._thread_names:
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+        return self._thread_names.get(thread_id, str(thread_id))
+
+    def _collapse(self, frame) -> list[str]:
+        stack = []
+        while frame is not None:
+            stack.append(self._label(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()
+        return stack
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self.should_sample is not None and not self.should_sample():
+                continue
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                frame = frames.get(self.thread_id)
+                if frame is not None:
+                    self.samples[";".join(self._collapse(frame))] += 1
+                continue
+            for thread_id, frame in frames.items():
+                if thread_id != own:
+                    stack = [self._thread_name(thread_id)] + self._collapse(frame)
+                    self.samples[";".join(stack)] += 1
+
+
+def collapsed(samples: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(samples.items()))
+
+
+# Samples every thread of this worker for the given time. None when another
+# profile is already running here.
+async def profile_worker(seconds: float, interval: float) -> Optional[Counter]:
+    if not _busy.acquire(blocking=False):
+        return None
+    sampler = StackSampler(interval)
+    try:
+        sampler.start()
+        await asyncio.sleep(seconds)
+    finally:
+        samples = await asyncio.to_thread(sampler.stop)
+        _busy.release()
+    return samples
+
+
+# Records every task created while a profiled request's context is current,
+# which covers the tasks BaseHTTPMiddleware spawns per request. Installed on
+# the first profiled request and left in place; for everyone else it costs
+# one ContextVar lookup per task created.
+def _install_task_factory(loop: asyncio.AbstractEventLoop) -> None:
+    previous = loop.get_task_factory()
+    if getattr(previous, "tracks_profiled_requests", False):
+        return
+
+    def factory(loop, coro, **kwargs):
+        if previous is not None:
+            task = previous(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        tasks = _request_tasks.get()
+        if tasks is not None:
+            tasks.add(task)
+        return task
+
+    factory.tracks_profiled_requests = True
+    loop.set_task_factory(factory)
+
+
+# Samples the event loop thread while the current request's tasks hold it,
+# so concurrent requests stay out of the profile. The task check and the
+# stack read are not atomic; a sample taken just as the loop switches tasks
+# can land on the wrong one. Returns None when another profile is running.
+def start_request_profile(interval: float) -> Optional[tuple[StackSampler, object]]:
+    if not _busy.acquire(blocking=False):
+        return None
+    loop = asyncio.get_running_loop()
+    _install_task_factory(loop)
+    tasks: WeakSet = WeakSet([asyncio.current_task()])
+    token = _request_tasks.set(tasks)
+
+    sampler = StackSampler(
+        interval,
+        thread_id=threading.get_ident(),
+        should_sample=lambda: asyncio.current_task(loop) in tasks,
+        fine_switching=True,
+    )
+    sampler.start()
+    return sampler, token
+
+
+# Joining the sampler waits out its current interval, which is off the loop.
+async def finish_request_profile(sampler: StackSampler, token) -> Counter:
+    try:
+        _request_tasks.reset(token)
+        return await asyncio.to_thread(sampler.stop)
+    finally:
+        _busy.release()
+
+
+def _signature(claim: str) -> str:
+    return hmac.new(settings.PROFILING_SECRET.encode(), claim.encode(), hashlib.sha256).hexdigest()
+
+
+# expires.nonce.signature
+def sign_token(ttl_seconds: int) -> str:
+    claim = f"{int(time.time()) + ttl_seconds}.{secrets.token_hex(16)}"
+    return f"{claim}.{_signature(claim)}"
+
+
+def verify_token(token: str) -> bool:
+    if not settings.PROFILING_SECRET:
+        return False
+    claim, _, signature = token.rpartition(".")
+    expires, _, nonce = claim.partition(".")
+    if not expires.isdigit() or int(expires) < time.time() or not nonce:
+        return False
+    return hmac.compare_digest(_signature(claim), signature)
+
+
+# True the first time a verified token is presented. The nonce is remembered
+# until the token expires anyway. Raises RedisUnavailableError, and a token
+# that cannot be claimed is not honoured.
+async def claim_token(token: str) -> bool:
+    expires, nonce, _ = token.split(".", 2)
+    ttl = max(1, int(expires) - int(time.time()) + 1)
+    claimed = await RedisSingleton.execute(lambda r: r.set(profile_token_key(nonce), 1, nx=True, ex=ttl))
+    return bool(claimed)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Mint a token that profiles the requests carrying it")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sign_cmd = sub.add_parser("sign")
+    sign_cmd.add_argument("--ttl", type=int, default=600, help="seconds the token stays valid")
+    args = parser.parse_args(argv)
+
+    if not settings.PROFILING_SECRET:
+        print("Set PROFILING_SECRET to the value the service runs with", file=sys.stderr)
+        return 2
+    print(f"{PROFILE_TOKEN_HEADER}: {sign_token(args.ttl)}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,32 +1,159 @@
-from typing import Optional
+from typing import Any, Awaitable, Callable, Optional, Union
+import asyncio
+import time
+
 from redis import asyncio as aioredis
+from redis.asyncio.cluster import ClusterNode, RedisCluster
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis.exceptions import RedisClusterException, RedisError, ResponseError
+
+from opentelemetry.trace import SpanKind
+
+from app.core import deadline, io_accounting, tracing
+from app.core.circuit_breaker import CircuitBreaker
 from app.core.settings import settings
 
+
+class RedisUnavailableError(Exception):
+    pass
+
+
+RedisClient = Union[aioredis.Redis, RedisCluster]
+
+
+def _cluster_startup_nodes() -> list[ClusterNode]:
+    nodes = settings.REDIS_CLUSTER_NODES or [f"{settings.REDIS_URL}:{settings.REDIS_PORT}"]
+    startup_nodes = []
+    for node in nodes:
+        host, _, port = node.rpartition(":")
+        startup_nodes.append(ClusterNode(host, int(port)))
+    return startup_nodes
+
+
+def _create_client(decode_responses: bool) -> RedisClient:
+    connection_kwargs = dict(
+        decode_responses=decode_responses,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        socket_keepalive=settings.REDIS_SOCKET_KEEPALIVE,
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        # The circuit breaker decides when to try again, not the client.
+        retry=Retry(NoBackoff(), 0),
+    )
+
+    if settings.REDIS_CLUSTER_MODE:
+        return RedisCluster(
+            startup_nodes=_cluster_startup_nodes(),
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            **connection_kwargs,
+        )
+
+    pool = aioredis.ConnectionPool(
+        host=settings.REDIS_URL,
+        port=int(settings.REDIS_PORT),
+        db=0,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        **connection_kwargs,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
 class RedisSingleton:
-    _instance: Optional[aioredis.Redis] = None
+    _instance: Optional[RedisClient] = None
+    _binary_instance: Optional[RedisClient] = None
+    breaker = CircuitBreaker(
+        "redis",
+        failure_threshold=settings.REDIS_BREAKER_FAILURE_THRESHOLD,
+        recovery_timeout=settings.REDIS_BREAKER_RECOVERY_SECONDS,
+        half_open_max_calls=settings.REDIS_BREAKER_HALF_OPEN_MAX_CALLS,
+    )
 
     @classmethod
-    def get_instance(cls) -> aioredis.Redis:
+    def get_instance(cls) -> RedisClient:
         if cls._instance is None:
-            cls._instance = aioredis.Redis(
-                host=settings.REDIS_URL,
-                port=int(settings.REDIS_PORT),
-                db=0,
-                decode_responses=True,
-                socket_timeout=5,  
-            )
+            cls._instance = _create_client(decode_responses=True)
         return cls._instance
 
+    @classmethod
+    def get_binary_instance(cls) -> RedisClient:
+        if cls._binary_instance is None:
+            cls._binary_instance = _create_client(decode_responses=False)
+        return cls._binary_instance
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return cls.breaker.state != CircuitBreaker.OPEN
+
+    @classmethod
+    async def execute(
+        cls,
+        command: Callable[[RedisClient], Awaitable[Any]],
+        stage: str = "redis",
+        binary: bool = False,
+    ) -> Any:
+        if not tracing.enabled:
+            return await cls._execute(command, stage, binary)
+        # The command is usually a lambda or a local function; its qualified
+        # name still says which caller the round trip belongs to.
+        with tracing.tracer.start_as_current_span(
+            "redis" if stage == "redis" else f"redis.{stage}",
+            kind=SpanKind.CLIENT,
+            attributes={"db.system": "redis", "code.function": command.__qualname__},
+        ):
+            return await cls._execute(command, stage, binary)
+
+    @classmethod
+    async def _execute(
+        cls,
+        command: Callable[[RedisClient], Awaitable[Any]],
+        stage: str,
+        binary: bool,
+    ) -> Any:
+        timeout = settings.REDIS_COMMAND_TIMEOUT
+        left = deadline.ensure(stage)
+        bounded_by_deadline = left is not None and left < timeout
+        if bounded_by_deadline:
+            timeout = left
+
+        if not cls.breaker.allow_request():
+            raise RedisUnavailableError("Redis circuit breaker is open")
+
+        client = cls.get_binary_instance() if binary else cls.get_instance()
+        started = time.perf_counter()
+        try:
+            result = await asyncio.wait_for(command(client), timeout=timeout)
+        except ResponseError:
+            cls.breaker.record_success()
+            raise
+        except asyncio.TimeoutError as e:
+            # Running out of request budget says nothing about Redis health.
+            if bounded_by_deadline:
+                deadline.record_exhausted(stage)
+                raise deadline.DeadlineExceeded(stage) from e
+            cls.breaker.record_failure()
+            raise RedisUnavailableError("Redis command timed out") from e
+        except (RedisError, RedisClusterException, OSError) as e:
+            cls.breaker.record_failure()
+            raise RedisUnavailableError(str(e) or e.__class__.__name__) from e
+        finally:
+            io_accounting.record_redis(time.perf_counter() - started)
+
+        cls.breaker.record_success()
+        return result
+
     @classmethod
     async def close(cls):
         if cls._instance:
-            await cls._instance.close()
+            await cls._instance.aclose()
             cls._instance = None
+        if cls._binary_instance:
+            await cls._binary_instance.aclose()
+            cls._binary_instance = None
 
     @classmethod
     async def ping(cls) -> bool:
         try:
-            r = cls.get_instance()
-            return await r.ping()
-        except Exception:
-            return False
\ No newline at end of file
+            return await cls.execute(lambda r: r.ping())
+        except RedisUnavailableError:
+            return False
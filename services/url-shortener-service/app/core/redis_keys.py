@@ -0,0 +1,69 @@
+# Every key carries a {hash tag} so Redis Cluster places keys that are used
+# together in the same slot: a link's cache entry, one client's rate-limit
+# counter, and all refresh tokens of one user.
+
+
+def url_cache_key(short_code: str) -> str:
+    return f"url:{{{short_code}}}"
+
+
+# Copies of a hot link's entry. Each copy has its own hash tag so the copies
+# land on different slots, and usually different nodes.
+def url_cache_replica_key(short_code: str, replica: int) -> str:
+    return f"url:{{{short_code}#{replica}}}"
+
+
+# Compact storage: one hash per bucket of codes, see app.services.url_cache.
+def url_bucket_key(bucket: int) -> str:
+    return f"urlb:{{{bucket}}}"
+
+
+def url_bucket_replica_key(bucket: int, replica: int) -> str:
+    return f"urlb:{{{bucket}#{replica}}}"
+
+
+# Set while a link has hot key copies, in the slot of its entry so it can be
+# checked in the same pipeline that invalidates the entry.
+def url_copies_key(short_code: str) -> str:
+    return f"url:{{{short_code}}}:copies"
+
+
+def url_bucket_copies_key(bucket: int, short_code: str) -> str:
+    return f"urlb:{{{bucket}}}:copies:{short_code}"
+
+
+def rate_limit_key(client_ip: str) -> str:
+    return f"ratelimit:{{{client_ip}}}"
+
+
+def refresh_token_key(user_id: int, jti: str) -> str:
+    return f"refresh_token:{{{user_id}}}:{jti}"
+
+
+def refresh_token_index_key(user_id: int) -> str:
+    return f"refresh_tokens:{{{user_id}}}"
+
+
+def legacy_refresh_token_key(user_id: int, jti: str) -> str:
+    return f"refresh_token:{user_id}:{jti}"
+
+
+def read_your_writes_key(user_id: int) -> str:
+    return f"rw_sticky:{{{user_id}}}"
+
+
+def warmup_lock_key() -> str:
+    return "warmup:lock"
+
+
+def warmup_result_key() -> str:
+    return "warmup:result"
+
+
+def request_profile_key(profile_id: str) -> str:
+    return f"profile:{{{profile_id}}}"
+
+
+# Set when a single-use profile token is first presented.
+def profile_token_key(nonce: str) -> str:
+    return f"profile_token:{{{nonce}}}"
@@ -1,23 +1,32 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional
+import time
 import uuid
 
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 
+from app.core.metrics import BCRYPT_HASH, BCRYPT_VERIFY
 from app.core.settings import settings
 from app.core.redis import RedisSingleton
+from app.core.redis_keys import (
+    legacy_refresh_token_key,
+    refresh_token_index_key,
+    refresh_token_key,
+)
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password, rounds=settings.BCRYPT_ROUNDS)
+    with BCRYPT_HASH.time():
+        return pwd_context.hash(password, rounds=settings.BCRYPT_ROUNDS)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    with BCRYPT_VERIFY.time():
+        return pwd_context.verify(plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -52,32 +61,61 @@ def decode_token(token: str) -> Optional[dict]:
 
 
 async def store_refresh_token(user_id: int, jti: str) -> None:
-    redis = RedisSingleton.get_instance()
-    key = f"refresh_token:{user_id}:{jti}"
+    key = refresh_token_key(user_id, jti)
+    index_key = refresh_token_index_key(user_id)
     ttl = settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 60 * 60
-    await redis.setex(key, ttl, "valid")
+    now = time.time()
+
+    async def _store(r):
+        async with r.pipeline(transaction=True) as pipe:
+            pipe.setex(key, ttl, "valid")
+            pipe.zadd(index_key, {jti: now + ttl})
+            pipe.zremrangebyscore(index_key, "-inf", now)
+            pipe.expire(index_key, ttl)
+            return await pipe.execute()
+
+    await RedisSingleton.execute(_store)
 
 
 async def revoke_refresh_token(user_id: int, jti: str) -> None:
-    redis = RedisSingleton.get_instance()
-    key = f"refresh_token:{user_id}:{jti}"
-    await redis.delete(key)
+    key = refresh_token_key(user_id, jti)
+    index_key = refresh_token_index_key(user_id)
+    legacy_key = legacy_refresh_token_key(user_id, jti)
+
+    async def _revoke(r):
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.delete(key)
+            pipe.zrem(index_key, jti)
+            pipe.delete(legacy_key)
+            return await pipe.execute()
+
+    await RedisSingleton.execute(_revoke)
 
 
 async def is_refresh_token_valid(user_id: int, jti: str) -> bool:
-    redis = RedisSingleton.get_instance()
-    key = f"refresh_token:{user_id}:{jti}"
-    result = await redis.get(key)
+    result = await RedisSingleton.execute(lambda r: r.get(refresh_token_key(user_id, jti)))
+    if result is None:
+        # Tokens issued before keys were hash-tagged; drop once those have expired.
+        result = await RedisSingleton.execute(lambda r: r.get(legacy_refresh_token_key(user_id, jti)))
     return result == "valid"
 
 
 async def revoke_all_user_tokens(user_id: int) -> None:
-    redis = RedisSingleton.get_instance()
-    pattern = f"refresh_token:{user_id}:*"
+    index_key = refresh_token_index_key(user_id)
+    jtis = await RedisSingleton.execute(lambda r: r.zrange(index_key, 0, -1))
+    keys = [refresh_token_key(user_id, jti) for jti in jtis] + [index_key]
+    await RedisSingleton.execute(lambda r: r.delete(*keys))
+
+    if settings.REDIS_CLUSTER_MODE:
+        return
+
+    pattern = legacy_refresh_token_key(user_id, "*")
     cursor = 0
     while True:
-        cursor, keys = await redis.scan(cursor, match=pattern, count=100)
+        cursor, keys = await RedisSingleton.execute(
+            lambda r: r.scan(cursor, match=pattern, count=100)
+        )
         if keys:
-            await redis.delete(*keys)
+            await RedisSingleton.execute(lambda r: r.delete(*keys))
         if cursor == 0:
             break
@@ -1,4 +1,4 @@
-from typing import Optional, List
+from typing import Dict, Optional, List
 from pydantic import AnyHttpUrl
 from pydantic_settings import BaseSettings
 
@@ -6,8 +6,99 @@ from pydantic_settings import BaseSettings
 class Settings(BaseSettings):
     SHORT_URL_DOMAIN: Optional[AnyHttpUrl] = None
     DATABASE_URL: str
+    DB_STATEMENT_TIMEOUT_MS: int = 5000
+    DATABASE_REPLICA_URLS: List[str] = []
+    REPLICA_MAX_LAG_SECONDS: float = 5.0
+    REPLICA_LAG_CHECK_INTERVAL_SECONDS: float = 5.0
+    READ_YOUR_WRITES_SECONDS: int = 10
+    SHORT_URL_PARTITION_COUNT: int = 0
+    SHARD_DATABASE_URLS: Dict[str, str] = {}
+    SHARD_STRATEGY: str = "hash"
+    SHARD_VIRTUAL_NODES: int = 64
+    SHARD_PREFIX_MAP: Dict[str, str] = {}
+    SHARD_LOOKUP_FALLBACK: bool = False
     REDIS_URL: str
     REDIS_PORT: str
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    REDIS_SOCKET_KEEPALIVE: bool = True
+    REDIS_CLUSTER_MODE: bool = False
+    REDIS_CLUSTER_NODES: List[str] = []
+    REDIS_SOCKET_TIMEOUT: float = 0.25
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 0.25
+    REDIS_COMMAND_TIMEOUT: float = 0.3
+    REDIS_BREAKER_FAILURE_THRESHOLD: int = 5
+    REDIS_BREAKER_RECOVERY_SECONDS: float = 5.0
+    REDIS_BREAKER_HALF_OPEN_MAX_CALLS: int = 1
+
+    URL_CACHE_TTL_SECONDS: int = 3600
+    CACHE_TOMBSTONE_TTL_SECONDS: int = 300
+    EXPIRED_CACHE_TTL_SECONDS: int = 60
+    # "string" (one JSON key per link) or "compact" (packed entries in
+    # bucket hashes; raise hash-max-listpack-value on Redis to match).
+    URL_CACHE_STORAGE: str = "string"
+    # Compact buckets are sized so URL_CACHE_EXPECTED_LINKS spread
+    # URL_CACHE_BUCKET_ENTRIES to a bucket, which has to stay below Redis's
+    # hash-max-listpack-entries. URL_CACHE_BUCKETS overrides the count.
+    # Changing the count moves most links to another bucket.
+    URL_CACHE_EXPECTED_LINKS: int = 10_000_000
+    URL_CACHE_BUCKET_ENTRIES: int = 64
+    URL_CACHE_BUCKETS: int = 0
+    # Invalidate both layouts while a deploy switches URL_CACHE_STORAGE.
+    URL_CACHE_LAYOUT_MIGRATION: bool = False
+    URL_CACHE_COMPRESS_MIN_LENGTH: int = 0
+
+    HOT_KEY_DETECTION_ENABLED: bool = True
+    HOT_KEY_SAMPLE_RATE: float = 0.01
+    HOT_KEY_THRESHOLD_RPS: float = 500.0
+    HOT_KEY_DECAY_SECONDS: float = 10.0
+    HOT_KEY_MAX_TRACKED: int = 10000
+    HOT_KEY_REPLICAS: int = 8
+    HOT_KEY_REPLICA_TTL_SECONDS: int = 300
+    HOT_KEY_PIN_SECONDS: float = 5.0
+    LOCAL_CACHE_MAX_ENTRIES: int = 10000
+    LOCAL_CACHE_TTL_SECONDS: float = 30.0
+
+    WARMUP_ENABLED: bool = True
+    WARMUP_TOP_N: int = 10000
+    WARMUP_RECENT_DAYS: int = 7
+    WARMUP_PIPELINE_CHUNK: int = 500
+    WARMUP_LOCK_SECONDS: int = 120
+    WARMUP_RESULT_TTL_SECONDS: int = 600
+
+    EXPIRY_SWEEP_ENABLED: bool = True
+    EXPIRY_SWEEP_INTERVAL_SECONDS: float = 60.0
+    EXPIRY_SWEEP_BATCH_SIZE: int = 500
+    EXPIRY_SWEEP_MAX_BATCHES: int = 20
+    EXPIRY_PURGE_AFTER_DAYS: int = 0
+
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_AFTER_DAYS: int = 30
+    ARCHIVE_INTERVAL_SECONDS: float = 3600.0
+    ARCHIVE_BATCH_SIZE: int = 1000
+    ARCHIVE_MAX_BATCHES: int = 50
+    ARCHIVE_TOUCH_INTERVAL_SECONDS: int = 3600
+
+    SNAPSHOT_PATH: Optional[str] = None
+    SNAPSHOT_AUTHORITATIVE: bool = False
+    SNAPSHOT_DELTA_POLL_SECONDS: float = 1.0
+    SNAPSHOT_MAX_PENDING_DELTAS: int = 100000
+
+    EVENT_PUBLISH_DEGRADED_MODE: str = "spool"
+    EVENT_SPOOL_MAX_SIZE: int = 10000
+
+    REQUEST_DEADLINE_MS: int = 2000
+    REQUEST_DEADLINE_MIN_MS: int = 50
+    REQUEST_DEADLINE_MAX_MS: int = 10000
+    ROUTE_DEADLINES_MS: Dict[str, int] = {
+        "/{short_code}": 500,
+        "/api/v1/auth/register": 3000,
+        "/api/v1/auth/login": 3000,
+    }
+    # Callers allowed to set their own budget with X-Request-Deadline-Ms.
+    # Empty by default: behind a local reverse proxy every client would
+    # otherwise arrive from loopback.
+    REQUEST_DEADLINE_TRUSTED_NETWORKS: List[str] = []
 
     JWT_SECRET_KEY: str
     JWT_ALGORITHM: str = "HS256"
@@ -16,6 +107,41 @@ class Settings(BaseSettings):
     BCRYPT_ROUNDS: int = 12
 
     RATE_LIMIT_PER_MINUTE: int = 100
+
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "text"
+    LOG_ACCESS_SAMPLE_RATE: float = 1.0
+
+    TRAFFIC_CAPTURE_ENABLED: bool = False
+    TRAFFIC_CAPTURE_DIR: str = "capture"
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = 1.0
+    TRAFFIC_CAPTURE_MAX_BYTES: int = 64 * 1024 * 1024
+    TRAFFIC_CAPTURE_BACKUP_COUNT: int = 10
+    TRAFFIC_CAPTURE_HEADERS: List[str] = ["user-agent", "referer", "accept", "accept-language", "accept-encoding"]
+    TRAFFIC_CAPTURE_QUERY_PARAMS: List[str] = ["page", "page_size", "include_inactive"]
+    TRAFFIC_CAPTURE_IP_SALT: Optional[str] = None
+
+    METRICS_ENABLED: bool = True
+    # Server-Timing tells any client how long the database and Redis took;
+    # turn it on for staging or behind a proxy that strips it.
+    SERVER_TIMING_ENABLED: bool = False
+
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_SECONDS: float = 0.1
+    LOOP_BLOCK_CAPTURE_ENABLED: bool = False
+    LOOP_BLOCK_THRESHOLD_MS: float = 100.0
+    LOOP_BLOCK_STACK_DEPTH: int = 15
+
+    PROFILING_SECRET: Optional[str] = None
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_MAX_SECONDS: float = 60.0
+    PROFILING_KEEP_SECONDS: int = 3600
+
+    TRACING_ENABLED: bool = False
+    TRACING_SAMPLE_RATIO: float = 0.01
+    TRACING_EXPORTER: str = "otlp"
+    TRACING_OTLP_ENDPOINT: Optional[str] = None
+    TRACING_SERVICE_NAME: str = "url-shortener"
     CORS_ORIGINS: List[str] = ["*"]
 
     class Config:
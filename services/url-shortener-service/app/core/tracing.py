@@ -0,0 +1,171 @@
+# Optional OpenTelemetry tracing. The API package is a plain dependency and
+# does nothing on its own; spans are only recorded once setup_tracing() has
+# installed the SDK, which comes with the "tracing" extra.
+#
+# Head sampling keeps it affordable at full traffic: a request is traced
+# with probability TRACING_SAMPLE_RATIO and everything below it follows that
+# decision. A caller's traceparent is continued but does not force sampling,
+# since any public client can send one with the sampled flag set.
+# While tracing is off, traced() and the middleware wrapper skip span
+# creation entirely.
+from typing import Any, Callable, Optional
+import functools
+import inspect
+import logging
+
+from opentelemetry import propagate, trace
+
+from app.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+tracer = trace.get_tracer("linkpulse.url_shortener")
+
+enabled = False
+
+
+def _exporter(name: str):
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter(endpoint=settings.TRACING_OTLP_ENDPOINT)
+    if name == "console":
+        from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown TRACING_EXPORTER {name!r}")
+
+
+# The ratio decision hashes the trace id, so a caller sampling at the same
+# ratio still gets its sampled traces continued here.
+def _sampler(ratio: float):
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+    return ParentBased(TraceIdRatioBased(ratio), remote_parent_sampled=TraceIdRatioBased(ratio))
+
+
+# Installs the SDK tracer provider. Tests pass an InMemorySpanExporter, which
+# is exported synchronously so finished spans can be asserted on straight
+# away; real exporters go through a batch processor off the request path.
+def setup_tracing(exporter: Any = None, sample_ratio: Optional[float] = None) -> bool:
+    global enabled
+    try:
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
+    except ImportError:
+        logger.warning("Tracing is enabled but opentelemetry-sdk is not installed; install the 'tracing' extra")
+        return False
+
+    ratio = settings.TRACING_SAMPLE_RATIO if sample_ratio is None else sample_ratio
+    provider = TracerProvider(
+        resource=Resource.create({"service.name": settings.TRACING_SERVICE_NAME}),
+        sampler=_sampler(ratio),
+    )
+    if exporter is None:
+        provider.add_span_processor(BatchSpanProcessor(_exporter(settings.TRACING_EXPORTER)))
+    else:
+        provider.add_span_processor(SimpleSpanProcessor(exporter))
+
+    trace.set_tracer_provider(provider)
+    enabled = True
+    logger.info(f"Tracing enabled: exporter={settings.TRACING_EXPORTER if exporter is None else 'custom'} sample_ratio={ratio}")
+    return True
+
+
+def shutdown_tracing() -> None:
+    provider = trace.get_tracer_provider()
+    if enabled and hasattr(provider, "shutdown"):
+        provider.shutdown()
+
+
+def traced(name: str) -> Callable:
+    def decorator(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not enabled:
+                    return await fn(*args, **kwargs)
+                with tracer.start_as_current_span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            with tracer.start_as_current_span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Class decorator giving every public method its own span, named
+# "<Class>.<method>".
+def traced_methods(cls: type) -> type:
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("_") or not inspect.isfunction(value):
+            continue
+        setattr(cls, attr, traced(f"{cls.__name__}.{attr}")(value))
+    return cls
+
+
+# W3C trace context of the current span, for carrying into event payloads.
+# Empty when nothing is being recorded.
+def current_context_fields() -> dict[str, str]:
+    carrier: dict[str, str] = {}
+    if enabled and trace.get_current_span().get_span_context().is_valid:
+        propagate.inject(carrier)
+    return carrier
+
+
+# Wraps an ASGI middleware in a span covering it and everything below it;
+# the middleware's own cost is the part not covered by its children.
+class TracedMiddleware:
+    def __init__(self, app, wrapped: type, span_name: str, **options):
+        self.inner = wrapped(app, **options)
+        self.span_name = span_name
+
+    async def __call__(self, scope, receive, send):
+        if not enabled or scope["type"] != "http":
+            return await self.inner(scope, receive, send)
+        with tracer.start_as_current_span(self.span_name):
+            return await self.inner(scope, receive, send)
+
+
+# Outermost middleware: starts the server span, continuing the caller's
+# trace when it sent a traceparent header.
+class ServerSpanMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not enabled or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        status = {}
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        with tracer.start_as_current_span(
+            scope["method"],
+            context=propagate.extract(headers),
+            kind=trace.SpanKind.SERVER,
+            attributes={"http.request.method": scope["method"], "url.path": scope["path"]},
+        ) as span:
+            try:
+                await self.app(scope, receive, _send)
+            finally:
+                # Named after the route template once routing has found it,
+                # never after the path, so short codes do not each become a
+                # span name of their own.
+                route = scope.get("route")
+                if route is not None:
+                    span.update_name(f"{scope['method']} {route.path}")
+                    span.set_attribute("http.route", route.path)
+                if "code" in status:
+                    span.set_attribute("http.response.status_code", status["code"])
+                    if status["code"] >= 500:
+                        span.set_status(trace.Status(trace.StatusCode.ERROR))
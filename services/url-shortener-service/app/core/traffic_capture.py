@@ -0,0 +1,129 @@
+# Records live requests so their real shape (campaign bursts, scanner storms,
+# the popularity curve) can be replayed against a candidate build with
+#
+#   python -m tests.load.replay capture/requests-*.jsonl* --target http://candidate:8000
+#
+# With TRAFFIC_CAPTURE_ENABLED, LoggingMiddleware hands every sampled request
+# to capture(). The record goes on an in-memory queue, and a QueueListener
+# thread writes it as one JSON line to TRAFFIC_CAPTURE_DIR/requests-<pid>.jsonl,
+# rotated at TRAFFIC_CAPTURE_MAX_BYTES. Each worker writes its own file, so
+# rotation never races.
+#
+# A record holds:
+#   ts  start of the request, epoch seconds
+#   m   method
+#   p   path
+#   q   query string, when there is one, with values blanked
+#   r   route template
+#   h   the headers listed in TRAFFIC_CAPTURE_HEADERS
+#   s   status
+#   ms  time to answer
+#   c   client pseudonym
+#
+# Only the listed headers are kept, so credentials and cookies never reach
+# the file, and request bodies are not recorded. Query parameters keep their
+# names, but only those in TRAFFIC_CAPTURE_QUERY_PARAMS keep their values,
+# so tokens and emails passed in links are not written either. The client address is
+# replaced by a keyed hash. Set TRAFFIC_CAPTURE_IP_SALT to keep a client's
+# pseudonym the same across workers and restarts; without it, each process
+# picks a random key.
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import secrets
+
+from starlette.requests import Request
+
+from app.core.logging_config import DeferredQueueHandler
+from app.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+_capture_logger = logging.getLogger("linkpulse.capture")
+_capture_logger.propagate = False
+
+_listener: Optional[QueueListener] = None
+_salt = (settings.TRAFFIC_CAPTURE_IP_SALT or secrets.token_hex(16)).encode()
+_headers = tuple(name.lower() for name in settings.TRAFFIC_CAPTURE_HEADERS)
+_query_params = frozenset(settings.TRAFFIC_CAPTURE_QUERY_PARAMS)
+
+
+class CaptureFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.capture, separators=(",", ":"))
+
+
+def anonymize_ip(ip: Optional[str]) -> Optional[str]:
+    if not ip:
+        return None
+    return hmac.new(_salt, ip.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def redact_query(query: str) -> str:
+    params = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(name, value if name in _query_params else "") for name, value in params])
+
+
+def start(directory: Optional[str] = None) -> str:
+    global _listener
+    directory = directory or settings.TRAFFIC_CAPTURE_DIR
+    path = os.path.join(directory, f"requests-{os.getpid()}.jsonl")
+    if _listener is not None:
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    output = RotatingFileHandler(
+        path,
+        maxBytes=settings.TRAFFIC_CAPTURE_MAX_BYTES,
+        backupCount=settings.TRAFFIC_CAPTURE_BACKUP_COUNT,
+        encoding="utf-8",
+    )
+    output.setFormatter(CaptureFormatter())
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _capture_logger.addHandler(DeferredQueueHandler(records))
+    _capture_logger.setLevel(logging.INFO)
+    _listener = QueueListener(records, output)
+    _listener.start()
+    logger.info(f"Capturing traffic to {path}")
+    return path
+
+
+# Writes out what is still queued and closes the file.
+def stop() -> None:
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    for handler in list(_capture_logger.handlers):
+        _capture_logger.removeHandler(handler)
+    _listener = None
+
+
+def capture(request: Request, route: str, status: int, started_at: float, duration: float) -> None:
+    if _listener is None:
+        return
+    headers = request.headers
+    record = {
+        "ts": round(started_at, 6),
+        "m": request.method,
+        "p": request.url.path,
+        "r": route,
+        "h": {name: headers[name] for name in _headers if name in headers},
+        "s": status,
+        "ms": round(duration * 1000, 3),
+        "c": anonymize_ip(request.client.host if request.client else None),
+    }
+    query = request.scope.get("query_string")
+    if query:
+        record["q"] = redact_query(query.decode("latin-1"))
+    _capture_logger.info("", extra={"capture": record})
@@ -0,0 +1,198 @@
+# Online conversion of short_urls into a hash-partitioned table.
+#
+#   SHORT_URL_PARTITION_COUNT=32 python -m app.db.partition_migration prepare
+#   SHORT_URL_PARTITION_COUNT=32 python -m app.db.partition_migration backfill --batch-size 50000
+#   SHORT_URL_PARTITION_COUNT=32 python -m app.db.partition_migration verify --fix
+#   SHORT_URL_PARTITION_COUNT=32 python -m app.db.partition_migration swap
+#
+# prepare builds short_urls_new from the current model with one partition per
+# remainder, and installs a trigger that mirrors every write on short_urls into
+# it. backfill copies existing rows in id ranges and can be resumed. swap
+# renames the tables under a short exclusive lock and keeps the old heap as
+# short_urls_unpartitioned until it is dropped by hand.
+import argparse
+import logging
+import sys
+import time
+
+from sqlalchemy import MetaData, PrimaryKeyConstraint, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateIndex, CreateTable, DefaultClause
+
+from app.core.settings import settings
+from app.db.partitioning import SHORT_URLS_PARTITION_KEY, hash_partition_ddl, partition_name
+from app.db.session import engine
+from app.models.url_models import ShortUrl, User
+
+
+logger = logging.getLogger("linkpulse.partition_migration")
+
+SOURCE = ShortUrl.__tablename__
+TARGET = f"{SOURCE}_new"
+RETIRED = f"{SOURCE}_unpartitioned"
+MIRROR_FUNCTION = f"{SOURCE}_mirror_to_new"
+MIRROR_TRIGGER = f"{SOURCE}_mirror_to_new_trg"
+
+COLUMNS = [column.name for column in ShortUrl.__table__.columns]
+
+
+def _column_list(prefix: str = "") -> str:
+    return ", ".join(f"{prefix}{name}" for name in COLUMNS)
+
+
+def _target_table():
+    metadata = MetaData()
+    User.__table__.to_metadata(metadata)
+    target = ShortUrl.__table__.to_metadata(metadata, name=TARGET)
+    # Partitioned and keyed on (id, short_code) whatever the model was
+    # imported with, since prepare() takes the partition count as given.
+    target.append_constraint(PrimaryKeyConstraint("id", SHORT_URLS_PARTITION_KEY))
+    target.dialect_options["postgresql"]["partition_by"] = f"HASH ({SHORT_URLS_PARTITION_KEY})"
+    target.c.id.autoincrement = False
+    target.c.id.server_default = DefaultClause(text(f"nextval('{SOURCE}_id_seq')"))
+    # Column-level indexes are already named after the new table; explicitly
+    # named ones still carry the old name and must not collide with it.
+    for index in target.indexes:
+        if TARGET not in index.name:
+            index.name = index.name.replace(SOURCE, TARGET, 1)
+    return target
+
+
+def _table_exists(conn: Connection, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}).scalar()
+
+
+def prepare(conn: Connection, partitions: int) -> None:
+    if _table_exists(conn, TARGET):
+        logger.info(f"{TARGET} already exists, leaving it in place")
+    else:
+        target = _target_table()
+        conn.execute(CreateTable(target))
+        for ddl in hash_partition_ddl(TARGET, partitions):
+            conn.exec_driver_sql(ddl)
+        for index in target.indexes:
+            conn.execute(CreateIndex(index))
+        logger.info(f"Created {TARGET} with {partitions} hash partitions")
+
+    updates = ", ".join(f"{name} = EXCLUDED.{name}" for name in COLUMNS if name != "short_code")
+    conn.exec_driver_sql(f"""
+        CREATE OR REPLACE FUNCTION {MIRROR_FUNCTION}() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                DELETE FROM {TARGET} WHERE id = OLD.id AND short_code = OLD.short_code;
+                RETURN OLD;
+            END IF;
+            INSERT INTO {TARGET} ({_column_list()}) VALUES ({_column_list("NEW.")})
+            ON CONFLICT (short_code) DO UPDATE SET {updates};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {SOURCE}")
+    conn.exec_driver_sql(
+        f"CREATE TRIGGER {MIRROR_TRIGGER} AFTER INSERT OR UPDATE OR DELETE ON {SOURCE} "
+        f"FOR EACH ROW EXECUTE FUNCTION {MIRROR_FUNCTION}()"
+    )
+    logger.info(f"Mirroring writes on {SOURCE} into {TARGET}")
+
+
+def backfill(start_id: int, batch_size: int, pause: float) -> None:
+    with engine.connect() as conn:
+        max_id = conn.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {SOURCE}")).scalar()
+
+    # Rows the trigger already mirrored are newer than the batch snapshot, so
+    # conflicts keep the mirrored version.
+    statement = text(
+        f"INSERT INTO {TARGET} ({_column_list()}) "
+        f"SELECT {_column_list()} FROM {SOURCE} WHERE id > :low AND id <= :high "
+        f"ON CONFLICT (short_code) DO NOTHING"
+    )
+
+    low = start_id
+    while low < max_id:
+        high = min(low + batch_size, max_id)
+        with engine.begin() as conn:
+            copied = conn.execute(statement, {"low": low, "high": high}).rowcount
+        logger.info(f"Copied ids ({low}, {high}]: {copied} rows; resume with --start-id {high}")
+        low = high
+        if pause:
+            time.sleep(pause)
+
+
+def verify(conn: Connection, fix: bool) -> int:
+    missing = conn.execute(text(
+        f"SELECT count(*) FROM {SOURCE} o WHERE NOT EXISTS "
+        f"(SELECT 1 FROM {TARGET} n WHERE n.short_code = o.short_code)"
+    )).scalar()
+    orphaned = conn.execute(text(
+        f"SELECT count(*) FROM {TARGET} n WHERE NOT EXISTS "
+        f"(SELECT 1 FROM {SOURCE} o WHERE o.short_code = n.short_code)"
+    )).scalar()
+    logger.info(f"{missing} rows missing from {TARGET}, {orphaned} rows only in {TARGET}")
+
+    if fix and orphaned:
+        conn.execute(text(
+            f"DELETE FROM {TARGET} n WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {SOURCE} o WHERE o.short_code = n.short_code)"
+        ))
+        logger.info(f"Removed {orphaned} orphaned rows")
+        orphaned = 0
+
+    return missing + orphaned
+
+
+def swap(conn: Connection, partitions: int) -> None:
+    conn.exec_driver_sql(f"LOCK TABLE {SOURCE} IN ACCESS EXCLUSIVE MODE")
+    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {MIRROR_TRIGGER} ON {SOURCE}")
+    conn.exec_driver_sql(f"DROP FUNCTION IF EXISTS {MIRROR_FUNCTION}()")
+
+    for index in ShortUrl.__table__.indexes:
+        conn.exec_driver_sql(f"ALTER INDEX IF EXISTS {index.name} RENAME TO {index.name.replace(SOURCE, RETIRED, 1)}")
+    conn.exec_driver_sql(f"ALTER TABLE {SOURCE} RENAME TO {RETIRED}")
+
+    conn.exec_driver_sql(f"ALTER TABLE {TARGET} RENAME TO {SOURCE}")
+    for index in ShortUrl.__table__.indexes:
+        conn.exec_driver_sql(f"ALTER INDEX {index.name.replace(SOURCE, TARGET, 1)} RENAME TO {index.name}")
+    for i in range(partitions):
+        conn.exec_driver_sql(f"ALTER TABLE {partition_name(TARGET, i)} RENAME TO {partition_name(SOURCE, i)}")
+
+    conn.exec_driver_sql(f"ALTER SEQUENCE {SOURCE}_id_seq OWNED BY {SOURCE}.id")
+    logger.info(f"{SOURCE} is now partitioned; the old heap is kept as {RETIRED}")
+
+
+def main(argv: list[str] | None = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Convert short_urls to hash partitions online")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("prepare")
+    backfill_cmd = sub.add_parser("backfill")
+    backfill_cmd.add_argument("--start-id", type=int, default=0)
+    backfill_cmd.add_argument("--batch-size", type=int, default=50000)
+    backfill_cmd.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    verify_cmd = sub.add_parser("verify")
+    verify_cmd.add_argument("--fix", action="store_true", help="delete rows that only exist in the new table")
+    sub.add_parser("swap")
+    args = parser.parse_args(argv)
+
+    partitions = settings.SHORT_URL_PARTITION_COUNT
+    if partitions <= 0:
+        logger.error("Set SHORT_URL_PARTITION_COUNT to the desired number of partitions")
+        return 2
+
+    if args.command == "prepare":
+        with engine.begin() as conn:
+            prepare(conn, partitions)
+    elif args.command == "backfill":
+        backfill(args.start_id, args.batch_size, args.pause)
+    elif args.command == "verify":
+        with engine.begin() as conn:
+            return 1 if verify(conn, args.fix) else 0
+    elif args.command == "swap":
+        with engine.begin() as conn:
+            swap(conn, partitions)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
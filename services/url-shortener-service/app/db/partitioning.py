@@ -0,0 +1,49 @@
+from typing import Optional
+
+from sqlalchemy import text
+
+
+SHORT_URLS_PARTITION_KEY = "short_code"
+
+
+def partition_name(parent: str, remainder: int) -> str:
+    return f"{parent}_p{remainder:03d}"
+
+
+def hash_partition_ddl(parent: str, count: int) -> list[str]:
+    return [
+        f"CREATE TABLE IF NOT EXISTS {partition_name(parent, i)} PARTITION OF {parent} "
+        f"FOR VALUES WITH (MODULUS {count}, REMAINDER {i})"
+        for i in range(count)
+    ]
+
+
+# The partitions of a partitioned table, or None for a plain one.
+def partitions_of(conn, table: str) -> Optional[list[str]]:
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {"table": table}
+    ).scalar()
+    if relkind != "p":
+        return None
+    return list(conn.execute(
+        text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(:table) ORDER BY 1"),
+        {"table": table},
+    ).scalars())
+
+
+def partition_index_name(index: str, table: str, partition: str) -> str:
+    return index.replace(table, partition, 1) if table in index else f"{partition}_{index}"
+
+
+# CREATE INDEX CONCURRENTLY is refused on a partitioned table. Creating the
+# index ON ONLY the parent is a catalog change that leaves it invalid; each
+# partition's index is then built concurrently and attached, and the parent
+# index turns valid with the last one. Every step can be run again after a
+# failure. Run outside a transaction, like any CONCURRENTLY.
+def partitioned_index_ddl(index: str, table: str, definition: str, partitions: list[str]) -> list[str]:
+    ddl = [f"CREATE INDEX IF NOT EXISTS {index} ON ONLY {table} {definition}"]
+    for partition in partitions:
+        child = partition_index_name(index, table, partition)
+        ddl.append(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} {definition}")
+        ddl.append(f"ALTER INDEX {index} ATTACH PARTITION {child}")
+    return ddl
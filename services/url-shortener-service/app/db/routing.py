@@ -0,0 +1,172 @@
+from typing import Callable, Optional
+import asyncio
+import functools
+import logging
+import random
+import time
+import weakref
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app.core.metrics import db_sessions_live
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.redis_keys import read_your_writes_key
+from app.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+REPLICA_LAG_QUERY = text(
+    "SELECT CASE "
+    "WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) "
+    "END"
+)
+
+
+class ReplicaPool:
+    def __init__(self, engines: list[Engine], max_lag_seconds: float):
+        self.engines = engines
+        self.max_lag_seconds = max_lag_seconds
+        self._healthy: list[Engine] = []
+        self.lag: dict[str, Optional[float]] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    def choose(self) -> Optional[Engine]:
+        if not self._healthy:
+            return None
+        return random.choice(self._healthy)
+
+    def check_lag(self) -> None:
+        healthy = []
+        for replica in self.engines:
+            name = replica.url.render_as_string(hide_password=True)
+            try:
+                with replica.connect() as conn:
+                    lag = float(conn.execute(REPLICA_LAG_QUERY).scalar() or 0)
+            except Exception as e:
+                logger.warning(f"Replica {name} unreachable: {e}")
+                self.lag[name] = None
+                continue
+
+            self.lag[name] = lag
+            if lag <= self.max_lag_seconds:
+                healthy.append(replica)
+            else:
+                logger.warning(f"Replica {name} lagging by {lag:.1f}s, routing reads to primary")
+
+        self._healthy = healthy
+
+    async def monitor(self, interval: float) -> None:
+        while True:
+            await asyncio.to_thread(self.check_lag)
+            await asyncio.sleep(interval)
+
+    def status(self) -> dict:
+        return {
+            "configured": len(self.engines),
+            "healthy": len(self._healthy),
+            "lag_seconds": self.lag,
+        }
+
+
+# Counts sessions from creation until they are garbage collected, not until
+# close(): a session kept alive by a stray reference is what leaks.
+class TrackedSession(Session):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        db_sessions_live.inc()
+        weakref.finalize(self, db_sessions_live.dec)
+
+
+class RoutingSession(TrackedSession):
+    def __init__(self, *args, replicas: Optional[ReplicaPool] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.replicas = replicas
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            self.replicas is not None
+            and self.info.get("use_replica")
+            and not self.info.get("sticky_primary")
+            and not self._flushing
+        ):
+            replica = self.replicas.choose()
+            if replica is not None:
+                self.info["read_from_replica"] = True
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+
+# Routes a repository read to a healthy replica. With retry_on_miss, a None
+# read from a replica is repeated on the primary, so a row the replica has not
+# replayed yet is not reported as missing.
+def replica_read(retry_on_miss: bool = False) -> Callable:
+    def decorator(method: Callable) -> Callable:
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            session = self.db
+            previous = session.info.get("use_replica", False)
+            session.info["use_replica"] = True
+            session.info["read_from_replica"] = False
+            try:
+                result = method(self, *args, **kwargs)
+            finally:
+                session.info["use_replica"] = previous
+
+            if result is None and retry_on_miss and session.info.pop("read_from_replica", False):
+                result = method(self, *args, **kwargs)
+            return result
+        return wrapper
+    return decorator
+
+
+# Last write per user in this process; Redis carries it across workers.
+_recent_writes: dict[int, float] = {}
+
+
+def record_user_write(user_id: int) -> None:
+    window = settings.READ_YOUR_WRITES_SECONDS
+    now = time.monotonic()
+    if len(_recent_writes) > 10000:
+        for uid in [uid for uid, until in _recent_writes.items() if until <= now]:
+            del _recent_writes[uid]
+    _recent_writes[user_id] = now + window
+
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+
+    async def _publish():
+        try:
+            await RedisSingleton.execute(lambda r: r.set(read_your_writes_key(user_id), 1, ex=window))
+        except Exception as e:
+            logger.warning(f"Could not record write marker for user {user_id}: {e}")
+
+    loop.create_task(_publish())
+
+
+async def pin_user_to_primary_if_recent_write(db: Session, user_id: int) -> None:
+    db.info["user_id"] = user_id
+    if not getattr(db, "replicas", None) or not db.replicas.enabled:
+        return
+
+    until = _recent_writes.get(user_id)
+    if until is not None:
+        if until > time.monotonic():
+            db.info["sticky_primary"] = True
+            return
+        _recent_writes.pop(user_id, None)
+
+    try:
+        if await RedisSingleton.execute(lambda r: r.exists(read_your_writes_key(user_id))):
+            db.info["sticky_primary"] = True
+    except RedisUnavailableError:
+        # Without the marker we cannot tell, so stay on the safe side.
+        db.info["sticky_primary"] = True
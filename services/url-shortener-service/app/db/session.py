@@ -1,18 +1,104 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from typing import Generator
+import time
 
+from app.core import deadline, io_accounting
+from app.core.metrics import db_pool_checkout_wait, db_query_duration
 from app.core.settings import settings
+from app.db.routing import ReplicaPool, RoutingSession, record_user_write
+from app.db.sharding import ShardRouter
 
 
-DATABASE_URL = settings.DATABASE_URL
-if DATABASE_URL.startswith("postgresql+asyncpg://"):
-    DATABASE_URL = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql+psycopg2://")
+def _sync_url(url: str) -> str:
+    if url.startswith("postgresql+asyncpg://"):
+        return url.replace("postgresql+asyncpg://", "postgresql+psycopg2://")
+    return url
 
-engine = create_engine(
-    DATABASE_URL,
-    pool_pre_ping=True,
-    future=True,
+
+DATABASE_URL = _sync_url(settings.DATABASE_URL)
+
+IS_POSTGRES = make_url(DATABASE_URL).get_backend_name() == "postgresql"
+
+
+def _fail_fast_on_spent_budget(conn, cursor, statement, parameters, context, executemany):
+    deadline.ensure("db")
+
+
+def _map_budget_cancellation(context):
+    left = deadline.remaining()
+    if left is not None and left <= 0 and isinstance(context.sqlalchemy_exception, OperationalError):
+        deadline.record_exhausted("db")
+        raise deadline.DeadlineExceeded("db") from context.original_exception
+
+
+# The time includes opening a new connection when the pool is below its
+# size, which is also time a request spends waiting for one. Subclassed per
+# engine because the pool recreates itself from its own class.
+def _timed_pool_class(database: str) -> type[QueuePool]:
+    wait = db_pool_checkout_wait.labels(database)
+
+    class TimedQueuePool(QueuePool):
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                return super()._do_get()
+            finally:
+                wait.observe(time.perf_counter() - started)
+
+    return TimedQueuePool
+
+
+def _time_queries(db_engine: Engine, database: str) -> None:
+    duration = db_query_duration.labels(database)
+
+    def _started(conn, cursor, statement, parameters, context, executemany):
+        context._query_started = time.perf_counter()
+
+    def _finished(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - context._query_started
+        duration.observe(elapsed)
+        io_accounting.record_db(elapsed)
+
+    event.listen(db_engine, "before_cursor_execute", _started)
+    event.listen(db_engine, "after_cursor_execute", _finished)
+
+
+def create_db_engine(url: str, database: str = "primary") -> Engine:
+    connect_args = {}
+    pool_args = {}
+    if IS_POSTGRES:
+        connect_args["options"] = f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"
+        pool_args["poolclass"] = _timed_pool_class(database)
+
+    db_engine = create_engine(
+        _sync_url(url),
+        pool_pre_ping=True,
+        future=True,
+        connect_args=connect_args,
+        **pool_args,
+    )
+    event.listen(db_engine, "before_cursor_execute", _fail_fast_on_spent_budget)
+    event.listen(db_engine, "handle_error", _map_budget_cancellation)
+    _time_queries(db_engine, database)
+    return db_engine
+
+
+engine = create_db_engine(DATABASE_URL)
+
+replica_pool = ReplicaPool(
+    [create_db_engine(url, database=f"replica{i}") for i, url in enumerate(settings.DATABASE_REPLICA_URLS)],
+    max_lag_seconds=settings.REPLICA_MAX_LAG_SECONDS,
+)
+
+shard_router = ShardRouter(
+    {name: create_db_engine(url, database=f"shard:{name}") for name, url in settings.SHARD_DATABASE_URLS.items()},
+    strategy=settings.SHARD_STRATEGY,
+    virtual_nodes=settings.SHARD_VIRTUAL_NODES,
+    prefix_map=settings.SHARD_PREFIX_MAP,
 )
 
 SessionLocal = sessionmaker(
@@ -20,13 +106,51 @@ SessionLocal = sessionmaker(
     autoflush=False,
     autocommit=False,
     expire_on_commit=False,
-    class_=Session,
+    class_=RoutingSession,
+    replicas=replica_pool,
 )
 
 
+@event.listens_for(SessionLocal, "after_flush")
+def _stick_to_primary_after_write(session, flush_context):
+    session.info["sticky_primary"] = True
+    session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _stick_to_primary_after_bulk_write(orm_execute_state):
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info["sticky_primary"] = True
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_user_write(session):
+    user_id = session.info.get("user_id")
+    if session.info.pop("wrote", False) and user_id is not None and replica_pool.enabled:
+        record_user_write(user_id)
+
+
+@event.listens_for(SessionLocal, "after_begin")
+def _apply_request_budget(session, transaction, connection):
+    # The engine-wide statement_timeout is the ceiling; only pay for an extra
+    # round trip when the request has less budget left than that.
+    left = deadline.remaining()
+    if not IS_POSTGRES or left is None:
+        return
+    budget_ms = int(left * 1000)
+    if budget_ms < settings.DB_STATEMENT_TIMEOUT_MS:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {max(budget_ms, 1)}")
+
+
+for shard_sessionmaker in shard_router.sessionmakers.values():
+    event.listen(shard_sessionmaker, "after_begin", _apply_request_budget)
+
+
 def get_db() -> Generator[Session, None, None]:
     db = SessionLocal()
     try:
         yield db
     finally:
+        shard_router.close_sessions(db)
         db.close()
@@ -0,0 +1,148 @@
+# Schema and rebalancing tool for sharded short_urls.
+#
+#   python -m app.db.shard_admin create-schema
+#   python -m app.db.shard_admin rebalance --dry-run
+#   python -m app.db.shard_admin rebalance --batch-size 1000
+#
+# Shards come from SHARD_DATABASE_URLS. rebalance walks every shard and moves
+# rows that the current routing (strategy, ring or SHARD_PREFIX_MAP) places
+# elsewhere; it needs no record of the previous topology and can be re-run
+# after an interruption. Enable SHARD_LOOKUP_FALLBACK on the app while it runs.
+import argparse
+import logging
+import sys
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import Column, Table, delete, insert, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.db.partitioning import hash_partition_ddl
+from app.db.session import shard_router
+from app.db.sharding import ShardRouter
+from app.models.url_models import SHORT_URL_PARTITIONS, ArchivedShortUrl, ShortUrl
+
+
+logger = logging.getLogger("linkpulse.shard_admin")
+
+SHARDED_TABLES = [ShortUrl.__table__, ArchivedShortUrl.__table__]
+
+
+def create_schema(db_engine: Engine) -> bool:
+    created = False
+    with db_engine.begin() as conn:
+        for table in SHARDED_TABLES:
+            if inspect(conn).has_table(table.name):
+                continue
+            # users stays on the primary database, so the shards carry no FK.
+            conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+            if table is ShortUrl.__table__ and SHORT_URL_PARTITIONS and conn.dialect.name == "postgresql":
+                for ddl in hash_partition_ddl(table.name, SHORT_URL_PARTITIONS):
+                    conn.exec_driver_sql(ddl)
+            for index in table.indexes:
+                conn.execute(CreateIndex(index))
+            created = True
+    return created
+
+
+# short_urls ids are assigned per shard, so moved rows get a new one.
+def _moved_columns(table: Table) -> list[Column]:
+    return [column for column in table.columns if column.name != "id"]
+
+
+def _move_batch(
+    router: ShardRouter,
+    table: Table,
+    source: str,
+    after_code: str,
+    batch_size: int,
+    dry_run: bool,
+) -> tuple[Optional[str], Counter]:
+    moved: Counter = Counter()
+    with router.engines[source].begin() as source_conn:
+        # Locked until the rows are deleted, so a concurrent update cannot
+        # land on a copy that is about to disappear.
+        rows = source_conn.execute(
+            select(table)
+            .where(table.c.short_code > after_code)
+            .order_by(table.c.short_code)
+            .limit(batch_size)
+            .with_for_update()
+        ).all()
+        if not rows:
+            return None, moved
+
+        misplaced: dict[str, list] = {}
+        for row in rows:
+            owner = router.shard_for(row.short_code)
+            if owner != source:
+                misplaced.setdefault(owner, []).append(row)
+
+        for target, target_rows in misplaced.items():
+            moved[(source, target)] += len(target_rows)
+            if dry_run:
+                continue
+
+            codes = [row.short_code for row in target_rows]
+            with router.engines[target].begin() as target_conn:
+                present = set(target_conn.execute(
+                    select(table.c.short_code).where(table.c.short_code.in_(codes))
+                ).scalars())
+                values = [
+                    {column.name: row._mapping[column.name] for column in _moved_columns(table)}
+                    for row in target_rows
+                    if row.short_code not in present
+                ]
+                if values:
+                    target_conn.execute(insert(table), values)
+
+            # Copied and committed first: a crash here leaves a duplicate that
+            # the next run skips, never a lost row.
+            source_conn.execute(delete(table).where(table.c.short_code.in_(codes)))
+
+        return rows[-1].short_code, moved
+
+
+def rebalance(router: ShardRouter, batch_size: int = 1000, dry_run: bool = False) -> Counter:
+    moved: Counter = Counter()
+    for table in SHARDED_TABLES:
+        for source in router.names:
+            after_code = ""
+            while after_code is not None:
+                after_code, batch_moved = _move_batch(router, table, source, after_code, batch_size, dry_run)
+                moved.update(batch_moved)
+            logger.info(f"Scanned {table.name} on {source}")
+
+    for (source, target), count in sorted(moved.items()):
+        verb = "would move" if dry_run else "moved"
+        logger.info(f"{source} -> {target}: {verb} {count} rows")
+    return moved
+
+
+def main(argv: list[str] | None = None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    parser = argparse.ArgumentParser(description="Manage sharded short_urls")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("create-schema")
+    rebalance_cmd = sub.add_parser("rebalance")
+    rebalance_cmd.add_argument("--batch-size", type=int, default=1000)
+    rebalance_cmd.add_argument("--dry-run", action="store_true", help="only count misplaced rows")
+    args = parser.parse_args(argv)
+
+    if not shard_router.enabled:
+        logger.error("Set SHARD_DATABASE_URLS to the shard databases")
+        return 2
+
+    if args.command == "create-schema":
+        for name in shard_router.names:
+            created = create_schema(shard_router.engines[name])
+            logger.info(f"{name}: {'created' if created else 'already present'}")
+    elif args.command == "rebalance":
+        rebalance(shard_router, args.batch_size, args.dry_run)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
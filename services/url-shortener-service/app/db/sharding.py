@@ -0,0 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+import bisect
+import contextvars
+import hashlib
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.db.routing import TrackedSession
+from app.utils.short_url_service_utils import BASE62_ALPHABET
+
+
+T = TypeVar("T")
+
+STRATEGY_PREFIX = "prefix"
+STRATEGY_HASH = "hash"
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+# Short links live on one of several Postgres databases; users stay on the
+# primary. A code is routed either by its first character (one of 62 prefix
+# slots, each owned by a shard and movable through the prefix map) or by a
+# consistent-hash ring with virtual nodes, so adding a shard only moves the
+# codes that land on its arc of the ring.
+class ShardRouter:
+    def __init__(
+        self,
+        engines: dict[str, Engine],
+        strategy: str = STRATEGY_HASH,
+        virtual_nodes: int = 64,
+        prefix_map: Optional[dict[str, str]] = None,
+    ):
+        if strategy not in (STRATEGY_PREFIX, STRATEGY_HASH):
+            raise ValueError(f"Unknown shard strategy: {strategy}")
+
+        self.engines = engines
+        self.strategy = strategy
+        self.names = sorted(engines)
+        self._sessionmakers = {
+            name: sessionmaker(
+                bind=db_engine,
+                autoflush=False,
+                autocommit=False,
+                expire_on_commit=False,
+                class_=TrackedSession,
+            )
+            for name, db_engine in engines.items()
+        }
+
+        self._prefix_owner = {
+            char: self.names[i % len(self.names)]
+            for i, char in enumerate(BASE62_ALPHABET)
+        } if self.names else {}
+        for char, name in (prefix_map or {}).items():
+            if name not in engines:
+                raise ValueError(f"Prefix {char!r} mapped to unknown shard {name!r}")
+            self._prefix_owner[char] = name
+
+        self._ring = sorted(
+            (_hash64(f"{name}#{i}"), name)
+            for name in self.names
+            for i in range(virtual_nodes)
+        )
+        self._ring_keys = [point for point, _ in self._ring]
+
+        # One thread per shard, kept for the life of the router (the app's is
+        # the module-level shard_router), so a fan-out does not start and
+        # join a pool on every call.
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self.names)),
+            thread_name_prefix="shard-fan-out",
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.engines)
+
+    @property
+    def sessionmakers(self) -> dict[str, sessionmaker]:
+        return self._sessionmakers
+
+    def shard_for(self, short_code: str) -> str:
+        if self.strategy == STRATEGY_PREFIX:
+            owner = self._prefix_owner.get(short_code[:1])
+            if owner is not None:
+                return owner
+            # Custom aliases may start outside the base62 alphabet.
+            return self.names[_hash64(short_code[:1]) % len(self.names)]
+
+        i = bisect.bisect(self._ring_keys, _hash64(short_code)) % len(self._ring)
+        return self._ring[i][1]
+
+    def new_session(self, shard: str) -> Session:
+        return self._sessionmakers[shard]()
+
+    # Shard sessions opened during a request hang off the primary session and
+    # are closed with it in get_db.
+    def session(self, db: Session, shard: str) -> Session:
+        sessions = db.info.setdefault("shard_sessions", {})
+        if shard not in sessions:
+            sessions[shard] = self.new_session(shard)
+        return sessions[shard]
+
+    def session_for(self, db: Session, short_code: str) -> Session:
+        return self.session(db, self.shard_for(short_code))
+
+    def close_sessions(self, db: Session) -> None:
+        for shard_session in db.info.pop("shard_sessions", {}).values():
+            shard_session.close()
+
+    # Runs fn(session) on every shard concurrently, each in its own session
+    # because sessions are not thread-safe. Each worker gets a copy of the
+    # caller's context so the request deadline still applies. Results come
+    # back in shard order.
+    def fan_out(self, fn: Callable[[Session], T]) -> list[T]:
+        def _run(shard: str) -> T:
+            with self.new_session(shard) as shard_session:
+                return fn(shard_session)
+
+        futures = [
+            self._executor.submit(contextvars.copy_context().run, _run, name)
+            for name in self.names
+        ]
+        return [future.result() for future in futures]
+
+    def status(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "shards": self.names,
+        }
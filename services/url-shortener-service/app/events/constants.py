@@ -6,6 +6,7 @@ EVENT_URL_UPDATED = "url.updated"
 EVENT_URL_DELETED = "url.deleted"
 EVENT_URL_DISABLED = "url.disabled"
 EVENT_URL_ENABLED = "url.enabled"
+EVENT_URL_EXPIRED = "url.expired"
 
 EVENT_USER_REGISTERED = "user.registered"
 EVENT_USER_LOGGED_IN = "user.logged_in"
@@ -1,10 +1,23 @@
+from collections import deque
 from datetime import datetime, timezone
+from typing import Optional
+import asyncio
 import json
 import logging
+import time
 
 from pydantic import BaseModel
 
-from app.core.redis import RedisSingleton
+from app.core import deadline, tracing
+from app.core.metrics import (
+    EVENTS_DROPPED,
+    EVENTS_SPOOLED,
+    event_publish_duration,
+    event_publish_pending,
+    event_spool_depth,
+)
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.settings import settings
 from app.events.constants import STREAM_NAME
 
 
@@ -13,41 +26,143 @@ logger = logging.getLogger(__name__)
 
 class EventPublisher:
     def __init__(self):
-        self._redis = None
+        self._spool: deque[dict] = deque(maxlen=settings.EVENT_SPOOL_MAX_SIZE)
+        self._flush_task: Optional[asyncio.Task] = None
+        self._pending: set[asyncio.Task] = set()
+        self.dropped = 0
 
     @property
-    def redis(self):
-        if self._redis is None:
-            self._redis = RedisSingleton.get_instance()
-        return self._redis
+    def spooled(self) -> int:
+        return len(self._spool)
 
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # Publishes without making the caller wait. The loop only keeps weak
+    # references to tasks, so the set holds them until they finish; its size
+    # is the gauge to watch when memory grows under a slow Redis.
+    def publish_in_background(self, event_type: str, payload: BaseModel) -> asyncio.Task:
+        task = asyncio.create_task(self.publish(event_type, payload))
+        self._pending.add(task)
+        event_publish_pending.inc()
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._pending.discard(task)
+        event_publish_pending.dec()
+
+    @tracing.traced("EventPublisher.publish")
     async def publish(self, event_type: str, payload: BaseModel) -> str:
         try:
-            event_data = {
-                "type": event_type,
-                "payload": payload.model_dump_json(),
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            message_id = await self.redis.xadd(STREAM_NAME, event_data)
-            logger.debug(f"Published event {event_type} with id {message_id}")
-            return message_id
+            event_data = self.event_data(event_type, payload.model_dump_json())
         except Exception as e:
             logger.error(f"Failed to publish event {event_type}: {e}")
             return ""
+        return await self._send(event_type, event_data)
 
+    @tracing.traced("EventPublisher.publish")
     async def publish_raw(self, event_type: str, payload: dict) -> str:
         try:
-            event_data = {
-                "type": event_type,
-                "payload": json.dumps(payload),
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            message_id = await self.redis.xadd(STREAM_NAME, event_data)
-            logger.debug(f"Published event {event_type} with id {message_id}")
-            return message_id
+            event_data = self.event_data(event_type, json.dumps(payload))
+        except Exception as e:
+            logger.error(f"Failed to publish event {event_type}: {e}")
+            return ""
+        return await self._send(event_type, event_data)
+
+    # The stream entry for an event. Sampled events carry the traceparent of
+    # the publishing span, so a consumer can continue the request's trace.
+    @staticmethod
+    def event_data(event_type: str, payload_json: str) -> dict:
+        return {
+            "type": event_type,
+            "payload": payload_json,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            **tracing.current_context_fields(),
+        }
+
+    async def _send(self, event_type: str, event_data: dict) -> str:
+        if not RedisSingleton.is_available():
+            self._degrade(event_type, event_data)
+            return ""
+
+        # Events spooled during an outage go out first. A new one joins the
+        # back of the spool while it drains, so consumers see a link's events
+        # in the order they happened.
+        if self._spool:
+            self._spool_event(event_data)
+            self._start_flush()
+            return ""
+
+        started = time.perf_counter()
+        try:
+            message_id = await RedisSingleton.execute(
+                lambda r: r.xadd(STREAM_NAME, event_data),
+                stage="publish",
+            )
+        except deadline.DeadlineExceeded:
+            self._degrade(event_type, event_data)
+            return ""
+        except RedisUnavailableError as e:
+            logger.warning(f"Redis unavailable while publishing {event_type}: {e}")
+            self._degrade(event_type, event_data)
+            return ""
         except Exception as e:
             logger.error(f"Failed to publish event {event_type}: {e}")
             return ""
 
+        event_publish_duration.observe(time.perf_counter() - started)
+        logger.debug(f"Published event {event_type} with id {message_id}")
+        return message_id
+
+    def _start_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self.flush_spool())
+
+    def _spool_event(self, event_data: dict) -> None:
+        if len(self._spool) == self._spool.maxlen:
+            self.dropped += 1
+            EVENTS_DROPPED.inc()
+        self._spool.append(event_data)
+        EVENTS_SPOOLED.inc()
+        event_spool_depth.set(len(self._spool))
+
+    def _degrade(self, event_type: str, event_data: dict) -> None:
+        if settings.EVENT_PUBLISH_DEGRADED_MODE == "spool":
+            self._spool_event(event_data)
+        else:
+            self.dropped += 1
+            EVENTS_DROPPED.inc()
+            logger.debug(f"Dropped event {event_type} while Redis is unavailable")
+
+    async def flush_spool(self) -> int:
+        # Spooled events belong to earlier requests, not to the one whose
+        # context spawned this flush.
+        token = deadline.clear()
+        try:
+            return await self._flush_spool()
+        finally:
+            deadline.reset(token)
+
+    async def _flush_spool(self) -> int:
+        flushed = 0
+        while self._spool:
+            event_data = self._spool.popleft()
+            try:
+                await RedisSingleton.execute(lambda r: r.xadd(STREAM_NAME, event_data))
+            except RedisUnavailableError:
+                self._spool.appendleft(event_data)
+                break
+            except Exception as e:
+                logger.error(f"Discarding spooled event {event_data.get('type')}: {e}")
+                continue
+            flushed += 1
+
+        event_spool_depth.set(len(self._spool))
+        if flushed:
+            logger.info(f"Flushed {flushed} spooled events")
+        return flushed
+
 
 event_publisher = EventPublisher()
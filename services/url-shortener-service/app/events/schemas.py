@@ -8,6 +8,8 @@ class UrlCreatedEvent(BaseModel):
     original_url: str
     user_id: Optional[int]
     timestamp: datetime
+    redirect_type: Optional[int] = None
+    expires_at: Optional[datetime] = None
 
 
 class UrlAccessedEvent(BaseModel):
@@ -20,24 +22,31 @@ class UrlAccessedEvent(BaseModel):
 
 class UrlUpdatedEvent(BaseModel):
     short_code: str
-    user_id: int
+    user_id: Optional[int]
     changes: dict
     timestamp: datetime
 
 
 class UrlDeletedEvent(BaseModel):
     short_code: str
-    user_id: int
+    user_id: Optional[int]
     timestamp: datetime
 
 
 class UrlStatusChangedEvent(BaseModel):
     short_code: str
-    user_id: int
+    user_id: Optional[int]
     new_status: str
     timestamp: datetime
 
 
+class UrlExpiredEvent(BaseModel):
+    short_code: str
+    user_id: Optional[int]
+    expires_at: datetime
+    timestamp: datetime
+
+
 class UserRegisteredEvent(BaseModel):
     user_id: int
     email: str
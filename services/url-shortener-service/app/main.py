@@ -1,35 +1,109 @@
 from contextlib import asynccontextmanager
+import asyncio
 import logging
 
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.routes.short_urls import router as short_urls_router
 from app.api.v1.routes.auth import router as auth_router
+from app.api.v1.routes.admin import router as admin_router
 from app.api.redirect import router as redirect_router
+from app.core import deadline, metrics, traffic_capture
+from app.core.logging_config import configure_logging
+from app.core.loop_monitor import loop_monitor
+from app.core.tracing import ServerSpanMiddleware, TracedMiddleware, setup_tracing, shutdown_tracing
 from app.core.redis import RedisSingleton
 from app.core.settings import settings
+from app.db.session import replica_pool, shard_router
+from app.events.publisher import event_publisher
 from app.middleware.request_id_middleware import RequestIDMiddleware
 from app.middleware.logging_middleware import LoggingMiddleware
 from app.middleware.rate_limit_middleware import RateLimitMiddleware
 from app.middleware.error_handler import ErrorHandlerMiddleware
+from app.middleware.deadline_middleware import DeadlineMiddleware
+from app.middleware.profiling_middleware import ProfilingMiddleware
+from app.services import url_cache
+from app.services.archiver import archiver
+from app.services.cache_warmer import cache_warmer
+from app.services.expiry_sweeper import expiry_sweeper
+from app.snapshot.store import redirect_snapshot
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting LinkPulse URL Shortener Service")
+    if settings.TRACING_ENABLED:
+        setup_tracing()
     await RedisSingleton.ping()
     logger.info("Redis connection established")
+    if settings.URL_CACHE_STORAGE == url_cache.STORAGE_COMPACT:
+        await url_cache.check_bucket_sizing()
+
+    # Started here rather than at import, so each worker writes its own file.
+    if settings.TRAFFIC_CAPTURE_ENABLED:
+        traffic_capture.start()
+
+    loop_lag_monitor = None
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_lag_monitor = asyncio.create_task(loop_monitor.run(settings.LOOP_MONITOR_INTERVAL_SECONDS))
+
+    lag_monitor = None
+    if replica_pool.enabled:
+        await asyncio.to_thread(replica_pool.check_lag)
+        lag_monitor = asyncio.create_task(
+            replica_pool.monitor(settings.REPLICA_LAG_CHECK_INTERVAL_SECONDS)
+        )
+        logger.info(f"Read replicas: {replica_pool.status()}")
+
+    snapshot_follower = None
+    if settings.SNAPSHOT_PATH:
+        redirect_snapshot.load()
+        snapshot_follower = asyncio.create_task(
+            redirect_snapshot.follow(settings.SNAPSHOT_DELTA_POLL_SECONDS)
+        )
+
+    # Snapshot nodes need no warm-up; everyone else reports ready once the
+    # hot links are cached.
+    warmup = None
+    if settings.WARMUP_ENABLED and not settings.SNAPSHOT_AUTHORITATIVE:
+        warmup = asyncio.create_task(cache_warmer.warm())
+    else:
+        cache_warmer.ready = True
+
+    # Authoritative snapshot nodes have no database to sweep or archive.
+    sweeper = None
+    if settings.EXPIRY_SWEEP_ENABLED and not settings.SNAPSHOT_AUTHORITATIVE:
+        sweeper = asyncio.create_task(expiry_sweeper.run(settings.EXPIRY_SWEEP_INTERVAL_SECONDS))
+
+    archive_job = None
+    if settings.ARCHIVE_ENABLED and not settings.SNAPSHOT_AUTHORITATIVE:
+        archive_job = asyncio.create_task(archiver.run(settings.ARCHIVE_INTERVAL_SECONDS))
+
     yield
+
+    if warmup:
+        warmup.cancel()
+    if snapshot_follower:
+        snapshot_follower.cancel()
+    if archive_job:
+        archive_job.cancel()
+    if sweeper:
+        sweeper.cancel()
+    if lag_monitor:
+        lag_monitor.cancel()
+    if loop_lag_monitor:
+        loop_lag_monitor.cancel()
     await RedisSingleton.close()
     logger.info("Redis connection closed")
+    metrics.mark_process_dead()
+    shutdown_tracing()
+    traffic_capture.stop()
 
 
 app = FastAPI(
@@ -39,21 +113,33 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-app.add_middleware(ErrorHandlerMiddleware)
-app.add_middleware(RequestIDMiddleware)
-app.add_middleware(LoggingMiddleware)
-app.add_middleware(RateLimitMiddleware)
-app.add_middleware(
+
+# Each middleware gets its own span when tracing is on, under the server
+# span opened outermost.
+def _add_traced_middleware(middleware_class: type, span_name: str, **options) -> None:
+    app.add_middleware(TracedMiddleware, wrapped=middleware_class, span_name=span_name, **options)
+
+
+_add_traced_middleware(ErrorHandlerMiddleware, "middleware.error_handler")
+_add_traced_middleware(RequestIDMiddleware, "middleware.request_id")
+_add_traced_middleware(LoggingMiddleware, "middleware.logging")
+_add_traced_middleware(RateLimitMiddleware, "middleware.rate_limit")
+_add_traced_middleware(DeadlineMiddleware, "middleware.deadline")
+_add_traced_middleware(
     CORSMiddleware,
+    "middleware.cors",
     allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ServerSpanMiddleware)
+# Outermost, so a profiled request is sampled through every other layer.
+app.add_middleware(ProfilingMiddleware)
 
 app.include_router(auth_router, prefix="/api/v1")
 app.include_router(short_urls_router, prefix="/api/v1")
-app.include_router(redirect_router)
+app.include_router(admin_router, prefix="/api/v1")
 
 
 @app.get("/health")
@@ -62,4 +148,36 @@ async def health():
     return {
         "status": "ok" if redis_ok else "degraded",
         "redis": "connected" if redis_ok else "disconnected",
+        "redis_circuit": RedisSingleton.breaker.snapshot(),
+        "event_spool": {
+            "mode": settings.EVENT_PUBLISH_DEGRADED_MODE,
+            "pending": event_publisher.spooled,
+            "dropped": event_publisher.dropped,
+        },
+        "deadline_exhausted": deadline.exhaustion_counts(),
+        "event_loop": loop_monitor.status(),
+        "replicas": replica_pool.status(),
+        "shards": shard_router.status(),
+        "expiry_sweeper": expiry_sweeper.status(),
+        "archiver": archiver.status(),
+        "snapshot": redirect_snapshot.status(),
     }
+
+
+@app.get("/ready")
+async def ready():
+    warmup = cache_warmer.status()
+    if not cache_warmer.ready:
+        return JSONResponse(status_code=503, content={"status": "warming", "warmup": warmup})
+    return {"status": "ready", "warmup": warmup}
+
+
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", include_in_schema=False)
+    async def prometheus_metrics():
+        body, content_type = metrics.render()
+        return Response(content=body, media_type=content_type)
+
+
+# Registered last: the catch-all /{short_code} route would otherwise shadow /health.
+app.include_router(redirect_router)
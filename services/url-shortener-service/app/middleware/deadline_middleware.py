@@ -0,0 +1,82 @@
+import ipaddress
+from typing import Optional
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp
+
+from app.core import deadline
+from app.core.settings import settings
+
+
+DEADLINE_HEADER = "X-Request-Deadline-Ms"
+
+_trusted_networks = [ipaddress.ip_network(net) for net in settings.REQUEST_DEADLINE_TRUSTED_NETWORKS]
+
+
+def _is_trusted(client_ip: Optional[str]) -> bool:
+    if not client_ip:
+        return False
+    try:
+        ip = ipaddress.ip_address(client_ip)
+    except ValueError:
+        return False
+    return any(ip in net for net in _trusted_networks)
+
+
+# Routes are known by the first request, so their budgets are worked out
+# once: static paths by dict lookup, and only routes with path parameters
+# are matched one by one, in order, as the router would.
+def _route_budgets(routes: list[BaseRoute]) -> tuple[dict[str, int], list[tuple[BaseRoute, int]]]:
+    static_paths: dict[str, int] = {}
+    parameterized = []
+    for route in routes:
+        path = getattr(route, "path", None)
+        budget = settings.ROUTE_DEADLINES_MS.get(path, settings.REQUEST_DEADLINE_MS)
+        if path is not None and "{" not in path:
+            static_paths.setdefault(path, budget)
+        else:
+            parameterized.append((route, budget))
+    return static_paths, parameterized
+
+
+class DeadlineMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app: ASGIApp):
+        super().__init__(app)
+        self._budgets: Optional[tuple[dict[str, int], list[tuple[BaseRoute, int]]]] = None
+
+    def _route_budget_ms(self, request: Request) -> int:
+        if not settings.ROUTE_DEADLINES_MS:
+            return settings.REQUEST_DEADLINE_MS
+        if self._budgets is None:
+            self._budgets = _route_budgets(request.app.router.routes)
+        static_paths, parameterized = self._budgets
+
+        budget = static_paths.get(request.scope["path"])
+        if budget is not None:
+            return budget
+        for route, budget in parameterized:
+            match, _ = route.matches(request.scope)
+            if match == Match.FULL:
+                return budget
+        return settings.REQUEST_DEADLINE_MS
+
+    async def dispatch(self, request: Request, call_next):
+        budget_ms = self._route_budget_ms(request)
+
+        override = request.headers.get(DEADLINE_HEADER)
+        if override and _is_trusted(request.client.host if request.client else None):
+            try:
+                requested = int(override)
+            except ValueError:
+                requested = 0
+            # Zero or less is ignored rather than turned into an instant 504.
+            if requested > 0:
+                budget_ms = max(settings.REQUEST_DEADLINE_MIN_MS, min(requested, settings.REQUEST_DEADLINE_MAX_MS))
+
+        token = deadline.start(budget_ms / 1000)
+        try:
+            return await call_next(request)
+        finally:
+            deadline.reset(token)
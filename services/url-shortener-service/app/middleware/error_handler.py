@@ -3,6 +3,8 @@ from fastapi import Request
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 
+from app.core.deadline import DeadlineExceeded
+
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +14,18 @@ class ErrorHandlerMiddleware(BaseHTTPMiddleware):
         try:
             response = await call_next(request)
             return response
+        except DeadlineExceeded as e:
+            request_id = getattr(request.state, "request_id", "-")
+            logger.warning(f"{e} [request_id={request_id}]")
+
+            return JSONResponse(
+                status_code=504,
+                content={
+                    "detail": "Request deadline exceeded",
+                    "stage": e.stage,
+                    "request_id": request_id,
+                },
+            )
         except Exception as e:
             request_id = getattr(request.state, "request_id", "-")
             logger.exception(f"Unhandled exception [request_id={request_id}]: {e}")
@@ -1,28 +1,69 @@
 import time
 import logging
+import random
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 
+from app.core import io_accounting, traffic_capture
+from app.core.metrics import http_request_duration
+from app.core.settings import settings
+
 
 logger = logging.getLogger("linkpulse.access")
 
 
+# Labelled by the route template, not the path, so every short code counts
+# towards /{short_code} instead of growing a series of its own.
+def _route_label(request: Request) -> str:
+    route = request.scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+
 class LoggingMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
         start_time = time.perf_counter()
+        io, token = io_accounting.start()
+        try:
+            response = await call_next(request)
+        finally:
+            io_accounting.reset(token)
+
+        duration = time.perf_counter() - start_time
+        http_request_duration.labels(request.method, _route_label(request), response.status_code).observe(duration)
+
+        if settings.SERVER_TIMING_ENABLED:
+            response.headers["Server-Timing"] = f"{io.server_timing()}, total;dur={duration * 1000:.2f}"
+
+        if settings.TRAFFIC_CAPTURE_ENABLED and random.random() < settings.TRAFFIC_CAPTURE_SAMPLE_RATE:
+            traffic_capture.capture(
+                request, _route_label(request), response.status_code, time.time() - duration, duration,
+            )
 
-        response = await call_next(request)
+        # Successful requests are sampled at LOG_ACCESS_SAMPLE_RATE; errors
+        # are always logged. The line is only built for requests that are.
+        if response.status_code < 400 and random.random() >= settings.LOG_ACCESS_SAMPLE_RATE:
+            return response
 
-        duration_ms = (time.perf_counter() - start_time) * 1000
         request_id = getattr(request.state, "request_id", "-")
         client_ip = request.client.host if request.client else "-"
 
         logger.info(
-            f"{request.method} {request.url.path} "
-            f"status={response.status_code} "
-            f"duration={duration_ms:.2f}ms "
-            f"ip={client_ip} "
-            f"request_id={request_id}"
+            "%s %s status=%d duration=%.2fms %s ip=%s request_id=%s",
+            request.method, request.url.path, response.status_code, duration * 1000,
+            io.log_fields(), client_ip, request_id,
+            extra={"access": {
+                "method": request.method,
+                "path": request.url.path,
+                "route": _route_label(request),
+                "status": response.status_code,
+                "duration_ms": round(duration * 1000, 2),
+                "db_statements": io.db_statements,
+                "db_ms": round(io.db_seconds * 1000, 2),
+                "redis_calls": io.redis_calls,
+                "redis_ms": round(io.redis_seconds * 1000, 2),
+                "ip": client_ip,
+                "request_id": request_id,
+            }},
         )
 
         return response
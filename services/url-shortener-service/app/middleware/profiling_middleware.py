@@ -0,0 +1,66 @@
+import logging
+import uuid
+
+from app.core import profiler
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.redis_keys import request_profile_key
+from app.core.settings import settings
+
+
+logger = logging.getLogger(__name__)
+
+PROFILE_ID_HEADER = b"x-profile-id"
+
+
+# Profiles a single request through the whole middleware stack when it
+# carries a valid, unused X-Profile-Token. The collapsed stacks are kept in Redis for
+# PROFILING_KEEP_SECONDS, so any worker can serve them from
+# GET /api/v1/admin/profiles/{id}; the id comes back in X-Profile-Id.
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.token_header = profiler.PROFILE_TOKEN_HEADER.lower().encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.PROFILING_SECRET:
+            return await self.app(scope, receive, send)
+
+        token = next((value for key, value in scope["headers"] if key == self.token_header), None)
+        if token is None or not profiler.verify_token(token.decode("latin-1")):
+            return await self.app(scope, receive, send)
+        try:
+            claimed = await profiler.claim_token(token.decode("latin-1"))
+        except RedisUnavailableError as e:
+            logger.warning(f"Profile token ignored: cannot check it was not used before: {e}")
+            return await self.app(scope, receive, send)
+        if not claimed:
+            logger.info("Profile token ignored: it was already used")
+            return await self.app(scope, receive, send)
+
+        started = profiler.start_request_profile(settings.PROFILING_INTERVAL_MS / 1000)
+        if started is None:
+            logger.info("Profile token ignored: another profile is running in this worker")
+            return await self.app(scope, receive, send)
+
+        profile_id = uuid.uuid4().hex
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(PROFILE_ID_HEADER, profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            samples = await profiler.finish_request_profile(*started)
+
+        body = profiler.collapsed(samples)
+        try:
+            await RedisSingleton.execute(
+                lambda r: r.set(request_profile_key(profile_id), body, ex=settings.PROFILING_KEEP_SECONDS)
+            )
+        except RedisUnavailableError as e:
+            logger.warning(f"Request profile {profile_id} not stored: {e}")
+            return
+        logger.info(f"Profiled {scope['method']} {scope['path']}: {sum(samples.values())} samples, profile id {profile_id}")
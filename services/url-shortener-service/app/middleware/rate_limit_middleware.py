@@ -1,23 +1,42 @@
+import logging
+
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import JSONResponse
 
-from app.core.redis import RedisSingleton
+from app.core.deadline import DeadlineExceeded
+from app.core.metrics import rate_limit_rejections
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.redis_keys import rate_limit_key
 from app.core.settings import settings
 
 
+logger = logging.getLogger(__name__)
+
+
 class RateLimitMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
+        if not RedisSingleton.is_available():
+            return await call_next(request)
+
         client_ip = request.client.host if request.client else "unknown"
-        key = f"ratelimit:{client_ip}"
+        key = rate_limit_key(client_ip)
 
-        redis = RedisSingleton.get_instance()
-        current = await redis.incr(key)
+        async def _count(r):
+            async with r.pipeline(transaction=False) as pipe:
+                pipe.incr(key)
+                pipe.expire(key, 60, nx=True)
+                current, _ = await pipe.execute()
+                return current
 
-        if current == 1:
-            await redis.expire(key, 60)
+        try:
+            current = await RedisSingleton.execute(_count, binary=True)
+        except (RedisUnavailableError, DeadlineExceeded) as e:
+            logger.warning(f"Rate limiting skipped: {e}")
+            return await call_next(request)
 
         if current > settings.RATE_LIMIT_PER_MINUTE:
+            rate_limit_rejections.inc()
             return JSONResponse(
                 status_code=429,
                 content={
@@ -1,15 +1,30 @@
 from datetime import datetime, timezone
 from typing import Optional, List, TYPE_CHECKING
 
-from sqlalchemy import Boolean, CheckConstraint, Integer, String, DateTime, func, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import Boolean, CheckConstraint, Index, Integer, String, DateTime, event, func, ForeignKey, text
+from sqlalchemy.orm import Mapped, mapped_column, object_session, relationship
 
+from app.core.settings import settings
 from app.db.base import Base
+from app.db.partitioning import SHORT_URLS_PARTITION_KEY, hash_partition_ddl
+
+# Postgres requires the partition key in every unique constraint, including
+# the primary key, so a partitioned short_urls is keyed on (id, short_code).
+SHORT_URL_PARTITIONS = settings.SHORT_URL_PARTITION_COUNT
 
 if TYPE_CHECKING:
     from app.models.url_models import ShortUrl
 
 
+# SQLite hands back naive datetimes; stored expiries are always UTC.
+def expiry_passed(expires_at: Optional[datetime]) -> bool:
+    if expires_at is None:
+        return False
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) >= expires_at
+
+
 class User(Base):
     __tablename__ = "users"
 
@@ -67,6 +82,19 @@ class ShortUrl(Base):
             "redirect_type IN (301, 302, 303)",
             name="ck_short_urls_redirect_type",
         ),
+        Index(
+            "ix_short_urls_redirect_lookup",
+            "short_code",
+            postgresql_include=["original_url", "redirect_type", "expires_at", "version"],
+            postgresql_where=text("is_active"),
+        ),
+        Index(
+            "ix_short_urls_expires_at",
+            "expires_at",
+            postgresql_where=text("expires_at IS NOT NULL"),
+        ),
+        Index("ix_short_urls_last_accessed_at", "last_accessed_at"),
+        {"postgresql_partition_by": f"HASH ({SHORT_URLS_PARTITION_KEY})"} if SHORT_URL_PARTITIONS else {},
     )
 
     id: Mapped[int] = mapped_column(
@@ -80,6 +108,7 @@ class ShortUrl(Base):
         nullable=False,
         unique=True,
         index=True,
+        primary_key=SHORT_URL_PARTITIONS > 0,
     )
 
     original_url: Mapped[str] = mapped_column(
@@ -134,12 +163,120 @@ class ShortUrl(Base):
         nullable=True,
     )
 
+    # Bumped by clicks at most once per ARCHIVE_TOUCH_INTERVAL_SECONDS so most
+    # click updates leave the indexed value alone and stay HOT.
+    last_accessed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+    # Bumped in the database on every ORM update (see _bump_version) and
+    # carried by cache entries, so a cache write can tell old state from new.
+    version: Mapped[int] = mapped_column(
+        Integer,
+        server_default=text("1"),
+        nullable=False,
+    )
+
     owner: Mapped[Optional["User"]] = relationship(
         "User",
         back_populates="short_urls",
     )
 
+    # Reads the bumped version back in the UPDATE itself (RETURNING).
+    __mapper_args__ = {"eager_defaults": True}
+
     def is_expired(self) -> bool:
-        if self.expires_at is None:
-            return False
-        return datetime.now(timezone.utc) >= self.expires_at
\ No newline at end of file
+        return expiry_passed(self.expires_at)
+
+
+# Links idle for ARCHIVE_AFTER_DAYS are moved here by the archiver and moved
+# back on their next lookup, where they get a fresh id. No FK to users: the
+# table also lives on shards.
+class ArchivedShortUrl(Base):
+    __tablename__ = "short_urls_archive"
+
+    short_code: Mapped[str] = mapped_column(
+        String(12),
+        primary_key=True,
+    )
+
+    original_url: Mapped[str] = mapped_column(
+        String(2048),
+        nullable=False,
+    )
+
+    normalized_url: Mapped[str] = mapped_column(
+        String(2048),
+        nullable=False,
+    )
+
+    redirect_type: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+    )
+
+    click_count: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+    )
+
+    is_active: Mapped[bool] = mapped_column(
+        Boolean,
+        nullable=False,
+    )
+
+    user_id: Mapped[Optional[int]] = mapped_column(
+        Integer,
+        nullable=True,
+        index=True,
+    )
+
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+
+    updated_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+
+    expires_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True),
+        nullable=True,
+    )
+
+    last_accessed_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        nullable=False,
+    )
+
+    version: Mapped[int] = mapped_column(
+        Integer,
+        nullable=False,
+    )
+
+    archived_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True),
+        server_default=func.now(),
+        nullable=False,
+    )
+
+
+@event.listens_for(ShortUrl.__table__, "after_create")
+def _create_short_url_partitions(target, connection, **kw):
+    if SHORT_URL_PARTITIONS and connection.dialect.name == "postgresql":
+        for ddl in hash_partition_ddl(target.name, SHORT_URL_PARTITIONS):
+            connection.exec_driver_sql(ddl)
+
+
+# An expression rather than a Python increment, so two concurrent updates
+# still end on different versions.
+@event.listens_for(ShortUrl, "before_update")
+def _bump_version(mapper, connection, target):
+    # before_update also fires for objects that were touched without a net
+    # change; those are not written and keep their version.
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = ShortUrl.version + 1
@@ -1,65 +1,365 @@
-from typing import Optional, Tuple, List
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Callable, Optional, Tuple, List, TypeVar
+import heapq
 
-from app.models.url_models import ShortUrl
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy import Boolean, and_, case, delete, desc, func, insert, literal, select, union_all, update
 
+from app.core.settings import settings
+from app.core.tracing import traced_methods
+from app.db.routing import replica_read
+from app.db.session import shard_router
+from app.db.sharding import ShardRouter
+from app.models.url_models import ArchivedShortUrl, ShortUrl
 
+
+T = TypeVar("T")
+
+ARCHIVED_COLUMNS = [column.name for column in ShortUrl.__table__.columns if column.name != "id"]
+
+# What an owner's listing shows, read alike from short_urls and the archive.
+LISTED_COLUMNS = [
+    "short_code", "original_url", "redirect_type", "click_count", "is_active", "user_id", "created_at", "expires_at",
+]
+
+
+@traced_methods
 class ShortUrlRepository:
-    def __init__(self, db: Session):
+    def __init__(self, db: Session, shards: ShardRouter = shard_router):
         self.db = db
+        self.shards = shards
+
+    def _session(self, short_code: str) -> Session:
+        if not self.shards.enabled:
+            return self.db
+        return self.shards.session_for(self.db, short_code)
+
+    def _session_of(self, short_url: ShortUrl) -> Session:
+        return object_session(short_url) or self._session(short_url.short_code)
 
+    def _lookup(self, short_code: str, query: Callable[[Session], Optional[T]]) -> Optional[T]:
+        if not self.shards.enabled:
+            return query(self.db)
+
+        owner = self.shards.shard_for(short_code)
+        result = query(self.shards.session(self.db, owner))
+        if result is None and settings.SHARD_LOOKUP_FALLBACK:
+            # While a rebalance is moving rows a code can still sit on the
+            # shard that owned it before.
+            for name in self.shards.names:
+                if name != owner:
+                    result = query(self.shards.session(self.db, name))
+                    if result is not None:
+                        break
+        return result
+
+    # Archived codes are still taken.
     def exists(self, short_code: str) -> bool:
-        return (
-            self.db.query(ShortUrl)
-            .filter_by(short_code=short_code)
-            .first()
-            is not None
-        )
+        return self._lookup(
+            short_code,
+            lambda db: (
+                db.query(ShortUrl.id).filter_by(short_code=short_code).first()
+                or db.query(ArchivedShortUrl.short_code).filter_by(short_code=short_code).first()
+            ),
+        ) is not None
 
     def create(self, short_url: ShortUrl) -> ShortUrl:
-        self.db.add(short_url)
-        self.db.commit()
-        self.db.refresh(short_url)
+        db = self._session(short_url.short_code)
+        db.add(short_url)
+        db.commit()
+        db.refresh(short_url)
         return short_url
 
+    # For changes to the link, so an archived one is promoted first.
     def get_by_code(self, short_code: str) -> ShortUrl | None:
-        return self.db.query(ShortUrl).filter_by(short_code=short_code).first()
+        short_url = self._lookup(
+            short_code,
+            lambda db: db.query(ShortUrl).filter_by(short_code=short_code).first(),
+        )
+        if short_url is None and self.promote_from_archive(short_code):
+            short_url = self._session(short_code).query(ShortUrl).filter_by(short_code=short_code).first()
+        return short_url
 
+    @replica_read(retry_on_miss=True)
     def get_by_code_active(self, short_code: str) -> ShortUrl | None:
-        return (
-            self.db.query(ShortUrl)
-            .filter_by(short_code=short_code, is_active=True)
-            .first()
+        return self._lookup(
+            short_code,
+            lambda db: db.query(ShortUrl).filter_by(short_code=short_code, is_active=True).first(),
         )
 
-    def increment_clicks(self, short_url: ShortUrl) -> None:
-        short_url.click_count += 1
+    # Reading a link's details is not a visit, so an archived link is read
+    # where it is instead of being promoted.
+    @replica_read()
+    def get_archived_active(self, short_code: str) -> ArchivedShortUrl | None:
+        return self._lookup(
+            short_code,
+            lambda db: db.query(ArchivedShortUrl).filter_by(short_code=short_code, is_active=True).first(),
+        )
+
+    # Reads only the columns covered by ix_short_urls_redirect_lookup so a
+    # cache miss on the redirect path is an index-only scan.
+    @replica_read(retry_on_miss=True)
+    def get_redirect_target(self, short_code: str) -> Row | None:
+        statement = select(
+            ShortUrl.short_code,
+            ShortUrl.original_url,
+            ShortUrl.redirect_type,
+            ShortUrl.expires_at,
+            ShortUrl.version,
+        ).where(ShortUrl.short_code == short_code, ShortUrl.is_active == True)
+        return self._lookup(short_code, lambda db: db.execute(statement).first())
+
+    # A link the expiry sweep deactivated keeps answering 410 instead of 404.
+    # Only read after get_redirect_target misses, so the hot path keeps its
+    # index-only scan. A link its owner disabled reads as expired once it is
+    # past expires_at as well.
+    @replica_read()
+    def get_expired_target(self, short_code: str) -> Row | None:
+        statement = select(
+            ShortUrl.short_code,
+            ShortUrl.original_url,
+            ShortUrl.redirect_type,
+            ShortUrl.expires_at,
+            ShortUrl.version,
+        ).where(
+            ShortUrl.short_code == short_code,
+            ShortUrl.is_active == False,
+            ShortUrl.expires_at <= datetime.now(timezone.utc),
+        )
+        return self._lookup(short_code, lambda db: db.execute(statement).first())
+
+    # One query per shard for a whole batch of codes. Archived links are
+    # read in place: a batch resolve is not a visit, so it does not promote.
+    # With expired, reads the links the expiry sweep deactivated, as
+    # get_expired_target does for one.
+    @replica_read()
+    def get_redirect_targets(self, short_codes: List[str], archived: bool = False, expired: bool = False) -> List[Row]:
+        model = ArchivedShortUrl if archived else ShortUrl
+        if expired:
+            condition = and_(model.is_active == False, model.expires_at <= datetime.now(timezone.utc))
+        else:
+            condition = model.is_active == True
+
+        def _query(db: Session, codes: List[str]) -> List[Row]:
+            return db.execute(
+                select(model.short_code, model.original_url, model.redirect_type, model.expires_at, model.version)
+                .where(model.short_code.in_(codes), condition)
+            ).all()
+
+        if not self.shards.enabled:
+            return _query(self.db, short_codes)
+
+        by_shard: dict[str, List[str]] = defaultdict(list)
+        for short_code in short_codes:
+            by_shard[self.shards.shard_for(short_code)].append(short_code)
+
+        rows = []
+        for name, codes in by_shard.items():
+            rows.extend(_query(self.shards.session(self.db, name), codes))
+
+        if settings.SHARD_LOOKUP_FALLBACK:
+            missing = set(short_codes) - {row.short_code for row in rows}
+            for name in self.shards.names:
+                if not missing:
+                    break
+                found = _query(self.shards.session(self.db, name), sorted(missing))
+                rows.extend(found)
+                missing -= {row.short_code for row in found}
+        return rows
+
+    def increment_clicks(self, short_code: str) -> None:
+        db = self._session(short_code)
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=settings.ARCHIVE_TOUCH_INTERVAL_SECONDS)
+        db.execute(
+            update(ShortUrl)
+            .where(ShortUrl.short_code == short_code)
+            .values(
+                click_count=ShortUrl.click_count + 1,
+                last_accessed_at=case(
+                    (ShortUrl.last_accessed_at < stale_before, func.now()),
+                    else_=ShortUrl.last_accessed_at,
+                ),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+
+    # Whether short_code sits in the archive. A plain read, so it can go to a
+    # replica: most misses are codes that never existed, and those must not
+    # cost a write on the primary.
+    @replica_read()
+    def is_archived(self, short_code: str) -> bool:
+        return self._lookup(
+            short_code,
+            lambda db: db.execute(
+                select(literal(1)).where(ArchivedShortUrl.short_code == short_code)
+            ).first(),
+        ) is not None
+
+    # Moves an archived link back into short_urls. Returns whether it was in
+    # the archive, so the caller should read it again; that also covers a
+    # concurrent promotion winning the row first.
+    def promote_from_archive(self, short_code: str) -> bool:
+        if not self.is_archived(short_code):
+            return False
+
+        db = self._session(short_code)
+        archived = ArchivedShortUrl.__table__
+        row = db.execute(
+            delete(ArchivedShortUrl)
+            .where(ArchivedShortUrl.short_code == short_code)
+            .returning(*(archived.c[name] for name in ARCHIVED_COLUMNS))
+        ).first()
+        if row is not None:
+            db.execute(insert(ShortUrl), [{**row._mapping, "last_accessed_at": datetime.now(timezone.utc)}])
+        db.commit()
+        return True
+
+    # The batch methods below run on self.db as given: the background jobs
+    # hand the repository one session per shard. SKIP LOCKED lets several
+    # workers sweep at once without waiting on each other.
+    #
+    # Archive rows are inserted in the same transaction that deletes them
+    # from short_urls, so a link is always in exactly one of the two.
+    def archive_idle(self, idle_before: datetime, limit: int) -> List[str]:
+        idle = (
+            select(ShortUrl.id)
+            .where(ShortUrl.last_accessed_at < idle_before)
+            .order_by(ShortUrl.last_accessed_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        rows = self.db.execute(
+            delete(ShortUrl)
+            .where(ShortUrl.id.in_(idle))
+            .returning(*(ShortUrl.__table__.c[name] for name in ARCHIVED_COLUMNS))
+            .execution_options(synchronize_session=False)
+        ).all()
+        if rows:
+            self.db.execute(insert(ArchivedShortUrl), [dict(row._mapping) for row in rows])
+        self.db.commit()
+        return [row.short_code for row in rows]
+
+    # Most clicked links among those used since accessed_since; the
+    # last_accessed_at index keeps the candidate set to recently used links.
+    def hot_links(self, accessed_since: datetime, limit: int) -> List[Row]:
+        return self.db.execute(
+            select(
+                ShortUrl.short_code,
+                ShortUrl.original_url,
+                ShortUrl.redirect_type,
+                ShortUrl.expires_at,
+                ShortUrl.version,
+                ShortUrl.click_count,
+            )
+            .where(ShortUrl.is_active == True, ShortUrl.last_accessed_at >= accessed_since)
+            .order_by(desc(ShortUrl.click_count))
+            .limit(limit)
+        ).all()
+
+    def deactivate_expired(self, now: datetime, limit: int) -> List[Row]:
+        expired = (
+            select(ShortUrl.id)
+            .where(ShortUrl.is_active == True, ShortUrl.expires_at <= now)
+            .order_by(ShortUrl.expires_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        rows = self.db.execute(
+            update(ShortUrl)
+            .where(ShortUrl.id.in_(expired))
+            .values(is_active=False, version=ShortUrl.version + 1)
+            .returning(ShortUrl.short_code, ShortUrl.user_id, ShortUrl.expires_at, ShortUrl.version)
+            .execution_options(synchronize_session=False)
+        ).all()
         self.db.commit()
-        self.db.refresh(short_url)
+        return rows
+
+    def purge_expired(self, before: datetime, limit: int) -> int:
+        doomed = (
+            select(ShortUrl.id)
+            .where(ShortUrl.expires_at <= before)
+            .order_by(ShortUrl.expires_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery()
+        )
+        purged = self.db.execute(
+            delete(ShortUrl)
+            .where(ShortUrl.id.in_(doomed))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        self.db.commit()
+        return purged
+
+    # The owner's links in short_urls and the archive, newest first, with an
+    # archived flag on each. Archived links are listed in place.
+    @staticmethod
+    def _user_page(
+        db: Session,
+        user_id: int,
+        include_inactive: bool,
+        offset: int,
+        limit: int,
+    ) -> Tuple[int, List[Row]]:
+        selects = []
+        for model, archived in ((ShortUrl, False), (ArchivedShortUrl, True)):
+            statement = select(
+                *(getattr(model, name) for name in LISTED_COLUMNS),
+                literal(archived, Boolean).label("archived"),
+            ).where(model.user_id == user_id)
+            if not include_inactive:
+                statement = statement.where(model.is_active == True)
+            selects.append(statement)
+        links = union_all(*selects).subquery()
+
+        total = db.execute(select(func.count()).select_from(links)).scalar()
+        items = db.execute(
+            select(links).order_by(desc(links.c.created_at)).offset(offset).limit(limit)
+        ).all()
+        return total, items
 
+    # Each shard returns its newest page * page_size links; merging those
+    # newest-first is enough to cut any page out of the combined order. The
+    # cost grows with the page number: page 50 of 20 reads 1000 rows from
+    # every shard to return 20, so deep pages are for the owner's own
+    # browsing, not for export. Shards have no replicas, so unlike the
+    # unsharded listing this always reads each shard's primary.
+    def _list_by_user_sharded(
+        self,
+        user_id: int,
+        page: int,
+        page_size: int,
+        include_inactive: bool,
+    ) -> Tuple[List[Row], int]:
+        results = self.shards.fan_out(
+            lambda db: self._user_page(db, user_id, include_inactive, 0, page * page_size)
+        )
+        merged = heapq.merge(
+            *(items for _, items in results),
+            key=lambda link: link.created_at,
+            reverse=True,
+        )
+        items = list(islice(merged, (page - 1) * page_size, page * page_size))
+        return items, sum(total for total, _ in results)
+
+    @replica_read()
     def list_by_user(
         self,
         user_id: int,
         page: int = 1,
         page_size: int = 20,
         include_inactive: bool = False,
-    ) -> Tuple[List[ShortUrl], int]:
-        query = self.db.query(ShortUrl).filter(ShortUrl.user_id == user_id)
-
-        if not include_inactive:
-            query = query.filter(ShortUrl.is_active == True)
-
-        total = query.count()
-
-        items = (
-            query
-            .order_by(desc(ShortUrl.created_at))
-            .offset((page - 1) * page_size)
-            .limit(page_size)
-            .all()
-        )
+    ) -> Tuple[List[Row], int]:
+        if self.shards.enabled:
+            return self._list_by_user_sharded(user_id, page, page_size, include_inactive)
 
+        total, items = self._user_page(self.db, user_id, include_inactive, (page - 1) * page_size, page_size)
         return items, total
 
     def update(
@@ -73,18 +373,20 @@ class ShortUrlRepository:
         if redirect_type is not None:
             short_url.redirect_type = redirect_type
 
-        self.db.commit()
-        self.db.refresh(short_url)
+        db = self._session_of(short_url)
+        db.commit()
+        db.refresh(short_url)
         return short_url
 
     def soft_delete(self, short_url: ShortUrl) -> None:
         short_url.is_active = False
-        self.db.commit()
+        self._session_of(short_url).commit()
 
     def restore(self, short_url: ShortUrl) -> None:
         short_url.is_active = True
-        self.db.commit()
+        self._session_of(short_url).commit()
 
     def hard_delete(self, short_url: ShortUrl) -> None:
-        self.db.delete(short_url)
-        self.db.commit()
+        db = self._session_of(short_url)
+        db.delete(short_url)
+        db.commit()
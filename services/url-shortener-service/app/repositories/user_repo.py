@@ -1,13 +1,17 @@
 from typing import Optional
 from sqlalchemy.orm import Session
 
+from app.core.tracing import traced_methods
+from app.db.routing import replica_read
 from app.models.url_models import User
 
 
+@traced_methods
 class UserRepository:
     def __init__(self, db: Session):
         self.db = db
 
+    @replica_read(retry_on_miss=True)
     def get_by_id(self, user_id: int) -> Optional[User]:
         return self.db.query(User).filter(User.id == user_id).first()
 
@@ -0,0 +1,104 @@
+# Moves links nobody has clicked for ARCHIVE_AFTER_DAYS out of short_urls
+# into short_urls_archive, keeping the hot table and its indexes small enough
+# to stay in memory. Lookups fall through to the archive and promote a link
+# back on its next use.
+#
+# Runs from the lifespan with ARCHIVE_ENABLED, or as a one-off pass:
+#   python -m app.services.archiver
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import asyncio
+import logging
+import sys
+
+from sqlalchemy.orm import Session
+
+from app.core.redis import RedisSingleton
+from app.core.settings import settings
+from app.db.session import SessionLocal, shard_router
+from app.repositories.short_url_repo import ShortUrlRepository
+from app.services.url_cache import evict_cached_urls
+
+
+logger = logging.getLogger(__name__)
+
+
+class ColdLinkArchiver:
+    def __init__(self, idle_days: int, batch_size: int, max_batches: int):
+        self.idle_days = idle_days
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.archived = 0
+        self.last_run: Optional[datetime] = None
+
+    def _sessions(self) -> List[Session]:
+        if shard_router.enabled:
+            return [shard_router.new_session(name) for name in shard_router.names]
+        return [SessionLocal()]
+
+    def _archive_database(self, idle_before: datetime) -> List[str]:
+        archived: List[str] = []
+        for db in self._sessions():
+            try:
+                repo = ShortUrlRepository(db)
+                for _ in range(self.max_batches):
+                    batch = repo.archive_idle(idle_before, self.batch_size)
+                    archived.extend(batch)
+                    if len(batch) < self.batch_size:
+                        break
+            finally:
+                db.close()
+        return archived
+
+    async def archive_once(self) -> int:
+        now = datetime.now(timezone.utc)
+        archived = await asyncio.to_thread(self._archive_database, now - timedelta(days=self.idle_days))
+
+        # A cached copy would keep serving redirects whose clicks no longer
+        # land anywhere; dropping it sends the next visit through promotion.
+        if archived:
+            await evict_cached_urls(archived)
+            logger.info(f"Archived {len(archived)} links idle for {self.idle_days} days")
+
+        self.archived += len(archived)
+        self.last_run = now
+        return len(archived)
+
+    async def run(self, interval: float) -> None:
+        while True:
+            try:
+                await self.archive_once()
+            except Exception as e:
+                logger.error(f"Archive pass failed: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+    def status(self) -> dict:
+        return {
+            "archived": self.archived,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+        }
+
+
+archiver = ColdLinkArchiver(
+    idle_days=settings.ARCHIVE_AFTER_DAYS,
+    batch_size=settings.ARCHIVE_BATCH_SIZE,
+    max_batches=settings.ARCHIVE_MAX_BATCHES,
+)
+
+
+async def _archive_everything() -> None:
+    archiver.max_batches = sys.maxsize
+    try:
+        await archiver.archive_once()
+    finally:
+        await RedisSingleton.close()
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(_archive_everything())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -38,8 +38,7 @@ class AuthService:
             email=user.email,
             timestamp=datetime.now(timezone.utc),
         )
-        import asyncio
-        asyncio.create_task(event_publisher.publish(EVENT_USER_REGISTERED, event))
+        event_publisher.publish_in_background(EVENT_USER_REGISTERED, event)
 
         return user
 
@@ -67,8 +66,7 @@ class AuthService:
             ip_address=ip_address,
             timestamp=datetime.now(timezone.utc),
         )
-        import asyncio
-        asyncio.create_task(event_publisher.publish(EVENT_USER_LOGGED_IN, event))
+        event_publisher.publish_in_background(EVENT_USER_LOGGED_IN, event)
 
         return {
             "access_token": access_token,
@@ -0,0 +1,212 @@
+# Loads the most clicked recent links into Redis and the local cache before a
+# worker reports ready, so a deploy or a Redis failover does not send every
+# redirect to Postgres at once.
+#
+# Runs from the lifespan with WARMUP_ENABLED, or by hand after a failover:
+#   python -m app.services.cache_warmer
+#
+# One worker per deploy takes a lock, reads the hot links from Postgres and
+# fills Redis, then leaves the list of codes it warmed under
+# warmup_result_key for WARMUP_RESULT_TTL_SECONDS. Workers that waited on the
+# lock, or start while that list is fresh, fill their local cache from Redis
+# instead of running the query again.
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+import asyncio
+import heapq
+import logging
+import sys
+import time
+import uuid
+
+from sqlalchemy.engine import Row
+
+from app.api.v1.schema_dtos import ShortURLCacheModel
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.redis_keys import warmup_lock_key, warmup_result_key
+from app.core.settings import settings
+from app.db.session import SessionLocal, shard_router
+from app.repositories.short_url_repo import ShortUrlRepository
+from app.services.url_cache import local_url_cache, queue_cache_write, read_cached_many, url_cache_ttl
+
+
+logger = logging.getLogger(__name__)
+
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class CacheWarmer:
+    def __init__(self, top_n: int, recent_days: int, chunk_size: int, lock_seconds: int, result_seconds: int):
+        self.top_n = top_n
+        self.recent_days = recent_days
+        self.chunk_size = chunk_size
+        self.lock_seconds = lock_seconds
+        self.result_seconds = result_seconds
+        self.ready = False
+        self.warmed = 0
+        self.duration: Optional[float] = None
+
+    def _load_hot_links(self) -> List[Row]:
+        since = datetime.now(timezone.utc) - timedelta(days=self.recent_days)
+        if shard_router.enabled:
+            sessions = [shard_router.new_session(name) for name in shard_router.names]
+        else:
+            sessions = [SessionLocal()]
+
+        rows: List[Row] = []
+        for db in sessions:
+            try:
+                rows.extend(ShortUrlRepository(db).hot_links(since, self.top_n))
+            finally:
+                db.close()
+        return heapq.nlargest(self.top_n, rows, key=lambda row: row.click_count)
+
+    # Compare-and-set like any other cache write, so a link changed while the
+    # warm-up ran is not put back at its old version.
+    async def _write_redis(self, entries: List[ShortURLCacheModel]) -> None:
+        for start in range(0, len(entries), self.chunk_size):
+            chunk = entries[start:start + self.chunk_size]
+
+            async def _set_chunk(r):
+                async with r.pipeline(transaction=False) as pipe:
+                    for model in chunk:
+                        ttl = int(url_cache_ttl(model.expires_at))
+                        if ttl >= 1:
+                            queue_cache_write(pipe, model, ttl)
+                    await pipe.execute()
+
+            await RedisSingleton.execute(_set_chunk, binary=True)
+
+    # The others wait for the lock holder so they do not report ready
+    # against a cold cache.
+    async def _wait_for_other_worker(self, key: str) -> None:
+        give_up = time.monotonic() + self.lock_seconds
+        while time.monotonic() < give_up:
+            if not await RedisSingleton.execute(lambda r: r.exists(key)):
+                return
+            await asyncio.sleep(0.5)
+
+    # Codes the last lock holder warmed, or None once that is stale.
+    async def _recent_result(self) -> Optional[List[str]]:
+        result = await RedisSingleton.execute(lambda r: r.get(warmup_result_key()))
+        if result is None:
+            return None
+        return result.split(",") if result else []
+
+    async def _publish_result(self, entries: List[ShortURLCacheModel]) -> None:
+        codes = ",".join(model.short_code for model in entries)
+        await RedisSingleton.execute(lambda r: r.set(warmup_result_key(), codes, ex=self.result_seconds))
+
+    def _remember(self, model: ShortURLCacheModel) -> bool:
+        ttl = url_cache_ttl(model.expires_at)
+        if ttl < 1:
+            return False
+        local_url_cache.set(model.short_code, model, ttl_seconds=min(ttl, settings.LOCAL_CACHE_TTL_SECONDS))
+        return True
+
+    async def _warm_from_redis(self, codes: List[str]) -> int:
+        warmed = 0
+        for start in range(0, len(codes), self.chunk_size):
+            found = await read_cached_many(codes[start:start + self.chunk_size])
+            warmed += sum(self._remember(model) for model in found.values())
+        return warmed
+
+    async def _warm_from_database(self) -> List[ShortURLCacheModel]:
+        rows = await asyncio.to_thread(self._load_hot_links)
+        entries = []
+        for row in rows:
+            model = ShortURLCacheModel(
+                short_code=row.short_code,
+                original_url=row.original_url,
+                redirect_type=row.redirect_type,
+                expires_at=row.expires_at,
+                version=row.version,
+            )
+            if self._remember(model):
+                entries.append(model)
+        return entries
+
+    # force runs the database pass even when another worker just did, as
+    # after a Redis failover.
+    async def warm(self, force: bool = False) -> int:
+        started = time.monotonic()
+        key = warmup_lock_key()
+        token = uuid.uuid4().hex
+        try:
+            holder = False
+            try:
+                codes = None if force else await self._recent_result()
+                if codes is None:
+                    holder = bool(await RedisSingleton.execute(
+                        lambda r: r.set(key, token, nx=True, ex=self.lock_seconds)
+                    ))
+                    if not holder:
+                        logger.info("Another worker is warming the cache, waiting for it")
+                        await self._wait_for_other_worker(key)
+                        codes = await self._recent_result()
+                        if codes is None:
+                            return 0
+                if codes is not None:
+                    self.warmed = await self._warm_from_redis(codes)
+                    return self.warmed
+            except RedisUnavailableError as e:
+                logger.warning(f"Warm-up without Redis, local cache only: {e}")
+
+            # A failed pass releases the lock too, so the waiting workers
+            # do not sit out its whole expiry.
+            try:
+                entries = await self._warm_from_database()
+                if holder:
+                    await self._write_redis(entries)
+                    await self._publish_result(entries)
+            finally:
+                if holder:
+                    await RedisSingleton.execute(lambda r: r.eval(RELEASE_LOCK_SCRIPT, 1, key, token))
+
+            self.warmed = len(entries)
+            return self.warmed
+        except Exception as e:
+            logger.error(f"Cache warm-up failed, serving cold: {e}", exc_info=True)
+            return 0
+        finally:
+            self.duration = time.monotonic() - started
+            self.ready = True
+            logger.info(f"Cache warm-up finished: {self.warmed} links in {self.duration:.2f}s")
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "warmed": self.warmed,
+            "duration_seconds": round(self.duration, 3) if self.duration is not None else None,
+        }
+
+
+cache_warmer = CacheWarmer(
+    top_n=settings.WARMUP_TOP_N,
+    recent_days=settings.WARMUP_RECENT_DAYS,
+    chunk_size=settings.WARMUP_PIPELINE_CHUNK,
+    lock_seconds=settings.WARMUP_LOCK_SECONDS,
+    result_seconds=settings.WARMUP_RESULT_TTL_SECONDS,
+)
+
+
+async def _warm_and_close() -> None:
+    try:
+        await cache_warmer.warm(force=True)
+    finally:
+        await RedisSingleton.close()
+
+
+def main() -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    asyncio.run(_warm_and_close())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.db.session import SessionLocal, shard_router
+from app.events.constants import EVENT_URL_EXPIRED
+from app.events.publisher import event_publisher
+from app.events.schemas import UrlExpiredEvent
+from app.repositories.short_url_repo import ShortUrlRepository
+from app.services.url_cache import write_tombstones
+
+
+logger = logging.getLogger(__name__)
+
+
+# Deactivates links once they pass expires_at and, with
+# EXPIRY_PURGE_AFTER_DAYS, deletes them that many days later. A deactivated
+# link still answers 410 until it is purged (see get_expired_target). Both walk
+# ix_short_urls_expires_at in bounded batches so one tick never holds locks
+# on a large range.
+class ExpirySweeper:
+    def __init__(self, batch_size: int, max_batches: int, purge_after_days: int):
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        self.purge_after_days = purge_after_days
+        self.deactivated = 0
+        self.purged = 0
+        self.last_run: Optional[datetime] = None
+
+    def _sessions(self) -> List[Session]:
+        if shard_router.enabled:
+            return [shard_router.new_session(name) for name in shard_router.names]
+        return [SessionLocal()]
+
+    def _sweep_database(self, now: datetime) -> Tuple[List[Row], int]:
+        expired: List[Row] = []
+        purged = 0
+        for db in self._sessions():
+            try:
+                repo = ShortUrlRepository(db)
+                for _ in range(self.max_batches):
+                    batch = repo.deactivate_expired(now, self.batch_size)
+                    expired.extend(batch)
+                    if len(batch) < self.batch_size:
+                        break
+
+                if self.purge_after_days > 0:
+                    cutoff = now - timedelta(days=self.purge_after_days)
+                    for _ in range(self.max_batches):
+                        count = repo.purge_expired(cutoff, self.batch_size)
+                        purged += count
+                        if count < self.batch_size:
+                            break
+            finally:
+                db.close()
+        return expired, purged
+
+    async def sweep_once(self) -> None:
+        now = datetime.now(timezone.utc)
+        expired, purged = await asyncio.to_thread(self._sweep_database, now)
+
+        if expired:
+            await write_tombstones({row.short_code: row.version for row in expired})
+            for row in expired:
+                event = UrlExpiredEvent(
+                    short_code=row.short_code,
+                    user_id=row.user_id,
+                    expires_at=row.expires_at,
+                    timestamp=now,
+                )
+                await event_publisher.publish(EVENT_URL_EXPIRED, event)
+
+        self.deactivated += len(expired)
+        self.purged += purged
+        self.last_run = now
+        if expired or purged:
+            logger.info(f"Expiry sweep: deactivated {len(expired)}, purged {purged}")
+
+    async def run(self, interval: float) -> None:
+        while True:
+            try:
+                await self.sweep_once()
+            except Exception as e:
+                logger.error(f"Expiry sweep failed: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+    def status(self) -> dict:
+        return {
+            "deactivated": self.deactivated,
+            "purged": self.purged,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+        }
+
+
+expiry_sweeper = ExpirySweeper(
+    batch_size=settings.EXPIRY_SWEEP_BATCH_SIZE,
+    max_batches=settings.EXPIRY_SWEEP_MAX_BATCHES,
+    purge_after_days=settings.EXPIRY_PURGE_AFTER_DAYS,
+)
@@ -1,12 +1,17 @@
-from datetime import datetime
-from typing import Optional, Tuple, List
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple, List
+import logging
 import math
-import asyncio
 
 from pydantic import HttpUrl
 
-from app.core.redis import RedisSingleton
+from app.core import metrics
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.settings import settings
 from app.repositories.short_url_repo import ShortUrlRepository
+from app.services import url_cache
+from app.services.url_cache import hot_url_pins, local_url_cache, remember_locally, url_cache_ttl
+from app.snapshot.store import redirect_snapshot
 from app.models.url_models import ShortUrl, User
 from app.utils.short_url_service_utils import prepare_url, generate_short_code
 from app.api.v1.schema_dtos import ShortURLCacheModel
@@ -26,6 +31,8 @@ from app.events.constants import (
 )
 
 
+logger = logging.getLogger(__name__)
+
 class ShortUrlService:
     def __init__(self, repo: ShortUrlRepository, redis: RedisSingleton):
         self.repo = repo
@@ -61,9 +68,11 @@ class ShortUrlService:
             original_url=short_url.original_url,
             user_id=short_url.user_id,
             timestamp=datetime.now(timezone.utc),
+            redirect_type=short_url.redirect_type,
+            expires_at=short_url.expires_at,
         )
        
-        asyncio.create_task(event_publisher.publish(EVENT_URL_CREATED, event))
+        event_publisher.publish_in_background(EVENT_URL_CREATED, event)
 
         return short_url
 
@@ -74,36 +83,148 @@ class ShortUrlService:
                 return code
 
     async def get_short_url_by_code(self, short_code: str) -> Optional[ShortUrl]:
-        r = self.redis.get_instance()
+        if redirect_snapshot.enabled:
+            entry = redirect_snapshot.lookup(short_code)
+            if entry is not None:
+                metrics.SNAPSHOT_HIT.inc()
+                return self._from_cache_model(ShortURLCacheModel(short_code=short_code, **entry._asdict()))
+            metrics.SNAPSHOT_MISS.inc()
+            if settings.SNAPSHOT_AUTHORITATIVE:
+                return None
+
+        # A pinned hot link can trail a change made through another worker by
+        # up to HOT_KEY_PIN_SECONDS; that is what keeps it off Redis.
+        hot = url_cache.is_hot(short_code)
+        if hot:
+            pinned = hot_url_pins.get(short_code)
+            if pinned is not None:
+                metrics.HOT_PIN_HIT.inc()
+                return self._from_cache_model(pinned)
+            metrics.HOT_PIN_MISS.inc()
+
+        redis_ok = self.redis.is_available()
 
-        cached_data = await r.get(short_code)
-        if cached_data:
+        if redis_ok:
             try:
-                data = ShortURLCacheModel.model_validate_json(cached_data)
-                return ShortUrl(
-                    short_code=data.short_code,
-                    original_url=data.original_url,
-                    redirect_type=data.redirect_type,
-                    expires_at=data.expires_at,
-                )
-            except Exception:
-                pass
-
-        short_url = self.repo.get_by_code_active(short_code)
-
-        if short_url:
-            cache_model = ShortURLCacheModel(
-                short_code=short_url.short_code,
-                original_url=short_url.original_url,
-                redirect_type=short_url.redirect_type,
-                expires_at=short_url.expires_at
-            )
-            await r.setex(short_code, 3600, cache_model.model_dump_json())
+                data = await url_cache.read_cached(short_code, hot)
+            except RedisUnavailableError as e:
+                logger.warning(f"Cache read skipped for {short_code}: {e}")
+                data = None
+                redis_ok = False
 
-        return short_url
+            if data is not None:
+                metrics.REDIS_HIT.inc()
+                remember_locally(data, hot)
+                return self._from_cache_model(data)
+            if redis_ok:
+                metrics.REDIS_MISS.inc()
+
+        if not redis_ok:
+            data = local_url_cache.get(short_code)
+            if data is not None:
+                metrics.LOCAL_HIT.inc()
+                return self._from_cache_model(data)
+            metrics.LOCAL_MISS.inc()
+
+        row = self.repo.get_redirect_target(short_code)
+        if row is None:
+            row = self.repo.get_expired_target(short_code)
+        if row is None and self.repo.promote_from_archive(short_code):
+            row = self.repo.get_redirect_target(short_code)
+        if row is None:
+            return None
+
+        cache_model = self._row_to_cache_model(row)
+        ttl = url_cache_ttl(row.expires_at)
+        remember_locally(cache_model, hot, ttl)
+        if redis_ok and ttl >= 1:
+            try:
+                await url_cache.cache_loaded_url(cache_model, ttl, hot)
+            except RedisUnavailableError as e:
+                logger.warning(f"Cache write skipped for {short_code}: {e}")
+
+        return self._from_cache_model(cache_model)
+
+
+    # Resolves a batch of codes with one Redis round trip and one query per
+    # shard for the misses, then back-fills the cache in one pipeline. Codes
+    # that do not resolve are left out of the result.
+    async def resolve_many(self, short_codes: List[str]) -> Dict[str, ShortURLCacheModel]:
+        resolved: Dict[str, ShortURLCacheModel] = {}
+        pending = list(dict.fromkeys(short_codes))
+
+        if redirect_snapshot.enabled:
+            for short_code in pending:
+                entry = redirect_snapshot.lookup(short_code)
+                if entry is not None:
+                    resolved[short_code] = ShortURLCacheModel(short_code=short_code, **entry._asdict())
+            if settings.SNAPSHOT_AUTHORITATIVE:
+                return resolved
+            pending = [short_code for short_code in pending if short_code not in resolved]
+
+        redis_ok = self.redis.is_available()
+        if redis_ok and pending:
+            try:
+                resolved.update(await url_cache.read_cached_many(pending))
+            except RedisUnavailableError as e:
+                logger.warning(f"Batch cache read skipped for {len(pending)} links: {e}")
+                redis_ok = False
+        if not redis_ok:
+            for short_code in pending:
+                data = local_url_cache.get(short_code)
+                if data is not None:
+                    resolved[short_code] = data
+        pending = [short_code for short_code in pending if short_code not in resolved]
+        if not pending:
+            return resolved
+
+        rows = self.repo.get_redirect_targets(pending)
+        still_missing = set(pending) - {row.short_code for row in rows}
+        if still_missing:
+            swept = self.repo.get_redirect_targets(sorted(still_missing), expired=True)
+            rows.extend(swept)
+            still_missing -= {row.short_code for row in swept}
+        loaded = [self._row_to_cache_model(row) for row in rows]
+        archived = self.repo.get_redirect_targets(sorted(still_missing), archived=True) if still_missing else []
+
+        for model in loaded:
+            remember_locally(model, hot=False, ttl=url_cache_ttl(model.expires_at))
+            resolved[model.short_code] = model
+        for row in archived:
+            resolved[row.short_code] = self._row_to_cache_model(row)
+
+        if redis_ok and loaded:
+            try:
+                await url_cache.cache_many(loaded)
+            except RedisUnavailableError as e:
+                logger.warning(f"Batch cache back-fill skipped for {len(loaded)} links: {e}")
+        return resolved
+
+    @staticmethod
+    def _row_to_cache_model(row) -> ShortURLCacheModel:
+        return ShortURLCacheModel(
+            short_code=row.short_code,
+            original_url=row.original_url,
+            redirect_type=row.redirect_type,
+            expires_at=row.expires_at,
+            version=row.version,
+        )
+
+    @staticmethod
+    def _from_cache_model(data: ShortURLCacheModel) -> ShortUrl:
+        return ShortUrl(
+            short_code=data.short_code,
+            original_url=data.original_url,
+            redirect_type=data.redirect_type,
+            expires_at=data.expires_at,
+        )
 
     def record_visit(self, short_url: ShortUrl) -> None:
-        self.repo.increment_clicks(short_url)
+        # Edge nodes serving from the snapshot have no database; their clicks
+        # are counted from the url.accessed events.
+        if settings.SNAPSHOT_AUTHORITATIVE:
+            return
+        self.repo.increment_clicks(short_url.short_code)
 
     def list_user_urls(
         self,
@@ -147,55 +268,54 @@ class ShortUrlService:
         if redirect_type is not None:
             changes["redirect_type"] = redirect_type
 
-        if changes and updated.user_id:
+        if changes:
             event = UrlUpdatedEvent(
                 short_code=updated.short_code,
                 user_id=updated.user_id,
                 changes=changes,
                 timestamp=datetime.now(timezone.utc),
             )
-            import asyncio
-            asyncio.create_task(event_publisher.publish(EVENT_URL_UPDATED, event))
+            event_publisher.publish_in_background(EVENT_URL_UPDATED, event)
 
         return updated
 
+    # The commit already scheduled the cache tombstone; this only waits for it.
     async def invalidate_cache(self, short_code: str) -> None:
-        r = self.redis.get_instance()
-        await r.delete(short_code)
+        await url_cache.settle(short_code)
 
     async def disable_short_url(self, short_url: ShortUrl) -> None:
         self.repo.soft_delete(short_url)
-        if short_url.user_id:
-            event = UrlStatusChangedEvent(
-                short_code=short_url.short_code,
-                user_id=short_url.user_id,
-                new_status="disabled",
-                timestamp=datetime.now(timezone.utc),
-            )
-            await event_publisher.publish(EVENT_URL_DISABLED, event)
+        await self.invalidate_cache(short_url.short_code)
+        event = UrlStatusChangedEvent(
+            short_code=short_url.short_code,
+            user_id=short_url.user_id,
+            new_status="disabled",
+            timestamp=datetime.now(timezone.utc),
+        )
+        await event_publisher.publish(EVENT_URL_DISABLED, event)
 
     async def enable_short_url(self, short_url: ShortUrl) -> None:
         self.repo.restore(short_url)
-        if short_url.user_id:
-            event = UrlStatusChangedEvent(
-                short_code=short_url.short_code,
-                user_id=short_url.user_id,
-                new_status="active",
-                timestamp=datetime.now(timezone.utc),
-            )
-            await event_publisher.publish(EVENT_URL_ENABLED, event)
+        await self.invalidate_cache(short_url.short_code)
+        event = UrlStatusChangedEvent(
+            short_code=short_url.short_code,
+            user_id=short_url.user_id,
+            new_status="active",
+            timestamp=datetime.now(timezone.utc),
+        )
+        await event_publisher.publish(EVENT_URL_ENABLED, event)
 
     async def delete_short_url(self, short_url: ShortUrl) -> None:
         short_code = short_url.short_code
         user_id = short_url.user_id
         self.repo.hard_delete(short_url)
-        if user_id:
-            event = UrlDeletedEvent(
-                short_code=short_code,
-                user_id=user_id,
-                timestamp=datetime.now(timezone.utc),
-            )
-            await event_publisher.publish(EVENT_URL_DELETED, event)
+        await self.invalidate_cache(short_code)
+        event = UrlDeletedEvent(
+            short_code=short_code,
+            user_id=user_id,
+            timestamp=datetime.now(timezone.utc),
+        )
+        await event_publisher.publish(EVENT_URL_DELETED, event)
 
     def verify_ownership(self, short_url: ShortUrl, user: User) -> bool:
         if user.role == "admin":
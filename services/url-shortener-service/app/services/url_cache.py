@@ -0,0 +1,531 @@
+# Both cache tiers for link lookups.
+#
+# Redis entries carry the row's version. Every write goes through
+# CACHE_SET_SCRIPT, which refuses anything older than what is already
+# cached, so a loader that read the row before a change (or from a lagging
+# replica) can never put the old state back. A change leaves a short-lived
+# tombstone at the new version instead of deleting the key, for the same
+# reason.
+#
+# Tombstones are written from the session's after_commit hook for every
+# ShortUrl the transaction updated or deleted, so callers do not have to
+# remember to invalidate; they only wait for it with settle().
+#
+# Links read often enough to saturate the Redis node owning their slot are
+# copied to HOT_KEY_REPLICAS keys on other slots and read from a random
+# copy, and pinned in the process for HOT_KEY_PIN_SECONDS. Writing the copies
+# also sets a marker next to the entry; tombstones and evictions cover the
+# copies of links that have one, whichever worker made them, and leave the
+# copy keys of every other link alone.
+#
+# With URL_CACHE_STORAGE=compact an entry is a field of one of many small
+# hashes instead of a key of its own, holding the packed form from
+# app.core.compact_cache rather than JSON. Small hashes use listpack
+# encoding, which drops the per-key overhead that dominates memory at tens
+# of millions of links. That takes two things on the Redis side:
+# hash-max-listpack-value above the longest packed entry (18 bytes plus the
+# URL), and hash-max-listpack-entries above the fields per bucket. The
+# bucket count is derived from URL_CACHE_EXPECTED_LINKS for the second, and
+# check_bucket_sizing() warns at startup when the two do not fit.
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, NamedTuple, Optional
+import asyncio
+import contextvars
+import json
+import logging
+import random
+import time
+
+from redis.exceptions import ResponseError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.api.v1.schema_dtos import ShortURLCacheModel
+from app.core.compact_cache import bucket_count, bucket_for, pack_link, pack_tombstone, unpack
+from app.core.hot_keys import HotKeyTracker
+from app.core.local_cache import LocalCache
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.redis_keys import (
+    url_bucket_copies_key,
+    url_bucket_key,
+    url_bucket_replica_key,
+    url_cache_key,
+    url_cache_replica_key,
+    url_copies_key,
+)
+from app.core.settings import settings
+from app.models.url_models import ShortUrl
+
+
+logger = logging.getLogger(__name__)
+
+STORAGE_STRING = "string"
+STORAGE_COMPACT = "compact"
+
+# Per-process copy of recently resolved links, used when Redis is skipped.
+local_url_cache = LocalCache(
+    max_entries=settings.LOCAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.LOCAL_CACHE_TTL_SECONDS,
+)
+
+hot_keys = HotKeyTracker(
+    sample_rate=settings.HOT_KEY_SAMPLE_RATE,
+    threshold_rps=settings.HOT_KEY_THRESHOLD_RPS,
+    decay_seconds=settings.HOT_KEY_DECAY_SECONDS,
+    max_tracked=settings.HOT_KEY_MAX_TRACKED,
+)
+
+# Kept apart from local_url_cache so ordinary traffic cannot push a hot
+# link out.
+hot_url_pins = LocalCache(
+    max_entries=settings.HOT_KEY_MAX_TRACKED,
+    ttl_seconds=settings.HOT_KEY_PIN_SECONDS,
+)
+
+# A live entry is replaced only by a newer version. A tombstone also lets
+# the row at its own version back in: that is the committed state it was
+# written for.
+CACHE_SET_SCRIPT = """
+local current = redis.call('get', KEYS[1])
+if current then
+    local cached = tonumber(string.match(current, '"version":(%d+)')) or 0
+    local incoming = tonumber(ARGV[1])
+    if incoming < cached then
+        return 0
+    end
+    if incoming == cached and not string.find(current, '"tombstone":true', 1, true) then
+        return 0
+    end
+end
+redis.call('set', KEYS[1], ARGV[2], 'EX', ARGV[3])
+return 1
+"""
+
+# The same rules for an entry stored as a field of a bucket hash (compact
+# mode), compared against that one field. Fields past their cached_until
+# count as absent. They are only swept out once the bucket reaches ARGV[5]
+# fields, so an ordinary write never reads the whole bucket; the sweep keeps
+# buckets small enough for listpack encoding. The bucket itself lives as
+# long as its newest entry.
+CACHE_HSET_SCRIPT = """
+local function u32(value, at)
+    local a, b, c, d = string.byte(value, at, at + 3)
+    return ((a * 256 + b) * 256 + c) * 256 + d
+end
+
+local now = tonumber(redis.call('time')[1])
+local current = redis.call('hget', KEYS[1], ARGV[1])
+if current and string.len(current) >= 9 and u32(current, 6) > now then
+    local cached = u32(current, 2)
+    local incoming = tonumber(ARGV[2])
+    if incoming < cached then
+        return 0
+    end
+    if incoming == cached and string.byte(current, 1) % 2 == 0 then
+        return 0
+    end
+end
+
+if not current and redis.call('hlen', KEYS[1]) >= tonumber(ARGV[5]) then
+    local fields = redis.call('hgetall', KEYS[1])
+    for i = 1, #fields, 2 do
+        local value = fields[i + 1]
+        if string.len(value) < 9 or u32(value, 6) <= now then
+            redis.call('hdel', KEYS[1], fields[i])
+        end
+    end
+end
+
+redis.call('hset', KEYS[1], ARGV[1], ARGV[3])
+if redis.call('ttl', KEYS[1]) < tonumber(ARGV[4]) then
+    redis.call('expire', KEYS[1], ARGV[4])
+end
+return 1
+"""
+
+CHANGES_KEY = "url_cache_changes"
+
+_in_flight: Dict[str, asyncio.Task] = {}
+
+
+# A cached link must not outlive its expiry, or redirects keep working after
+# it. An already expired link is cached for EXPIRED_CACHE_TTL_SECONDS as it
+# is, so repeated hits answer 410 without going back to the database.
+def url_cache_ttl(expires_at: Optional[datetime]) -> float:
+    ceiling = float(settings.URL_CACHE_TTL_SECONDS)
+    if expires_at is None:
+        return ceiling
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    if remaining <= 0:
+        return float(settings.EXPIRED_CACHE_TTL_SECONDS)
+    return min(ceiling, remaining)
+
+
+class CacheLocation(NamedTuple):
+    key: str
+    # Set in compact mode, where the entry is one field of a bucket hash.
+    field: Optional[str] = None
+
+
+def _compact() -> bool:
+    return settings.URL_CACHE_STORAGE == STORAGE_COMPACT
+
+
+def bucket_total() -> int:
+    return settings.URL_CACHE_BUCKETS or bucket_count(
+        settings.URL_CACHE_EXPECTED_LINKS, settings.URL_CACHE_BUCKET_ENTRIES
+    )
+
+
+def _location(short_code: str, replica: Optional[int] = None, compact: Optional[bool] = None) -> CacheLocation:
+    if _compact() if compact is None else compact:
+        bucket = bucket_for(short_code, bucket_total())
+        key = url_bucket_key(bucket) if replica is None else url_bucket_replica_key(bucket, replica)
+        return CacheLocation(key, short_code)
+    key = url_cache_key(short_code) if replica is None else url_cache_replica_key(short_code, replica)
+    return CacheLocation(key)
+
+
+# The layouts a change has to reach: the configured one, and the other too
+# while a deploy switches URL_CACHE_STORAGE and workers still read it.
+def _layouts() -> List[bool]:
+    if settings.URL_CACHE_LAYOUT_MIGRATION:
+        return [False, True]
+    return [_compact()]
+
+
+def _copies_key(short_code: str, compact: bool) -> str:
+    if compact:
+        return url_bucket_copies_key(bucket_for(short_code, bucket_total()), short_code)
+    return url_copies_key(short_code)
+
+
+def _copy_locations(short_code: str, compact: bool) -> List[CacheLocation]:
+    return [_location(short_code, replica, compact) for replica in range(settings.HOT_KEY_REPLICAS)]
+
+
+# Compact buckets only stay listpack-encoded while they hold fewer fields
+# than hash-max-listpack-entries; past that Redis converts them to real
+# hashes and the memory saving is gone. Managed Redis often refuses CONFIG,
+# in which case the sizing goes unchecked.
+async def check_bucket_sizing() -> None:
+    per_bucket = -(-settings.URL_CACHE_EXPECTED_LINKS // bucket_total())
+    try:
+        config = await RedisSingleton.execute(lambda r: r.config_get("hash-max-listpack-entries"))
+        limit = int(config["hash-max-listpack-entries"])
+    except (RedisUnavailableError, ResponseError, KeyError, ValueError) as e:
+        logger.info(f"Could not read hash-max-listpack-entries, cache bucket sizing unchecked: {e}")
+        return
+
+    if max(per_bucket, settings.URL_CACHE_BUCKET_ENTRIES) >= limit:
+        logger.warning(
+            f"Cache buckets may reach {max(per_bucket, settings.URL_CACHE_BUCKET_ENTRIES)} fields but "
+            f"hash-max-listpack-entries is {limit}; compact storage will not save memory"
+        )
+    elif per_bucket > settings.URL_CACHE_BUCKET_ENTRIES:
+        logger.warning(
+            f"URL_CACHE_BUCKETS={settings.URL_CACHE_BUCKETS} puts ~{per_bucket} links in a bucket, more than "
+            f"URL_CACHE_BUCKET_ENTRIES={settings.URL_CACHE_BUCKET_ENTRIES}; most writes will sweep their bucket"
+        )
+
+
+def encode_entry(model: ShortURLCacheModel, ttl: float) -> bytes | str:
+    if _compact():
+        return pack_link(
+            version=model.version,
+            cached_until=int(time.time() + ttl),
+            redirect_type=model.redirect_type,
+            expires_at=model.expires_at,
+            original_url=model.original_url,
+            compress_min_length=settings.URL_CACHE_COMPRESS_MIN_LENGTH,
+        )
+    return model.model_dump_json()
+
+
+def encode_tombstone(version: int, compact: bool) -> bytes | str:
+    if compact:
+        return pack_tombstone(version, int(time.time()) + settings.CACHE_TOMBSTONE_TTL_SECONDS)
+    return json.dumps({"version": version, "tombstone": True}, separators=(",", ":"))
+
+
+# None for a miss, a tombstone, a compact entry past its cached_until, or
+# anything unreadable.
+def decode_entry(short_code: str, raw: Optional[bytes]) -> Optional[ShortURLCacheModel]:
+    if not raw:
+        return None
+    if _compact():
+        packed = unpack(raw)
+        if packed is None or packed.tombstone or packed.cached_until <= time.time():
+            return None
+        return ShortURLCacheModel(
+            short_code=short_code,
+            original_url=packed.original_url,
+            redirect_type=packed.redirect_type,
+            expires_at=packed.expires_at,
+            version=packed.version,
+        )
+    if b'"tombstone":true' in raw:
+        return None
+    try:
+        return ShortURLCacheModel.model_validate_json(raw)
+    except Exception:
+        return None
+
+
+def _queue_set(client, location: CacheLocation, version: int, value: bytes | str, ttl: int):
+    if location.field is None:
+        return client.eval(CACHE_SET_SCRIPT, 1, location.key, version, value, ttl)
+    return client.eval(
+        CACHE_HSET_SCRIPT, 1, location.key, location.field, version, value, ttl, settings.URL_CACHE_BUCKET_ENTRIES
+    )
+
+
+def _queue_get(client, location: CacheLocation):
+    if location.field is None:
+        return client.get(location.key)
+    return client.hget(location.key, location.field)
+
+
+def _queue_delete(client, location: CacheLocation):
+    if location.field is None:
+        return client.delete(location.key)
+    return client.hdel(location.key, location.field)
+
+
+def queue_cache_write(client, model: ShortURLCacheModel, ttl: float):
+    return _queue_set(client, _location(model.short_code), model.version, encode_entry(model, ttl), int(ttl))
+
+
+def _queue_tombstone(client, location: CacheLocation, version: int):
+    tombstone = encode_tombstone(version, compact=location.field is not None)
+    return _queue_set(client, location, version, tombstone, settings.CACHE_TOMBSTONE_TTL_SECONDS)
+
+
+# Tombstones the link's entry in every layout in _layouts(); its hot key
+# copies are left to _invalidate.
+def queue_tombstones(client, short_code: str, version: int) -> None:
+    for compact in _layouts():
+        _queue_tombstone(client, _location(short_code, compact=compact), version)
+
+
+async def cache_url(model: ShortURLCacheModel, ttl: float) -> bool:
+    written = await RedisSingleton.execute(lambda r: queue_cache_write(r, model, ttl), binary=True)
+    return bool(written)
+
+
+def is_hot(short_code: str) -> bool:
+    return settings.HOT_KEY_DETECTION_ENABLED and hot_keys.record(short_code)
+
+
+async def _replicate(model: ShortURLCacheModel) -> None:
+    ttl = int(min(url_cache_ttl(model.expires_at), settings.HOT_KEY_REPLICA_TTL_SECONDS))
+    if ttl < 1:
+        return
+    value = encode_entry(model, ttl)
+
+    async def _write_copies(r):
+        async with r.pipeline(transaction=False) as pipe:
+            for location in _copy_locations(model.short_code, _compact()):
+                _queue_set(pipe, location, model.version, value, ttl)
+            pipe.set(_copies_key(model.short_code, _compact()), 1, ex=ttl)
+            await pipe.execute()
+
+    # The entry itself was served; losing the copies only costs spreading.
+    try:
+        await RedisSingleton.execute(_write_copies, binary=True)
+    except RedisUnavailableError as e:
+        logger.warning(f"Hot key copies skipped for {model.short_code}: {e}")
+
+
+async def _read(short_code: str, location: CacheLocation) -> Optional[ShortURLCacheModel]:
+    raw = await RedisSingleton.execute(lambda r: _queue_get(r, location), binary=True)
+    return decode_entry(short_code, raw)
+
+
+# Reads the cached entry, from a random copy when the link is hot. A hot
+# link whose copy is missing is read from its primary key and copied out
+# again. Raises RedisUnavailableError like any Redis call.
+async def read_cached(short_code: str, hot: bool) -> Optional[ShortURLCacheModel]:
+    if hot and settings.HOT_KEY_REPLICAS > 0:
+        data = await _read(short_code, _location(short_code, random.randrange(settings.HOT_KEY_REPLICAS)))
+        if data is not None:
+            return data
+
+    data = await _read(short_code, _location(short_code))
+    if data is not None and hot and settings.HOT_KEY_REPLICAS > 0:
+        await _replicate(data)
+    return data
+
+
+# One round trip for a batch: MGET of the link keys, or one HMGET per
+# bucket in compact mode. Codes that are not cached are left out.
+async def read_cached_many(short_codes: List[str]) -> Dict[str, ShortURLCacheModel]:
+    locations = [_location(short_code) for short_code in short_codes]
+
+    async def _read_all(r):
+        if _compact():
+            by_bucket: Dict[str, List[str]] = {}
+            for location in locations:
+                by_bucket.setdefault(location.key, []).append(location.field)
+            async with r.pipeline(transaction=False) as pipe:
+                for key, fields in by_bucket.items():
+                    pipe.hmget(key, fields)
+                replies = await pipe.execute()
+            return [raw for fields in replies for raw in fields], [
+                field for fields in by_bucket.values() for field in fields
+            ]
+        keys = [location.key for location in locations]
+        # The keys of a batch sit on many slots; the cluster client splits
+        # the MGET per node.
+        if settings.REDIS_CLUSTER_MODE:
+            return await r.mget_nonatomic(keys), short_codes
+        return await r.mget(keys), short_codes
+
+    values, codes = await RedisSingleton.execute(_read_all, binary=True)
+    found = {}
+    for short_code, raw in zip(codes, values):
+        data = decode_entry(short_code, raw)
+        if data is not None:
+            found[short_code] = data
+    return found
+
+
+async def cache_many(models: List[ShortURLCacheModel]) -> None:
+    async def _write_all(r):
+        async with r.pipeline(transaction=False) as pipe:
+            for model in models:
+                ttl = url_cache_ttl(model.expires_at)
+                if ttl >= 1:
+                    queue_cache_write(pipe, model, ttl)
+            await pipe.execute()
+
+    await RedisSingleton.execute(_write_all, binary=True)
+
+
+async def cache_loaded_url(model: ShortURLCacheModel, ttl: float, hot: bool) -> None:
+    await cache_url(model, ttl)
+    if hot and settings.HOT_KEY_REPLICAS > 0:
+        await _replicate(model)
+
+
+def remember_locally(model: ShortURLCacheModel, hot: bool, ttl: Optional[float] = None) -> None:
+    local_ttl = settings.LOCAL_CACHE_TTL_SECONDS if ttl is None else min(ttl, settings.LOCAL_CACHE_TTL_SECONDS)
+    local_url_cache.set(model.short_code, model, ttl_seconds=local_ttl)
+    if hot:
+        pin_ttl = settings.HOT_KEY_PIN_SECONDS if ttl is None else min(ttl, settings.HOT_KEY_PIN_SECONDS)
+        hot_url_pins.set(model.short_code, model, ttl_seconds=pin_ttl)
+
+
+def forget_locally(short_code: str) -> None:
+    local_url_cache.delete(short_code)
+    hot_url_pins.delete(short_code)
+
+
+# Applies change(pipe, short_code, location) to the link's entry in each
+# layout in _layouts() and checks its copies marker in the same round trip.
+# Only links with hot key copies take a second round trip for those. The
+# marker outlives the copies it was set for, so none is missed.
+async def _invalidate(short_codes: List[str], change: Callable) -> None:
+    async def _apply(r):
+        checked = []
+        async with r.pipeline(transaction=False) as pipe:
+            for short_code in short_codes:
+                for compact in _layouts():
+                    change(pipe, short_code, _location(short_code, compact=compact))
+                    if settings.HOT_KEY_REPLICAS > 0:
+                        checked.append((short_code, compact, len(pipe)))
+                        pipe.exists(_copies_key(short_code, compact))
+            replies = await pipe.execute()
+
+        with_copies = [(short_code, compact) for short_code, compact, reply in checked if replies[reply]]
+        if not with_copies:
+            return
+        async with r.pipeline(transaction=False) as pipe:
+            for short_code, compact in with_copies:
+                for location in _copy_locations(short_code, compact):
+                    change(pipe, short_code, location)
+            await pipe.execute()
+
+    await RedisSingleton.execute(_apply, binary=True)
+
+
+# Marks links as changed at the given versions in both tiers.
+async def write_tombstones(versions: Dict[str, int]) -> None:
+    for short_code in versions:
+        forget_locally(short_code)
+
+    def _tombstone(pipe, short_code: str, location: CacheLocation):
+        _queue_tombstone(pipe, location, versions[short_code])
+
+    try:
+        await _invalidate(list(versions), _tombstone)
+    except RedisUnavailableError as e:
+        logger.warning(f"Cache tombstones skipped for {len(versions)} links: {e}")
+    except Exception as e:
+        logger.error(f"Cache tombstones failed for {len(versions)} links: {e}", exc_info=True)
+
+
+# Drops links whose content did not change, such as archived ones, from
+# both tiers.
+async def evict_cached_urls(short_codes: List[str]) -> None:
+    for short_code in short_codes:
+        forget_locally(short_code)
+
+    try:
+        await _invalidate(short_codes, lambda pipe, short_code, location: _queue_delete(pipe, location))
+    except RedisUnavailableError as e:
+        logger.warning(f"Cache eviction skipped for {len(short_codes)} links: {e}")
+
+
+# Waits for the tombstone of a change this process committed, so the
+# response to a mutation is only sent once redirects see it.
+async def settle(short_code: str) -> None:
+    task = _in_flight.get(short_code)
+    if task is not None:
+        await asyncio.shield(task)
+
+
+def _forget(short_code: str, task: asyncio.Task) -> None:
+    if _in_flight.get(short_code) is task:
+        del _in_flight[short_code]
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_links(session, flush_context):
+    changes = session.info.setdefault(CHANGES_KEY, {})
+    for obj in session.dirty:
+        if isinstance(obj, ShortUrl) and session.is_modified(obj, include_collections=False):
+            changes[obj.short_code] = obj.version
+    # Nothing is left to read the version from once the row is gone; one past
+    # its last version keeps stale loaders out until the tombstone expires.
+    for obj in session.deleted:
+        if isinstance(obj, ShortUrl):
+            changes[obj.short_code] = obj.version + 1
+
+
+@event.listens_for(Session, "after_commit")
+def _tombstone_committed_links(session):
+    changes = session.info.pop(CHANGES_KEY, None)
+    if not changes:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Scripts and worker threads change links with bulk statements and
+        # write their own tombstones.
+        logger.debug(f"No event loop, leaving cache tombstones for {len(changes)} links")
+        return
+
+    # A fresh context so the request's deadline does not cut the write short
+    # after the response is sent.
+    task = loop.create_task(write_tombstones(changes), context=contextvars.Context())
+    for short_code in changes:
+        _in_flight[short_code] = task
+        task.add_done_callback(lambda done, code=short_code: _forget(code, done))
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back_changes(session):
+    session.info.pop(CHANGES_KEY, None)
@@ -0,0 +1,155 @@
+# On-disk layout of the redirect snapshot:
+#
+#   header   magic, record count, offset of the string area, stream id
+#   records  one fixed-width record per link, sorted by short_code bytes
+#   strings  the original URLs, back to back
+#
+# Fixed-width records make a lookup a binary search over the mapped file:
+# no parsing at load time and nothing copied into the process, so every
+# worker on a node shares the same page-cache pages.
+from datetime import datetime, timezone
+from typing import Iterable, NamedTuple, Optional
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"LPSNAP01"
+HEADER = struct.Struct("<8sQQ32s")
+# short_code (NUL padded), url offset, url length, redirect_type, flags,
+# expires_at
+RECORD = struct.Struct("<12sQIHBq")
+FLAG_ACTIVE = 0x01
+CODE_WIDTH = 12
+NO_EXPIRY = -(2 ** 63)
+
+
+class SnapshotEntry(NamedTuple):
+    original_url: str
+    redirect_type: int
+    expires_at: Optional[datetime]
+
+
+def encode_code(short_code: str) -> Optional[bytes]:
+    raw = short_code.encode()
+    if len(raw) > CODE_WIDTH:
+        return None
+    return raw.ljust(CODE_WIDTH, b"\0")
+
+
+def _encode_expiry(expires_at: Optional[datetime]) -> int:
+    if expires_at is None:
+        return NO_EXPIRY
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return int(expires_at.timestamp() * 1_000_000)
+
+
+def _decode_expiry(value: int) -> Optional[datetime]:
+    if value == NO_EXPIRY:
+        return None
+    return datetime.fromtimestamp(value / 1_000_000, tz=timezone.utc)
+
+
+# entries must arrive sorted by short_code bytes. Disabled links are kept,
+# flagged inactive, so a later url.enabled event can bring them back. The
+# file is written next to path and renamed over it, so readers only ever see
+# a complete snapshot.
+def write_snapshot(
+    path: str,
+    entries: Iterable[tuple[str, str, int, Optional[datetime], bool]],
+    stream_id: str,
+) -> int:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".snapshot-")
+    count = 0
+    try:
+        with os.fdopen(fd, "wb") as out, tempfile.TemporaryFile(dir=directory) as strings:
+            out.write(b"\0" * HEADER.size)
+            offset = 0
+            previous = b""
+            for short_code, original_url, redirect_type, expires_at, is_active in entries:
+                key = encode_code(short_code)
+                if key is None:
+                    logger.warning(f"Skipping {short_code!r}: longer than {CODE_WIDTH} bytes")
+                    continue
+                if key <= previous:
+                    raise ValueError(f"Snapshot entries out of order at {short_code!r}")
+
+                url = original_url.encode()
+                flags = FLAG_ACTIVE if is_active else 0
+                out.write(RECORD.pack(key, offset, len(url), redirect_type, flags, _encode_expiry(expires_at)))
+                strings.write(url)
+                offset += len(url)
+                previous = key
+                count += 1
+
+            strings.seek(0)
+            shutil.copyfileobj(strings, out)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, count, HEADER.size + count * RECORD.size, stream_id.encode()))
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return count
+
+
+class SnapshotReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count, self._strings_offset, stream_id = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a redirect snapshot")
+        self.stream_id = stream_id.rstrip(b"\0").decode()
+
+    def lookup(self, short_code: str, include_inactive: bool = False) -> Optional[SnapshotEntry]:
+        key = encode_code(short_code)
+        if key is None:
+            return None
+
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            position = HEADER.size + middle * RECORD.size
+            probe = self._map[position:position + CODE_WIDTH]
+            if probe < key:
+                low = middle + 1
+            elif probe > key:
+                high = middle
+            else:
+                _, offset, length, redirect_type, flags, expires_at = RECORD.unpack_from(self._map, position)
+                if not flags & FLAG_ACTIVE and not include_inactive:
+                    return None
+                start = self._strings_offset + offset
+                return SnapshotEntry(
+                    original_url=self._map[start:start + length].decode(),
+                    redirect_type=redirect_type,
+                    expires_at=_decode_expiry(expires_at),
+                )
+        return None
+
+    # A rebuilt snapshot is renamed over the old one, so a new inode means
+    # there is something to reload.
+    def replaced_on_disk(self) -> bool:
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (current.st_ino, current.st_mtime_ns) != (self._stat.st_ino, self._stat.st_mtime_ns)
+
+    def close(self) -> None:
+        self._map.close()
@@ -0,0 +1,207 @@
+from datetime import datetime
+from typing import Optional
+import asyncio
+import json
+import logging
+
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.settings import settings
+from app.events.constants import (
+    STREAM_NAME,
+    EVENT_URL_CREATED,
+    EVENT_URL_UPDATED,
+    EVENT_URL_DELETED,
+    EVENT_URL_DISABLED,
+    EVENT_URL_ENABLED,
+)
+from app.snapshot.format import SnapshotEntry, SnapshotReader
+
+
+logger = logging.getLogger(__name__)
+
+DELTA_EVENTS = {
+    EVENT_URL_CREATED,
+    EVENT_URL_UPDATED,
+    EVENT_URL_DELETED,
+    EVENT_URL_DISABLED,
+    EVENT_URL_ENABLED,
+}
+
+
+def _stream_position(message_id: str) -> tuple[int, int]:
+    milliseconds, _, sequence = message_id.partition("-")
+    return int(milliseconds or 0), int(sequence or 0)
+
+
+def _parse_datetime(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+# The mapped snapshot plus an in-memory overlay of link events published
+# after it was built. Events are kept until a newer snapshot covers them, so
+# a hot reload can rebuild the overlay on top of the new file. Past
+# max_pending_deltas they are compacted to at most two per link.
+class RedirectSnapshot:
+    def __init__(self, path: Optional[str], max_pending_deltas: int = 100000):
+        self.path = path
+        self.max_pending_deltas = max_pending_deltas
+        self._compact_at = max_pending_deltas
+        self._reader: Optional[SnapshotReader] = None
+        self._overlay: dict[str, Optional[SnapshotEntry]] = {}
+        self._disabled: set[str] = set()
+        self._enabled: set[str] = set()
+        self._events: list[tuple[str, str, dict]] = []
+        self._last_id = "0-0"
+        self.reloads = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._reader is not None
+
+    def load(self) -> None:
+        reader = SnapshotReader(self.path)
+        previous, self._reader = self._reader, reader
+
+        covered = _stream_position(reader.stream_id or "0-0")
+        self._events = [event for event in self._events if _stream_position(event[0]) > covered]
+        self._compact_at = max(self.max_pending_deltas, 2 * len(self._events))
+        if _stream_position(self._last_id) < covered:
+            self._last_id = reader.stream_id
+
+        self._overlay.clear()
+        self._disabled.clear()
+        self._enabled.clear()
+        for _, event_type, payload in self._events:
+            self._apply(event_type, payload)
+
+        if previous is not None:
+            previous.close()
+            self.reloads += 1
+        logger.info(f"Loaded redirect snapshot {self.path}: {reader.count} links, {len(self._events)} pending deltas")
+
+    def lookup(self, short_code: str) -> Optional[SnapshotEntry]:
+        if short_code in self._disabled:
+            return None
+        return self._current(short_code)
+
+    def _current(self, short_code: str) -> Optional[SnapshotEntry]:
+        if short_code in self._overlay:
+            return self._overlay[short_code]
+        if self._reader is None:
+            return None
+        return self._reader.lookup(short_code, include_inactive=short_code in self._enabled)
+
+    def apply_event(self, message_id: str, event_type: str, payload: dict) -> None:
+        if event_type not in DELTA_EVENTS:
+            return
+        self._events.append((message_id, event_type, payload))
+        self._apply(event_type, payload)
+        if len(self._events) > self._compact_at:
+            self._compact()
+
+    # Rewrites the pending events as each link's current overlay entry and
+    # status, both at the position of the link's last event. Replayed on any
+    # snapshot that the originals would have been replayed on, they give the
+    # same state.
+    def _compact(self) -> None:
+        last_ids = {payload["short_code"]: message_id for message_id, _, payload in self._events}
+        compacted = []
+        for short_code, message_id in last_ids.items():
+            if short_code in self._overlay:
+                entry = self._overlay[short_code]
+                if entry is None:
+                    compacted.append((message_id, EVENT_URL_DELETED, {"short_code": short_code}))
+                else:
+                    compacted.append((message_id, EVENT_URL_CREATED, {
+                        "short_code": short_code,
+                        "original_url": entry.original_url,
+                        "redirect_type": entry.redirect_type,
+                        "expires_at": entry.expires_at.isoformat() if entry.expires_at else None,
+                    }))
+            if short_code in self._disabled:
+                compacted.append((message_id, EVENT_URL_DISABLED, {"short_code": short_code}))
+            elif short_code in self._enabled:
+                compacted.append((message_id, EVENT_URL_ENABLED, {"short_code": short_code}))
+        compacted.sort(key=lambda event: _stream_position(event[0]))
+
+        logger.info(f"Compacted {len(self._events)} pending snapshot deltas to {len(compacted)}")
+        self._events = compacted
+        # Links touched since the snapshot was built bound what compaction can
+        # do; past that only a rebuilt snapshot helps.
+        if len(compacted) > self.max_pending_deltas:
+            logger.warning(f"{len(compacted)} links changed since snapshot {self.path} was built; rebuild it")
+        self._compact_at = max(self.max_pending_deltas, 2 * len(compacted))
+
+    def _apply(self, event_type: str, payload: dict) -> None:
+        short_code = payload["short_code"]
+        if event_type == EVENT_URL_CREATED:
+            self._overlay[short_code] = SnapshotEntry(
+                original_url=payload["original_url"],
+                redirect_type=payload.get("redirect_type") or 302,
+                expires_at=_parse_datetime(payload.get("expires_at")),
+            )
+            self._disabled.discard(short_code)
+            self._enabled.discard(short_code)
+        elif event_type == EVENT_URL_UPDATED:
+            current = self._current(short_code)
+            if current is not None:
+                changes = payload.get("changes", {})
+                self._overlay[short_code] = current._replace(
+                    redirect_type=changes.get("redirect_type", current.redirect_type),
+                    expires_at=_parse_datetime(changes["expires_at"]) if "expires_at" in changes else current.expires_at,
+                )
+        elif event_type == EVENT_URL_DELETED:
+            self._overlay[short_code] = None
+            self._disabled.discard(short_code)
+            self._enabled.discard(short_code)
+        elif event_type == EVENT_URL_DISABLED:
+            self._disabled.add(short_code)
+            self._enabled.discard(short_code)
+        elif event_type == EVENT_URL_ENABLED:
+            self._disabled.discard(short_code)
+            self._enabled.add(short_code)
+
+    # Returns how many stream entries were read, so the follower keeps
+    # polling while it is behind.
+    async def poll_deltas(self) -> int:
+        response = await RedisSingleton.execute(
+            lambda r: r.xread({STREAM_NAME: self._last_id}, count=1000)
+        )
+        read = 0
+        for _, messages in response or []:
+            for message_id, fields in messages:
+                self._last_id = message_id
+                read += 1
+                if fields.get("type") in DELTA_EVENTS:
+                    self.apply_event(message_id, fields["type"], json.loads(fields["payload"]))
+        return read
+
+    async def follow(self, interval: float) -> None:
+        while True:
+            try:
+                # Mapping is lazy, so reloading on the loop is cheap and keeps
+                # lookups from ever seeing a half-swapped reader.
+                if self._reader is not None and self._reader.replaced_on_disk():
+                    self.load()
+                while await self.poll_deltas():
+                    pass
+            except RedisUnavailableError as e:
+                logger.warning(f"Snapshot deltas paused: {e}")
+            except Exception as e:
+                logger.error(f"Snapshot follower failed: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+    def status(self) -> dict:
+        if self._reader is None:
+            return {"loaded": False}
+        return {
+            "loaded": True,
+            "links": self._reader.count,
+            "snapshot_stream_id": self._reader.stream_id,
+            "last_event_id": self._last_id,
+            "pending_deltas": len(self._events),
+            "reloads": self.reloads,
+        }
+
+
+redirect_snapshot = RedirectSnapshot(settings.SNAPSHOT_PATH, settings.SNAPSHOT_MAX_PENDING_DELTAS)
@@ -0,0 +1,147 @@
+# Compares Redis memory per cached link across the cache storage modes:
+#
+#   python -m benchmarks.cache_memory --links 200000
+#   python -m benchmarks.cache_memory --links 200000 --redis-url redis://localhost:6379/15
+#
+# Without --redis-url only the payload sizes are reported. With it, each mode
+# is written to the given (empty) database and measured from INFO memory,
+# which includes the per-key overhead the compact mode is meant to remove.
+# The database is flushed between modes.
+from datetime import datetime, timedelta, timezone
+from typing import List
+import argparse
+import random
+import string
+import sys
+
+import redis
+
+from app.api.v1.schema_dtos import ShortURLCacheModel
+from app.core.compact_cache import bucket_count
+from app.core.settings import settings
+from app.services import url_cache
+
+
+URL_SHAPES = [
+    "https://www.example.com/blog/{slug}",
+    "https://shop.example.com/products/{slug}?utm_source=newsletter&utm_medium=email&utm_campaign={word}",
+    "https://docs.google.com/document/d/{token}/edit",
+    "https://github.com/{word}/{slug}",
+    "https://news.example.org/{year}/{word}/{slug}.html",
+]
+
+MODES = [
+    ("string", {"URL_CACHE_STORAGE": "string"}),
+    ("compact", {"URL_CACHE_STORAGE": "compact", "URL_CACHE_COMPRESS_MIN_LENGTH": 0}),
+    ("compact+deflate", {"URL_CACHE_STORAGE": "compact", "URL_CACHE_COMPRESS_MIN_LENGTH": 48}),
+]
+
+
+def _links(count: int, seed: int) -> List[ShortURLCacheModel]:
+    rng = random.Random(seed)
+    alphabet = string.ascii_letters + string.digits
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(500)]
+    expires = datetime.now(timezone.utc) + timedelta(days=30)
+
+    links = []
+    for _ in range(count):
+        url = rng.choice(URL_SHAPES).format(
+            slug="-".join(rng.choices(words, k=rng.randint(2, 6))),
+            word=rng.choice(words),
+            token="".join(rng.choices(alphabet, k=44)),
+            year=rng.randint(2015, 2026),
+        )
+        links.append(ShortURLCacheModel(
+            short_code="".join(rng.choices(alphabet, k=7)),
+            original_url=url,
+            redirect_type=rng.choice([301, 302]),
+            expires_at=expires if rng.random() < 0.2 else None,
+            version=rng.randint(1, 5),
+        ))
+    return links
+
+
+def _payload_bytes(links: List[ShortURLCacheModel]) -> float:
+    total = 0
+    for link in links:
+        location = url_cache._location(link.short_code)
+        value = url_cache.encode_entry(link, settings.URL_CACHE_TTL_SECONDS)
+        name = location.field if location.field is not None else location.key
+        total += len(name) + len(value if isinstance(value, bytes) else value.encode())
+    return total / len(links)
+
+
+# Plain SET/HSET rather than the compare-and-set script: the layout is what
+# is being measured, not the write path.
+def _load(client: redis.Redis, links: List[ShortURLCacheModel], batch: int) -> None:
+    ttl = settings.URL_CACHE_TTL_SECONDS
+    for start in range(0, len(links), batch):
+        pipe = client.pipeline(transaction=False)
+        for link in links[start:start + batch]:
+            location = url_cache._location(link.short_code)
+            value = url_cache.encode_entry(link, ttl)
+            if location.field is None:
+                pipe.set(location.key, value, ex=ttl)
+            else:
+                pipe.hset(location.key, location.field, value)
+                pipe.expire(location.key, ttl)
+        pipe.execute()
+
+
+def _encodings(client: redis.Redis, sample: int) -> dict:
+    counts: dict = {}
+    for key in client.scan_iter(match="urlb:*", count=1000):
+        encoding = client.object("encoding", key)
+        counts[encoding] = counts.get(encoding, 0) + 1
+        sample -= 1
+        if sample <= 0:
+            break
+    return counts
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Measure Redis memory per cached link for each cache storage mode")
+    parser.add_argument("--links", type=int, default=100000)
+    parser.add_argument("--buckets", type=int, help="defaults to links / URL_CACHE_BUCKET_ENTRIES, as the service sizes them")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--redis-url", help="an empty database to measure in, e.g. redis://localhost:6379/15")
+    parser.add_argument("--listpack-value", type=int, default=256, help="hash-max-listpack-value to set first (0 leaves it)")
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    settings.URL_CACHE_BUCKETS = args.buckets or bucket_count(args.links, settings.URL_CACHE_BUCKET_ENTRIES)
+    settings.HOT_KEY_REPLICAS = 0
+    links = _links(args.links, args.seed)
+
+    client = None
+    if args.redis_url:
+        client = redis.Redis.from_url(args.redis_url)
+        if client.dbsize():
+            print(f"{args.redis_url} is not empty, refusing to flush it", file=sys.stderr)
+            return 2
+        if args.listpack_value:
+            client.config_set("hash-max-listpack-value", args.listpack_value)
+
+    print(f"{args.links} links, {settings.URL_CACHE_BUCKETS} buckets")
+    print(f"{'mode':<18}{'payload B/link':>16}{'redis B/link':>14}  encodings")
+    for name, overrides in MODES:
+        for field, value in overrides.items():
+            setattr(settings, field, value)
+
+        measured, encodings = "-", ""
+        if client is not None:
+            client.flushdb()
+            before = client.info("memory")["used_memory"]
+            _load(client, links, args.batch)
+            after = client.info("memory")["used_memory"]
+            measured = f"{(after - before) / len(links):.1f}"
+            if settings.URL_CACHE_STORAGE == "compact":
+                encodings = str(_encodings(client, sample=200))
+            client.flushdb()
+
+        print(f"{name:<18}{_payload_bytes(links):>16.1f}{measured:>14}  {encodings}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
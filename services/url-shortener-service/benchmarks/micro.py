@@ -0,0 +1,358 @@
+# Microbenchmarks for the functions on the request path and for each
+# middleware on its own:
+#
+#   python -m benchmarks.micro
+#   python -m benchmarks.micro -k cache --out after.json --compare before.json
+#   python -m benchmarks.micro -k middleware --redis-url redis://localhost:6379/15
+#
+# Each benchmark is calibrated to run for at least --min-time per repeat and
+# is then repeated --repeat times with the garbage collector off, after one
+# discarded warm-up repeat. The median time per call is the figure to quote;
+# the IQR next to it says how far to trust it, and results whose IQR is more
+# than 5% of the median are marked unstable. Quiet the machine first and
+# keep PYTHONHASHSEED fixed between the runs being compared.
+#
+# Middlewares wrap a bare endpoint and are called directly with a synthetic
+# redirect request, so "middleware.none" is the floor the others sit on.
+# The rate limiter makes a real Redis round trip: to --redis-url when given,
+# otherwise to fakeredis if it is installed, which measures fakeredis as
+# much as the middleware.
+#
+# --compare prints the change in median against an earlier --out file;
+# changes smaller than the noise of either run are marked "~".
+from datetime import datetime, timedelta, timezone
+from statistics import mean, median, quantiles, stdev
+from typing import Callable, Optional
+import argparse
+import asyncio
+import gc
+import json
+import platform
+import re
+import sys
+import time
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from app.api.v1.routes.short_urls import _build_short_url_response
+from app.api.v1.schema_dtos import ShortURLCacheModel
+from app.core.redis import RedisSingleton
+from app.core.security import create_access_token, decode_token
+from app.core.settings import settings
+from app.core.tracing import ServerSpanMiddleware
+from app.events.constants import EVENT_URL_ACCESSED
+from app.events.publisher import EventPublisher
+from app.events.schemas import UrlAccessedEvent
+from app.middleware.deadline_middleware import DeadlineMiddleware
+from app.middleware.error_handler import ErrorHandlerMiddleware
+from app.middleware.logging_middleware import LoggingMiddleware
+from app.middleware.profiling_middleware import ProfilingMiddleware
+from app.middleware.rate_limit_middleware import RateLimitMiddleware
+from app.middleware.request_id_middleware import RequestIDMiddleware
+from app.models.url_models import ShortUrl
+from app.services import url_cache
+from app.utils.short_url_service_utils import generate_short_code, normalize_url, validate_syntax
+
+
+UNSTABLE_IQR = 0.05
+
+RAW_URL = "HTTPS://Shop.Example.com:443/products/blue-widget/?utm_source=newsletter&utm_medium=email&ref=abc#reviews"
+LONG_URL = "https://shop.example.com/products/blue-widget-with-extra-long-name?utm_source=newsletter&utm_medium=email&utm_campaign=spring"
+NOW = datetime.now(timezone.utc)
+
+# A benchmark is called with a loop count and runs the measured code that
+# many times.
+Runner = Callable[[int], None]
+
+
+def _sync(fn: Callable[[], object]) -> Runner:
+    def run(loops: int) -> None:
+        for _ in range(loops):
+            fn()
+    return run
+
+
+def _cache_model() -> ShortURLCacheModel:
+    return ShortURLCacheModel(
+        short_code="aZ3kP9q",
+        original_url=LONG_URL,
+        redirect_type=302,
+        expires_at=NOW + timedelta(days=30),
+        version=3,
+    )
+
+
+def _cache_encode(storage: str) -> Runner:
+    model = _cache_model()
+
+    def run(loops: int) -> None:
+        settings.URL_CACHE_STORAGE = storage
+        for _ in range(loops):
+            url_cache.encode_entry(model, settings.URL_CACHE_TTL_SECONDS)
+    return run
+
+
+def _cache_decode(storage: str) -> Runner:
+    model = _cache_model()
+
+    def run(loops: int) -> None:
+        settings.URL_CACHE_STORAGE = storage
+        raw = url_cache.encode_entry(model, settings.URL_CACHE_TTL_SECONDS)
+        if isinstance(raw, str):
+            raw = raw.encode()
+        for _ in range(loops):
+            url_cache.decode_entry(model.short_code, raw)
+    return run
+
+
+def _short_url() -> ShortUrl:
+    return ShortUrl(
+        id=1,
+        short_code="aZ3kP9q",
+        original_url=LONG_URL,
+        normalized_url=LONG_URL,
+        created_at=NOW,
+        expires_at=None,
+        redirect_type=302,
+        is_active=True,
+        click_count=42,
+        user_id=7,
+    )
+
+
+def _event_serialize() -> Runner:
+    event = UrlAccessedEvent(
+        short_code="aZ3kP9q",
+        ip_address="203.0.113.7",
+        user_agent="Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36",
+        referrer="https://news.example.org/",
+        timestamp=NOW,
+    )
+    return _sync(lambda: EventPublisher.event_data(EVENT_URL_ACCESSED, event.model_dump_json()))
+
+
+async def _endpoint(scope, receive, send) -> None:
+    await send({"type": "http.response.start", "status": 302, "headers": [(b"location", LONG_URL.encode())]})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def _redirect_scope() -> dict:
+    app = FastAPI()
+
+    @app.get("/{short_code}")
+    async def redirect(short_code: str):
+        pass
+
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/aZ3kP9q",
+        "raw_path": b"/aZ3kP9q",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"lnk.example"),
+            (b"user-agent", b"Mozilla/5.0"),
+            (b"accept", b"*/*"),
+        ],
+        "client": ("203.0.113.7", 51234),
+        "server": ("127.0.0.1", 8000),
+        "app": app,
+        "route": app.router.routes[-1],
+    }
+
+
+# The request body, then nothing: the client stays connected until the
+# response is sent, as a server's receive would. BaseHTTPMiddleware listens
+# for a disconnect while streaming and would spin on a receive that keeps
+# answering.
+def _receive_once() -> Callable:
+    messages = [{"type": "http.request", "body": b"", "more_body": False}]
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await asyncio.Event().wait()
+
+    return receive
+
+
+def _middleware(loop: asyncio.AbstractEventLoop, middleware_class: Optional[type], **options) -> Runner:
+    app = _endpoint if middleware_class is None else middleware_class(_endpoint, **options)
+    scope = _redirect_scope()
+
+    async def send(message):
+        pass
+
+    async def batch(loops: int) -> None:
+        for _ in range(loops):
+            await app(dict(scope), _receive_once(), send)
+
+    return lambda loops: loop.run_until_complete(batch(loops))
+
+
+def _use_redis(redis_url: Optional[str]) -> bool:
+    if redis_url:
+        import redis.asyncio
+
+        RedisSingleton._instance = redis.asyncio.Redis.from_url(redis_url, decode_responses=True)
+        RedisSingleton._binary_instance = redis.asyncio.Redis.from_url(redis_url)
+        return True
+    try:
+        import fakeredis
+    except ImportError:
+        return False
+    server = fakeredis.FakeServer()
+    RedisSingleton._instance = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    RedisSingleton._binary_instance = fakeredis.aioredis.FakeRedis(server=server)
+    return True
+
+
+def benchmarks(loop: asyncio.AbstractEventLoop, with_redis: bool) -> dict[str, Runner]:
+    token = create_access_token({"sub": "7", "email": "someone@example.com", "role": "user"})
+    normalized = normalize_url(RAW_URL)
+    short_url = _short_url()
+
+    suite = {
+        "normalize_url": _sync(lambda: normalize_url(RAW_URL)),
+        "validate_syntax": _sync(lambda: validate_syntax(normalized)),
+        "generate_short_code": _sync(generate_short_code),
+        "cache.encode[string]": _cache_encode("string"),
+        "cache.decode[string]": _cache_decode("string"),
+        "cache.encode[compact]": _cache_encode("compact"),
+        "cache.decode[compact]": _cache_decode("compact"),
+        "build_short_url_response": _sync(lambda: _build_short_url_response(short_url)),
+        "decode_token": _sync(lambda: decode_token(token)),
+        "event.serialize": _event_serialize(),
+        "middleware.none": _middleware(loop, None),
+        "middleware.error_handler": _middleware(loop, ErrorHandlerMiddleware),
+        "middleware.request_id": _middleware(loop, RequestIDMiddleware),
+        "middleware.logging": _middleware(loop, LoggingMiddleware),
+        "middleware.deadline": _middleware(loop, DeadlineMiddleware),
+        "middleware.cors": _middleware(
+            loop, CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"],
+        ),
+        "middleware.server_span": _middleware(loop, ServerSpanMiddleware),
+        "middleware.profiling": _middleware(loop, ProfilingMiddleware),
+    }
+    if with_redis:
+        suite["middleware.rate_limit"] = _middleware(loop, RateLimitMiddleware)
+    return suite
+
+
+def _time(run: Runner, loops: int) -> float:
+    gc.collect()
+    gc.disable()
+    try:
+        started = time.perf_counter_ns()
+        run(loops)
+        return time.perf_counter_ns() - started
+    finally:
+        gc.enable()
+
+
+# Doubles the loop count until one repeat takes min_time.
+def _calibrate(run: Runner, min_time: float) -> int:
+    loops = 1
+    while True:
+        if _time(run, loops) >= min_time * 1e9:
+            return loops
+        loops *= 2
+
+
+def measure(run: Runner, repeat: int, min_time: float) -> dict:
+    loops = _calibrate(run, min_time)
+    _time(run, loops)
+    per_call = [_time(run, loops) / loops for _ in range(repeat)]
+    q1, med, q3 = quantiles(per_call, n=4, method="inclusive")
+    return {
+        "loops": loops,
+        "repeat": repeat,
+        "median_ns": round(median(per_call), 1),
+        "mean_ns": round(mean(per_call), 1),
+        "stdev_ns": round(stdev(per_call), 1) if repeat > 1 else 0.0,
+        "min_ns": round(min(per_call), 1),
+        "iqr_ns": round(q3 - q1, 1),
+        "outliers": sum(1 for t in per_call if t < q1 - 1.5 * (q3 - q1) or t > q3 + 1.5 * (q3 - q1)),
+        "ops_per_second": round(1e9 / median(per_call)),
+        "unstable": (q3 - q1) > UNSTABLE_IQR * med,
+    }
+
+
+def _format_ns(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+
+def _change(before: dict, now: dict) -> str:
+    change = now["median_ns"] / before["median_ns"] - 1
+    noise = max(before["iqr_ns"] / before["median_ns"], now["iqr_ns"] / now["median_ns"])
+    marker = "~" if abs(change) <= noise else ""
+    return f"{change:+.1%}{marker}"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Time the hot functions and each middleware in isolation")
+    parser.add_argument("-k", dest="pattern", help="only benchmarks whose name matches this regex")
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--min-time", type=float, default=0.1, help="seconds per repeat")
+    parser.add_argument("--redis-url", help="a Redis for the rate limiter's round trip; fakeredis when omitted")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="results of an earlier run to print changes against")
+    args = parser.parse_args(argv)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["benchmarks"]
+
+    loop = asyncio.new_event_loop()
+    storage = settings.URL_CACHE_STORAGE
+    suite = benchmarks(loop, _use_redis(args.redis_url))
+    if args.pattern:
+        suite = {name: run for name, run in suite.items() if re.search(args.pattern, name)}
+
+    results = {}
+    header = f"{'benchmark':<28}{'median':>12}{'iqr':>12}{'ops/s':>12}"
+    print(header + ("  change" if baseline else ""))
+    try:
+        for name, run in suite.items():
+            result = measure(run, args.repeat, args.min_time)
+            results[name] = result
+            line = (
+                f"{name:<28}{_format_ns(result['median_ns']):>12}{_format_ns(result['iqr_ns']):>12}"
+                f"{result['ops_per_second']:>12}"
+            )
+            if name in baseline:
+                line += f"  {_change(baseline[name], result)}"
+            if result["unstable"]:
+                line += "  unstable"
+            print(line, flush=True)
+    finally:
+        settings.URL_CACHE_STORAGE = storage
+        loop.close()
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "implementation": platform.python_implementation(),
+                "machine": platform.machine(),
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "repeat": args.repeat,
+                "min_time": args.min_time,
+                "benchmarks": results,
+            }, f, indent=2)
+            f.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
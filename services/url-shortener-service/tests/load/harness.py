@@ -0,0 +1,332 @@
+# Load test that boots the service in-process and drives it through an ASGI
+# client, so no server, port or network is involved:
+#
+#   python -m tests.load.harness --duration 30 --concurrency 12 --out baseline.json
+#   python -m tests.load.harness --duration 30 --baseline baseline.json --max-regression 0.15
+#   python -m tests.load.harness --database-url postgresql://... --redis localhost:6379
+#
+# Without --database-url and --redis the app runs against a SQLite file and
+# fakeredis (pip install "fakeredis[lua]"). With them it uses a local Postgres
+# that alembic has migrated and a Redis at host:port; point both at throwaway
+# databases, since the run registers users and creates links.
+#
+# --mix weights the operations. Redirects pick among the links created in
+# setup with a Zipf distribution (--zipf is the exponent), creates add a link
+# as a random user, lists fetch a user's first page and logins check a
+# password with bcrypt as a real login does. Each worker sends its next
+# request as soon as the previous one returns, so the latencies are those of
+# a closed loop at the given concurrency.
+#
+# Handlers use sync sessions and hold their connection across awaits. Once
+# more requests are in flight than the database pool has connections (5 +
+# 10 overflow by default), the next checkout blocks the event loop, and the
+# requests holding connections cannot resume to return them until the pool
+# timeout. The app's loop monitor runs with block capture on, so the stack
+# of anything freezing the loop for --max-stall is logged as it happens, and
+# the run fails instead of reporting the timeouts as latencies.
+#
+# Results are written to --out (or stdout) as JSON with throughput and
+# p50/p95/p99 per route. With --baseline the run exits 1 when a route
+# regressed; baselines only mean something on the same machine and settings.
+from collections import Counter
+from itertools import accumulate
+from typing import Awaitable, Callable, Optional
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import httpx
+
+from tests.load import report
+
+
+PASSWORD = "load-test-password"
+
+# An IP literal keeps URL validation from resolving hostnames, so creates stay
+# offline. It has to be a public address; private ones are rejected.
+TARGET = "https://93.184.215.14"
+
+
+class Workload:
+    def __init__(self, zipf: float, seed: int):
+        self.zipf = zipf
+        self.seed = seed
+        self.users: list[tuple[str, str]] = []
+        self.codes: list[str] = []
+        self._cum_weights: list[float] = []
+        self._created = 0
+
+    def set_codes(self, codes: list[str]) -> None:
+        # Shuffled, so the hottest links are not simply the oldest ones.
+        self.codes = list(codes)
+        random.Random(self.seed).shuffle(self.codes)
+        self._cum_weights = list(accumulate(1 / rank ** self.zipf for rank in range(1, len(self.codes) + 1)))
+
+    def pick_code(self, rng: random.Random) -> str:
+        return rng.choices(self.codes, cum_weights=self._cum_weights)[0]
+
+    def pick_user(self, rng: random.Random) -> tuple[str, str]:
+        return rng.choice(self.users)
+
+    def next_url(self) -> str:
+        self._created += 1
+        return f"{TARGET}/load/{self.seed}/{self._created}"
+
+
+def _auth(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+async def _redirect(client: httpx.AsyncClient, workload: Workload, rng: random.Random) -> httpx.Response:
+    return await client.get(f"/{workload.pick_code(rng)}")
+
+
+async def _create(client: httpx.AsyncClient, workload: Workload, rng: random.Random) -> httpx.Response:
+    _, token = workload.pick_user(rng)
+    return await client.post("/api/v1/short-urls", json={"original_url": workload.next_url()}, headers=_auth(token))
+
+
+async def _list(client: httpx.AsyncClient, workload: Workload, rng: random.Random) -> httpx.Response:
+    _, token = workload.pick_user(rng)
+    return await client.get("/api/v1/short-urls", params={"page": 1, "page_size": 20}, headers=_auth(token))
+
+
+async def _login(client: httpx.AsyncClient, workload: Workload, rng: random.Random) -> httpx.Response:
+    email, _ = workload.pick_user(rng)
+    return await client.post("/api/v1/auth/login", json={"email": email, "password": PASSWORD})
+
+
+Operation = Callable[[httpx.AsyncClient, Workload, random.Random], Awaitable[httpx.Response]]
+
+# name -> (route template, expected statuses, operation)
+OPERATIONS: dict[str, tuple[str, tuple[int, ...], Operation]] = {
+    "redirect": ("GET /{short_code}", (301, 302), _redirect),
+    "create": ("POST /api/v1/short-urls", (201,), _create),
+    "list": ("GET /api/v1/short-urls", (200,), _list),
+    "login": ("POST /api/v1/auth/login", (200,), _login),
+}
+
+
+def _parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation {name!r}, expected one of {', '.join(OPERATIONS)}")
+        weights[name] = float(weight)
+    return weights
+
+
+class RouteStats:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.statuses: Counter[int] = Counter()
+        self.errors = 0
+
+    def record(self, seconds: float, status: Optional[int], expected: tuple[int, ...]) -> None:
+        self.latencies.append(seconds)
+        self.statuses[status or 0] += 1
+        if status not in expected:
+            self.errors += 1
+
+
+async def _setup(client: httpx.AsyncClient, workload: Workload, users: int, links: int, concurrency: int) -> None:
+    limit = asyncio.Semaphore(concurrency)
+
+    async def _user(i: int) -> tuple[str, str]:
+        email = f"load-{workload.seed}-{i}@example.com"
+        async with limit:
+            response = await client.post("/api/v1/auth/register", json={"email": email, "password": PASSWORD})
+            if response.status_code not in (201, 400):
+                raise RuntimeError(f"Registering {email} failed: {response.status_code} {response.text}")
+            response = await client.post("/api/v1/auth/login", json={"email": email, "password": PASSWORD})
+            response.raise_for_status()
+        return email, response.json()["access_token"]
+
+    workload.users = await asyncio.gather(*(_user(i) for i in range(users)))
+
+    rng = random.Random(workload.seed)
+
+    async def _link() -> str:
+        async with limit:
+            response = await _create(client, workload, rng)
+            if response.status_code != 201:
+                raise RuntimeError(f"Creating a link failed: {response.status_code} {response.text}")
+        return response.json()["short_code"]
+
+    workload.set_codes(await asyncio.gather(*(_link() for _ in range(links))))
+
+
+async def _drive(
+    client: httpx.AsyncClient,
+    workload: Workload,
+    mix: dict[str, float],
+    concurrency: int,
+    seconds: float,
+) -> dict[str, RouteStats]:
+    names = list(mix)
+    cum_weights = list(accumulate(mix[name] for name in names))
+    stats = {name: RouteStats() for name in names}
+    deadline = time.perf_counter() + seconds
+
+    async def _worker(rng: random.Random) -> None:
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, cum_weights=cum_weights)[0]
+            _, expected, operation = OPERATIONS[name]
+            started = time.perf_counter()
+            try:
+                status = (await operation(client, workload, rng)).status_code
+            except Exception:
+                status = None
+            stats[name].record(time.perf_counter() - started, status, expected)
+
+    await asyncio.gather(*(_worker(random.Random(workload.seed * 1000 + i)) for i in range(concurrency)))
+    return stats
+
+
+# app.core.settings reads the environment when it is first imported, so the
+# app is only imported after this has run.
+def _configure_environment(args: argparse.Namespace, workdir: str) -> None:
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    if args.redis:
+        host, _, port = args.redis.partition(":")
+        os.environ["REDIS_URL"] = host
+        os.environ["REDIS_PORT"] = port or "6379"
+    else:
+        os.environ.setdefault("REDIS_URL", "localhost")
+        os.environ.setdefault("REDIS_PORT", "6379")
+    os.environ.setdefault("JWT_SECRET_KEY", "load-test")
+    # Every request comes from one client address; the limiter still makes
+    # its Redis round trip but never rejects.
+    os.environ.setdefault("RATE_LIMIT_PER_MINUTE", str(10 ** 9))
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["LOOP_MONITOR_ENABLED"] = "true"
+    os.environ["LOOP_BLOCK_CAPTURE_ENABLED"] = "true"
+    os.environ["LOOP_BLOCK_THRESHOLD_MS"] = str(args.max_stall * 1000)
+
+
+def _use_stand_ins() -> None:
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit('The in-memory stand-ins need fakeredis: pip install "fakeredis[lua]"')
+
+    from app.core.redis import RedisSingleton
+    from app.db.base import Base
+    from app.db.session import engine
+    import app.models.url_models
+
+    server = fakeredis.FakeServer()
+    RedisSingleton._instance = fakeredis.aioredis.FakeRedis(server=server, decode_responses=True)
+    RedisSingleton._binary_instance = fakeredis.aioredis.FakeRedis(server=server)
+    Base.metadata.create_all(engine)
+
+
+class LoopStalled(Exception):
+    def __init__(self, status: dict):
+        super().__init__(
+            f"The event loop froze {status['stalls']} time(s) for over {status['block_threshold_ms']:.0f}ms, "
+            f"longest {status['max_lag_ms']:.0f}ms. Every request in flight waited on it; with more requests "
+            f"in flight than the database pool has connections, the pool checkout is the usual cause."
+        )
+
+
+async def run(args: argparse.Namespace) -> dict:
+    from app.core.loop_monitor import loop_monitor
+    from app.main import app
+
+    workload = Workload(zipf=args.zipf, seed=args.seed)
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with app.router.lifespan_context(app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://load-test") as client:
+                await _setup(client, workload, args.users, args.links, args.concurrency)
+                if args.warmup:
+                    await _drive(client, workload, args.mix, args.concurrency, args.warmup)
+                started = time.perf_counter()
+                stats = await _drive(client, workload, args.mix, args.concurrency, args.duration)
+                elapsed = time.perf_counter() - started
+    finally:
+        # Checked on the way out of a failed setup too, which a stall usually
+        # causes through the pool timeout.
+        if loop_monitor.stalls:
+            raise LoopStalled(loop_monitor.status())
+
+    routes = {
+        name: report.summarize_route(OPERATIONS[name][0], route.latencies, route.statuses, route.errors, elapsed)
+        for name, route in stats.items()
+    }
+    total = sum(route["requests"] for route in routes.values())
+    return {
+        "config": {
+            "backend": "postgres" if args.database_url else "stand-ins",
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "mix": args.mix,
+            "links": args.links,
+            "users": args.users,
+            "zipf": args.zipf,
+            "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "routes": routes,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a request mix against the service booted in-process")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds run before measuring")
+    parser.add_argument("--concurrency", type=int, default=12, help="requests in flight at once")
+    parser.add_argument("--mix", type=_parse_mix, default="redirect=90,create=4,list=4,login=2")
+    parser.add_argument("--links", type=int, default=2000, help="links created before the run")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--zipf", type=float, default=1.1, help="exponent of the redirect popularity")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--database-url", help="a migrated Postgres; SQLite when omitted")
+    parser.add_argument("--redis", help="host:port of a Redis; fakeredis when omitted")
+    parser.add_argument("--out", help="write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    # Logins hash on the loop, so a burst of them in setup freezes it for a
+    # second or more; a pool stall lasts the whole 30s pool timeout.
+    parser.add_argument("--max-stall", type=float, default=10.0, help="seconds the event loop may freeze")
+    args = parser.parse_args(argv)
+    if bool(args.database_url) != bool(args.redis):
+        parser.error("--database-url and --redis go together; omit both for the stand-ins")
+
+    workdir = tempfile.mkdtemp(prefix="linkpulse-load-")
+    try:
+        _configure_environment(args, workdir)
+        if not args.database_url:
+            _use_stand_ins()
+        results = asyncio.run(run(args))
+    except LoopStalled as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        return report.check(args.baseline, results, args.max_regression)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,173 @@
+# Replays traffic captured by app.core.traffic_capture against a running
+# service, keeping the original gaps between requests:
+#
+#   python -m tests.load.replay capture/requests-*.jsonl* --target http://localhost:8000 --out current.json
+#   python -m tests.load.replay capture/*.jsonl* --target http://candidate:8000 --speed 4 --baseline current.json
+#
+# Files from every worker, rotated ones included, are merged in start order.
+# --speed 4 replays four times faster. Each request is sent when it falls
+# due, whether or not earlier ones have returned, so a slow target shows up
+# as latency rather than as a slower replay. send_lag in the report says how
+# far the replayer itself fell behind the schedule; when it is large, the
+# numbers describe the replayer, not the target.
+#
+# Bodies are not captured, so only GET and HEAD are replayed unless
+# --methods says otherwise. With --forward-client each pseudonymous client
+# gets a stable 10.x.y.z address in X-Forwarded-For, which keeps per-client
+# behaviour such as rate limiting realistic when the target trusts it.
+#
+# The report has the same layout as the load harness's, so two replays of the
+# same capture compare with python -m tests.load.report as well.
+from collections import Counter
+from typing import Iterable, Optional
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+
+from tests.load import report
+from tests.load.harness import RouteStats
+
+
+# Anything short of a server error or a failed request counts as answered;
+# the target's data need not match production's.
+ANSWERED = tuple(range(100, 500))
+
+
+def load_records(paths: Iterable[str], methods: set[str], limit: Optional[int] = None) -> list[dict]:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if record.get("m") in methods:
+                    records.append(record)
+    records.sort(key=lambda record: record["ts"])
+    return records[:limit] if limit else records
+
+
+def client_address(pseudonym: str) -> str:
+    value = int(pseudonym[:6], 16)
+    return f"10.{value >> 16 & 255}.{value >> 8 & 255}.{value & 255}"
+
+
+def _request_headers(record: dict, forward_client: bool) -> dict:
+    headers = dict(record.get("h") or {})
+    if forward_client and record.get("c"):
+        headers["X-Forwarded-For"] = client_address(record["c"])
+    return headers
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    records: list[dict],
+    speed: float,
+    forward_client: bool = False,
+    max_in_flight: int = 1000,
+) -> dict:
+    stats: dict[str, RouteStats] = {}
+    mismatches: Counter[str] = Counter()
+    send_lag: list[float] = []
+    in_flight = asyncio.Semaphore(max_in_flight)
+
+    async def _send(record: dict) -> None:
+        name = f"{record['m']} {record.get('r') or record['p']}"
+        url = record["p"] + (f"?{record['q']}" if record.get("q") else "")
+        started = time.perf_counter()
+        try:
+            response = await client.request(record["m"], url, headers=_request_headers(record, forward_client))
+            status = response.status_code
+        except httpx.HTTPError:
+            status = None
+        finally:
+            in_flight.release()
+        elapsed = time.perf_counter() - started
+
+        stats.setdefault(name, RouteStats()).record(elapsed, status, ANSWERED)
+        if status != record.get("s"):
+            mismatches[name] += 1
+
+    first = records[0]["ts"] if records else 0.0
+    started = time.perf_counter()
+    tasks = []
+    for record in records:
+        due = started + (record["ts"] - first) / speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await in_flight.acquire()
+        send_lag.append(max(0.0, time.perf_counter() - due))
+        tasks.append(asyncio.create_task(_send(record)))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    routes = {
+        name: {
+            **report.summarize_route(name, route.latencies, route.statuses, route.errors, elapsed),
+            "status_mismatches": mismatches[name],
+        }
+        for name, route in sorted(stats.items())
+    }
+    total = sum(route["requests"] for route in routes.values())
+    lag = report.summarize_route("send_lag", send_lag, {}, 0, elapsed)
+    return {
+        "config": {
+            "records": len(records),
+            "speed": speed,
+            "captured_seconds": round(records[-1]["ts"] - first, 3) if records else 0.0,
+        },
+        "elapsed_seconds": round(elapsed, 3),
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "send_lag": {key: lag[key] for key in ("p50_ms", "p99_ms", "max_ms") if key in lag},
+        "routes": routes,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay captured traffic against a target with its original timing")
+    parser.add_argument("captures", nargs="+", help="capture files, rotated ones included")
+    parser.add_argument("--target", required=True, help="base URL, e.g. http://localhost:8000")
+    parser.add_argument("--speed", type=float, default=1.0, help="2 replays twice as fast")
+    parser.add_argument("--methods", default="GET,HEAD")
+    parser.add_argument("--limit", type=int, help="replay only the first N requests")
+    parser.add_argument("--forward-client", action="store_true", help="send X-Forwarded-For per captured client")
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="report of an earlier replay to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    methods = {method.strip().upper() for method in args.methods.split(",")}
+    records = load_records(args.captures, methods, args.limit)
+    if not records:
+        print("No requests to replay", file=sys.stderr)
+        return 2
+
+    async def _run() -> dict:
+        limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+        async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+            return await replay(client, records, args.speed, args.forward_client, args.max_in_flight)
+
+    results = asyncio.run(_run())
+    output = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        return report.check(args.baseline, results, args.max_regression)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
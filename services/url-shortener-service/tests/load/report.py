@@ -0,0 +1,108 @@
+# Load test results and the comparison against a stored baseline. Kept apart
+# from the harness so results can be compared without booting the app:
+#
+#   python -m tests.load.report baseline.json results.json --max-regression 0.15
+from statistics import quantiles
+from typing import Optional
+import argparse
+import json
+import sys
+
+
+def summarize_route(route: str, latencies: list[float], statuses: dict[int, int], errors: int, seconds: float) -> dict:
+    requests = len(latencies)
+    summary = {
+        "route": route,
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "throughput_rps": round(requests / seconds, 1) if seconds else 0.0,
+        "statuses": {str(code): count for code, count in sorted(statuses.items())},
+    }
+    if requests >= 2:
+        cuts = quantiles(latencies, n=100, method="inclusive")
+        summary.update({
+            "p50_ms": round(cuts[49] * 1000, 3),
+            "p95_ms": round(cuts[94] * 1000, 3),
+            "p99_ms": round(cuts[98] * 1000, 3),
+            "max_ms": round(max(latencies) * 1000, 3),
+        })
+    return summary
+
+
+# A percentile needs enough samples behind it to be compared: the p99 of 20
+# logins is just the slowest one.
+MIN_REQUESTS = {"p50_ms": 10, "p95_ms": 20, "p99_ms": 100, "throughput_rps": 100}
+
+
+def _comparable(field: str, before: dict, now: dict) -> bool:
+    return (
+        field in before
+        and field in now
+        and min(before["requests"], now["requests"]) >= MIN_REQUESTS[field]
+    )
+
+
+# Lists what got worse by more than max_regression (0.15 = 15%): the overall
+# throughput, and per route a slower p50/p95/p99, a lower throughput or an
+# error rate more than max_error_increase above the baseline's. Routes
+# missing from either side are not compared, and neither are percentiles
+# below min_latency_ms in both runs, where a 15% swing is scheduling noise.
+def compare(
+    baseline: dict,
+    current: dict,
+    max_regression: float,
+    max_error_increase: float = 0.01,
+    min_latency_ms: float = 1.0,
+) -> list[str]:
+    regressions = []
+    if current["throughput_rps"] < baseline["throughput_rps"] * (1 - max_regression):
+        regressions.append(f"overall: throughput_rps {baseline['throughput_rps']} -> {current['throughput_rps']}")
+
+    for name, now in current["routes"].items():
+        before: Optional[dict] = baseline["routes"].get(name)
+        if before is None:
+            continue
+
+        for field in ("p50_ms", "p95_ms", "p99_ms"):
+            if not _comparable(field, before, now) or max(before[field], now[field]) < min_latency_ms:
+                continue
+            if now[field] > before[field] * (1 + max_regression):
+                regressions.append(f"{name}: {field} {before[field]} -> {now[field]}")
+
+        if _comparable("throughput_rps", before, now):
+            if now["throughput_rps"] < before["throughput_rps"] * (1 - max_regression):
+                regressions.append(f"{name}: throughput_rps {before['throughput_rps']} -> {now['throughput_rps']}")
+
+        if now["error_rate"] > before["error_rate"] + max_error_increase:
+            regressions.append(f"{name}: error_rate {before['error_rate']} -> {now['error_rate']}")
+    return regressions
+
+
+def check(baseline_path: str, current: dict, max_regression: float) -> int:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    regressions = compare(baseline, current, max_regression)
+    if regressions:
+        print(f"Regressed past {max_regression:.0%} against {baseline_path}:", file=sys.stderr)
+        for line in regressions:
+            print(f"  {line}", file=sys.stderr)
+        return 1
+    print(f"No regressions past {max_regression:.0%} against {baseline_path}", file=sys.stderr)
+    return 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare load test results against a baseline")
+    parser.add_argument("baseline")
+    parser.add_argument("results")
+    parser.add_argument("--max-regression", type=float, default=0.15)
+    args = parser.parse_args(argv)
+
+    with open(args.results) as f:
+        current = json.load(f)
+    return check(args.baseline, current, args.max_regression)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+import json
+import logging
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from app.core.logging_config import JsonFormatter
+from app.core.settings import settings
+from app.middleware.logging_middleware import LoggingMiddleware
+
+
+def test_successes_are_sampled_and_errors_always_logged(caplog, monkeypatch):
+    monkeypatch.setattr(settings, "LOG_ACCESS_SAMPLE_RATE", 0.0)
+    app = FastAPI()
+    app.add_middleware(LoggingMiddleware)
+
+    @app.get("/{short_code}")
+    async def redirect(short_code: str):
+        if short_code == "broken":
+            return JSONResponse(status_code=503, content={})
+        return {"short_code": short_code}
+
+    client = TestClient(app)
+    with caplog.at_level(logging.INFO, logger="linkpulse.access"):
+        for short_code in ("abc", "def", "broken"):
+            client.get(f"/{short_code}")
+
+    [record] = [record for record in caplog.records if record.name == "linkpulse.access"]
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["status"] == 503
+    assert entry["route"] == "/{short_code}"
+    assert entry["path"] == "/broken"
+    assert entry["message"].startswith("GET /broken status=503")
+
+
+def test_server_timing_is_only_sent_when_enabled(monkeypatch):
+    app = FastAPI()
+    app.add_middleware(LoggingMiddleware)
+
+    @app.get("/health")
+    async def health():
+        return {}
+
+    client = TestClient(app)
+    assert "server-timing" not in client.get("/health").headers
+
+    monkeypatch.setattr(settings, "SERVER_TIMING_ENABLED", True)
+    timing = client.get("/health").headers["server-timing"]
+    assert timing.startswith("db;dur=")
+    assert ", total;dur=" in timing
@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.api.v1.routes.short_urls import get_short_url
+from app.core.io_accounting import io_budget
+from app.db.session import _time_queries
+from app.db.shard_admin import create_schema
+from app.db.sharding import ShardRouter
+from app.models.url_models import ArchivedShortUrl, ShortUrl
+from app.repositories.short_url_repo import ShortUrlRepository
+from app.services import archiver as archiver_module
+from app.services.archiver import ColdLinkArchiver
+
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'links.db'}")
+    create_schema(db_engine)
+    _time_queries(db_engine, "test")
+    yield db_engine
+    db_engine.dispose()
+
+
+@pytest.fixture
+def repo(db_engine):
+    with Session(db_engine) as db:
+        yield ShortUrlRepository(db, shards=ShardRouter({}))
+
+
+@pytest.fixture
+def evicted(monkeypatch):
+    evicted = []
+
+    async def _evict(short_codes):
+        evicted.extend(short_codes)
+
+    monkeypatch.setattr(archiver_module, "evict_cached_urls", _evict)
+    return evicted
+
+
+def _seed(db_engine, idle: int, recent: int = 1):
+    with Session(db_engine) as db:
+        for i in range(idle):
+            db.add(_link(f"cold{i}", last_accessed_at=NOW - timedelta(days=40 + i), created_at=NOW - timedelta(days=60 - i)))
+        for i in range(recent):
+            db.add(_link(f"warm{i}", last_accessed_at=NOW - timedelta(days=1), created_at=NOW - timedelta(days=10)))
+        db.commit()
+
+
+def _link(short_code, last_accessed_at, created_at):
+    return ShortUrl(
+        short_code=short_code,
+        original_url=f"https://example.com/{short_code}",
+        normalized_url=f"https://example.com/{short_code}",
+        user_id=7,
+        last_accessed_at=last_accessed_at,
+        created_at=created_at,
+    )
+
+
+def _archiver(db_engine, monkeypatch, **options) -> ColdLinkArchiver:
+    archiver = ColdLinkArchiver(**{"idle_days": 30, "batch_size": 2, "max_batches": 10, **options})
+    monkeypatch.setattr(archiver, "_sessions", lambda: [Session(db_engine)])
+    return archiver
+
+
+def _archived_codes(db_engine) -> set[str]:
+    with Session(db_engine) as db:
+        return set(db.execute(select(ArchivedShortUrl.short_code)).scalars())
+
+
+def test_only_links_idle_past_the_cutoff_are_archived(db_engine, monkeypatch, evicted):
+    _seed(db_engine, idle=3)
+
+    assert asyncio.run(_archiver(db_engine, monkeypatch, idle_days=45).archive_once()) == 0
+    assert asyncio.run(_archiver(db_engine, monkeypatch, idle_days=30).archive_once()) == 3
+    assert _archived_codes(db_engine) == {"cold0", "cold1", "cold2"}
+    with Session(db_engine) as db:
+        assert set(db.execute(select(ShortUrl.short_code)).scalars()) == {"warm0"}
+
+
+def test_archiving_runs_in_batches_and_resumes_next_tick(db_engine, monkeypatch, evicted):
+    _seed(db_engine, idle=5)
+    archiver = _archiver(db_engine, monkeypatch, max_batches=2)
+
+    assert asyncio.run(archiver.archive_once()) == 4
+    # Oldest access first.
+    assert _archived_codes(db_engine) == {"cold1", "cold2", "cold3", "cold4"}
+    assert asyncio.run(archiver.archive_once()) == 1
+    assert archiver.status()["archived"] == 5
+
+
+def test_archived_links_are_evicted_from_the_cache(db_engine, monkeypatch, evicted):
+    _seed(db_engine, idle=2)
+    asyncio.run(_archiver(db_engine, monkeypatch).archive_once())
+
+    assert sorted(evicted) == ["cold0", "cold1"]
+
+
+def test_codes_missing_from_the_archive_cost_one_read(db_engine, repo):
+    _seed(db_engine, idle=0)
+
+    with io_budget(db=1):
+        assert not repo.promote_from_archive("nope")
+    with io_budget(db=1):
+        assert not repo.promote_from_archive("warm0")
+
+
+def test_archived_links_are_promoted_on_access(db_engine, repo):
+    _seed(db_engine, idle=1)
+    assert repo.archive_idle(NOW - timedelta(days=30), limit=10) == ["cold0"]
+    assert repo.get_redirect_target("cold0") is None
+
+    assert repo.promote_from_archive("cold0")
+    assert repo.get_redirect_target("cold0").short_code == "cold0"
+    assert not repo.is_archived("cold0")
+
+
+def test_owners_still_list_and_read_archived_links(db_engine, repo):
+    _seed(db_engine, idle=2)
+    repo.archive_idle(NOW - timedelta(days=30), limit=10)
+
+    items, total = repo.list_by_user(7)
+    assert total == 3
+    assert [(link.short_code, link.archived) for link in items] == [
+        ("warm0", False), ("cold1", True), ("cold0", True),
+    ]
+    assert [link.short_code for link in repo.list_by_user(7, page=2, page_size=2)[0]] == ["cold0"]
+
+    # Reading the details is not a visit: the link stays archived.
+    response = asyncio.run(get_short_url("cold1", current_user=None, db=repo.db))
+    assert response.archived and response.original_url == "https://example.com/cold1"
+    assert repo.is_archived("cold1")
@@ -0,0 +1,190 @@
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.api.v1.schema_dtos import ShortURLCacheModel
+from app.core.compact_cache import pack_tombstone
+from app.core.redis import RedisSingleton
+from app.core.settings import settings
+from app.db.shard_admin import create_schema
+from app.models.url_models import ShortUrl
+from app.services import url_cache
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'links.db'}")
+    create_schema(db_engine)
+    with Session(db_engine, expire_on_commit=False) as session:
+        yield session
+
+
+def _link(short_code):
+    return ShortUrl(short_code=short_code, original_url="https://example.com", normalized_url="https://example.com")
+
+
+def test_commits_tombstone_changed_links_at_their_new_version(db, monkeypatch):
+    written = []
+
+    async def _record(versions):
+        written.append(dict(versions))
+
+    monkeypatch.setattr(url_cache, "write_tombstones", _record)
+
+    async def _scenario():
+        kept, changed, doomed = _link("kept"), _link("changed"), _link("doomed")
+        db.add_all([kept, changed, doomed])
+        db.commit()
+        assert (kept.version, changed.version, doomed.version) == (1, 1, 1)
+
+        kept.redirect_type = kept.redirect_type
+        changed.is_active = False
+        db.delete(doomed)
+        db.commit()
+        await url_cache.settle("changed")
+
+        changed.redirect_type = 301
+        db.flush()
+        db.rollback()
+        await asyncio.sleep(0)
+        return kept, changed
+
+    kept, changed = asyncio.run(_scenario())
+
+    assert written == [{"changed": 2, "doomed": 2}]
+    assert kept.version == 1
+    assert changed.version == 2
+
+
+@pytest.mark.parametrize("storage", ["string", "compact"])
+def test_cache_writes_never_go_back_in_version(storage, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    monkeypatch.setattr(settings, "URL_CACHE_STORAGE", storage)
+    monkeypatch.setattr(settings, "HOT_KEY_REPLICAS", 2)
+    r = fakeredis.FakeRedis()
+    location = url_cache._location("abc")
+
+    def _write(version):
+        model = ShortURLCacheModel(
+            short_code="abc", original_url=f"https://example.com/{version}",
+            redirect_type=302, expires_at=None, version=version,
+        )
+        return url_cache.queue_cache_write(r, model, 60)
+
+    def _cached():
+        return url_cache.decode_entry("abc", url_cache._queue_get(r, location))
+
+    assert _write(3) == 1
+    assert _write(2) == 0
+    assert _write(3) == 0
+    assert _cached().original_url == "https://example.com/3"
+
+    # A change at version 4 leaves a tombstone: a loader that read version 3
+    # is refused, the committed version 4 gets back in.
+    url_cache.queue_tombstones(r, "abc", 4)
+    assert _cached() is None
+    assert _write(3) == 0
+    assert _write(4) == 1
+    assert _cached().version == 4
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    r = fakeredis.aioredis.FakeRedis()
+    monkeypatch.setattr(RedisSingleton, "_binary_instance", r)
+    monkeypatch.setattr(settings, "HOT_KEY_REPLICAS", 2)
+    return r
+
+
+def _model(short_code, version=1):
+    return ShortURLCacheModel(
+        short_code=short_code, original_url="https://example.com", redirect_type=302, expires_at=None, version=version,
+    )
+
+
+@pytest.mark.parametrize("storage", ["string", "compact"])
+def test_tombstones_reach_copies_only_of_links_that_have_them(storage, fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "URL_CACHE_STORAGE", storage)
+
+    async def _scenario():
+        await url_cache.cache_loaded_url(_model("hot"), 60, hot=True)
+        await url_cache.write_tombstones({"hot": 2, "cold": 2})
+
+        copies = [
+            url_cache.decode_entry("hot", await url_cache._queue_get(fake_redis, location))
+            for location in url_cache._copy_locations("hot", storage == "compact")
+        ]
+        return copies, sorted(await fake_redis.keys())
+
+    copies, keys = asyncio.run(_scenario())
+    assert copies == [None, None]
+    # "cold" never had copies and gets only its own tombstone, in one layout.
+    compact = storage == "compact"
+    assert url_cache._location("cold").key.encode() in keys
+    assert not {location.key.encode() for location in url_cache._copy_locations("cold", compact)} & set(keys)
+    assert not any(key.startswith(b"url:" if compact else b"urlb:") for key in keys)
+
+
+def test_layout_migration_tombstones_both_layouts(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "URL_CACHE_LAYOUT_MIGRATION", True)
+
+    async def _scenario():
+        await url_cache.write_tombstones({"abc": 2})
+        return sorted(await fake_redis.keys())
+
+    keys = asyncio.run(_scenario())
+    assert b"url:{abc}" in keys
+    assert any(key.startswith(b"urlb:") for key in keys)
+
+
+def test_eviction_drops_the_entry_and_its_copies(fake_redis):
+    async def _scenario():
+        await url_cache.cache_loaded_url(_model("hot"), 60, hot=True)
+        await url_cache.evict_cached_urls(["hot"])
+        return await fake_redis.keys("url:{hot*")
+
+    assert asyncio.run(_scenario()) == [b"url:{hot}:copies"]
+
+
+def test_compact_writes_sweep_stale_fields_only_from_full_buckets(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    monkeypatch.setattr(settings, "URL_CACHE_STORAGE", "compact")
+    monkeypatch.setattr(settings, "URL_CACHE_BUCKETS", 1)
+    monkeypatch.setattr(settings, "URL_CACHE_BUCKET_ENTRIES", 3)
+    r = fakeredis.FakeRedis()
+    bucket = url_cache._location("any").key
+    r.hset(bucket, "stale", pack_tombstone(1, int(time.time()) - 10))
+
+    def _write(short_code):
+        return url_cache.queue_cache_write(r, _model(short_code), 60)
+
+    assert _write("one") == 1
+    assert _write("two") == 1
+    assert sorted(r.hkeys(bucket)) == [b"one", b"stale", b"two"]
+    # A fourth field would pass URL_CACHE_BUCKET_ENTRIES: stale ones go first.
+    assert _write("three") == 1
+    assert sorted(r.hkeys(bucket)) == [b"one", b"three", b"two"]
+
+
+def test_bucket_sizing_is_checked_against_redis(monkeypatch, caplog):
+    limit = {"hash-max-listpack-entries": "128"}
+
+    async def _config(command, stage="redis", binary=False):
+        return limit
+
+    monkeypatch.setattr(RedisSingleton, "execute", _config)
+    monkeypatch.setattr(settings, "URL_CACHE_EXPECTED_LINKS", 1_000_000)
+
+    asyncio.run(url_cache.check_bucket_sizing())
+    assert not caplog.records
+
+    monkeypatch.setattr(settings, "URL_CACHE_BUCKETS", 4096)
+    asyncio.run(url_cache.check_bucket_sizing())
+    assert "hash-max-listpack-entries is 128" in caplog.records[-1].message
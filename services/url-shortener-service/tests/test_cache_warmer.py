@@ -0,0 +1,107 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.redis import RedisSingleton
+from app.core.redis_keys import warmup_lock_key
+from app.services import cache_warmer as warmer_module
+from app.services.cache_warmer import CacheWarmer
+from app.services.url_cache import local_url_cache
+
+
+HOT_LINKS = [
+    SimpleNamespace(
+        short_code=f"hot{i}",
+        original_url=f"https://example.com/{i}",
+        redirect_type=302,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=1),
+        version=1,
+        click_count=100 - i,
+    )
+    for i in range(5)
+]
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(RedisSingleton, "_instance", fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(RedisSingleton, "_binary_instance", fakeredis.aioredis.FakeRedis(server=server))
+    return RedisSingleton._instance
+
+
+@pytest.fixture
+def database_passes(monkeypatch):
+    passes = []
+
+    def _load_hot_links(self):
+        passes.append(self)
+        # Long enough for the other workers to find the lock taken.
+        time.sleep(0.2)
+        return HOT_LINKS
+
+    monkeypatch.setattr(CacheWarmer, "_load_hot_links", _load_hot_links)
+    return passes
+
+
+def _warmer() -> CacheWarmer:
+    return CacheWarmer(top_n=10, recent_days=7, chunk_size=2, lock_seconds=5, result_seconds=60)
+
+
+def test_one_worker_reads_the_database_and_the_others_use_its_result(redis, database_passes):
+    workers = [_warmer() for _ in range(3)]
+
+    async def _scenario():
+        return await asyncio.gather(*(worker.warm() for worker in workers))
+
+    assert asyncio.run(_scenario()) == [5, 5, 5]
+    assert len(database_passes) == 1
+    assert all(worker.ready for worker in workers)
+    assert asyncio.run(redis.exists(warmup_lock_key())) == 0
+
+
+def test_workers_starting_later_skip_the_database_while_the_result_is_fresh(redis, database_passes):
+    asyncio.run(_warmer().warm())
+    local_url_cache.delete("hot0")
+
+    late = _warmer()
+    assert asyncio.run(late.warm()) == 5
+    assert len(database_passes) == 1
+    assert local_url_cache.get("hot0").original_url == "https://example.com/0"
+
+    # By hand, after a failover, the database pass runs regardless.
+    assert asyncio.run(_warmer().warm(force=True)) == 5
+    assert len(database_passes) == 2
+
+
+def test_failed_warm_up_still_reports_ready(redis, monkeypatch):
+    def _broken(self):
+        raise RuntimeError("database down")
+
+    monkeypatch.setattr(CacheWarmer, "_load_hot_links", _broken)
+    warmer = _warmer()
+
+    assert asyncio.run(warmer.warm()) == 0
+    assert warmer.ready
+    assert warmer.status()["duration_seconds"] is not None
+    # The lock is released, so the next worker can try again.
+    assert asyncio.run(redis.exists(warmup_lock_key())) == 0
+
+
+def test_ready_is_503_until_the_warm_up_finishes(redis, monkeypatch):
+    from app.main import app
+
+    monkeypatch.setattr(warmer_module.cache_warmer, "ready", False)
+    client = TestClient(app)
+
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "warming"
+
+    monkeypatch.setattr(warmer_module.cache_warmer, "ready", True)
+    assert client.get("/ready").status_code == 200
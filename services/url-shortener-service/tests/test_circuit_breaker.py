@@ -0,0 +1,96 @@
+import asyncio
+import types
+
+import pytest
+from redis.exceptions import ConnectionError as RedisConnectionError
+
+from app.core import circuit_breaker, deadline
+from app.core.circuit_breaker import CircuitBreaker
+from app.core.redis import RedisSingleton, RedisUnavailableError
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(circuit_breaker, "time", types.SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_breaker_opens_half_opens_and_closes(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=10.0, half_open_max_calls=1)
+
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+
+    clock[0] += 10.0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.snapshot()["consecutive_failures"] == 0
+
+
+def test_failed_probe_reopens_and_a_lost_probe_does_not_wedge(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=10.0)
+    breaker.record_failure()
+
+    clock[0] += 10.0
+    assert breaker.allow_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.snapshot()["retry_in_seconds"] == 10.0
+
+    # The next probe never reports back; the following window hands out another.
+    clock[0] += 10.0
+    assert breaker.allow_request()
+    clock[0] += 10.0
+    assert breaker.allow_request()
+
+
+@pytest.fixture
+def redis_breaker(monkeypatch):
+    breaker = CircuitBreaker("redis", failure_threshold=2, recovery_timeout=60.0)
+    monkeypatch.setattr(RedisSingleton, "breaker", breaker)
+    monkeypatch.setattr(RedisSingleton, "_instance", object())
+    return breaker
+
+
+def test_deadline_bounded_timeout_does_not_trip_the_breaker(redis_breaker):
+    async def _slow(client):
+        await asyncio.sleep(1)
+
+    async def _scenario():
+        token = deadline.start(0.01)
+        try:
+            with pytest.raises(deadline.DeadlineExceeded):
+                await RedisSingleton.execute(_slow, stage="cache")
+        finally:
+            deadline.reset(token)
+
+    asyncio.run(_scenario())
+    assert redis_breaker.snapshot()["consecutive_failures"] == 0
+    assert deadline.exhaustion_counts().get("cache", 0) >= 1
+
+
+@pytest.mark.parametrize("error", [RedisConnectionError("refused"), OSError("unreachable")])
+def test_client_errors_become_unavailable_and_count_as_failures(redis_breaker, error):
+    async def _broken(client):
+        raise error
+
+    async def _scenario():
+        for _ in range(2):
+            with pytest.raises(RedisUnavailableError):
+                await RedisSingleton.execute(_broken)
+        # Open now: the command is not even attempted.
+        with pytest.raises(RedisUnavailableError, match="circuit breaker is open"):
+            await RedisSingleton.execute(_broken)
+
+    asyncio.run(_scenario())
+    assert redis_breaker.state == CircuitBreaker.OPEN
+    assert not RedisSingleton.is_available()
@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.compact_cache import bucket_count, bucket_for, pack_link, pack_tombstone, unpack
+
+
+EXPIRES = datetime(2030, 1, 1, 12, 30, 15, 250000, tzinfo=timezone.utc)
+LONG_URL = "https://www.example.com/products/search?q=shoes&utm_source=newsletter&utm_medium=email&utm_campaign=spring"
+
+
+@pytest.mark.parametrize("compress_min_length", [0, 32])
+def test_packed_link_round_trip(compress_min_length):
+    raw = pack_link(7, 1_900_000_000, 301, EXPIRES, LONG_URL, compress_min_length)
+    packed = unpack(raw)
+
+    assert packed.version == 7
+    assert packed.cached_until == 1_900_000_000
+    assert packed.redirect_type == 301
+    assert packed.expires_at == EXPIRES
+    assert packed.original_url == LONG_URL
+    assert not packed.tombstone
+    if compress_min_length:
+        assert len(raw) < len(pack_link(7, 1_900_000_000, 301, EXPIRES, LONG_URL))
+
+
+def test_tombstones_and_foreign_values():
+    assert unpack(pack_tombstone(3, 1_900_000_000)).tombstone
+    assert unpack(b'{"short_code":"abc"}') is None
+    assert unpack(b"") is None
+
+
+def test_buckets_are_stable():
+    assert bucket_for("abc", 1024) == bucket_for("abc", 1024)
+    assert len({bucket_for(f"code{i}", 1024) for i in range(5000)}) > 1000
+
+
+def test_bucket_count_keeps_buckets_at_the_target_size():
+    assert bucket_count(10_000_000, 64) == 156_250
+    assert bucket_count(100, 64) == 2
+    assert bucket_count(0, 64) == 1
@@ -0,0 +1,91 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import ipaddress
+
+from app.core import deadline
+from app.core.settings import settings
+from app.middleware import deadline_middleware
+from app.middleware.deadline_middleware import DEADLINE_HEADER, DeadlineMiddleware
+from app.middleware.error_handler import ErrorHandlerMiddleware
+
+
+def test_ensure_raises_once_the_budget_is_spent():
+    assert deadline.remaining() is None
+    assert deadline.ensure("db") is None
+
+    token = deadline.start(0.02)
+    try:
+        assert 0 < deadline.ensure("db") <= 0.02
+        time.sleep(0.03)
+        assert deadline.remaining() < 0
+        before = deadline.exhaustion_counts().get("db", 0)
+        with pytest.raises(deadline.DeadlineExceeded) as e:
+            deadline.ensure("db")
+        assert e.value.stage == "db"
+        assert deadline.exhaustion_counts()["db"] == before + 1
+    finally:
+        deadline.reset(token)
+    assert deadline.remaining() is None
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(DeadlineMiddleware)
+    app.add_middleware(ErrorHandlerMiddleware)
+
+    @app.get("/health")
+    async def health():
+        return {"budget_ms": round(deadline.remaining() * 1000)}
+
+    @app.get("/slow")
+    async def slow():
+        deadline.start(0)
+        deadline.ensure("db")
+
+    @app.get("/{short_code}")
+    async def redirect(short_code: str):
+        return {"budget_ms": round(deadline.remaining() * 1000)}
+
+    return app
+
+
+# The budget left when the endpoint runs, rounded up past whatever the
+# request spent getting there.
+def _budget(client: TestClient, path: str, **headers) -> int:
+    left = client.get(path, headers=headers).json()["budget_ms"]
+    return -(-left // 100) * 100
+
+
+def test_routes_get_their_configured_budget():
+    client = TestClient(_app())
+    assert _budget(client, "/aZ3kP9q") == settings.ROUTE_DEADLINES_MS["/{short_code}"]
+    assert _budget(client, "/health") == settings.REQUEST_DEADLINE_MS
+
+
+def test_deadline_header_is_ignored_unless_networks_are_trusted():
+    client = TestClient(_app(), client=("127.0.0.1", 50000))
+    assert _budget(client, "/health", **{DEADLINE_HEADER: "100"}) == settings.REQUEST_DEADLINE_MS
+
+
+def test_deadline_header_is_only_honoured_from_trusted_networks(monkeypatch):
+    monkeypatch.setattr(deadline_middleware, "_trusted_networks", [ipaddress.ip_network("10.0.0.0/8")])
+    untrusted = TestClient(_app(), client=("203.0.113.7", 50000))
+    assert _budget(untrusted, "/health", **{DEADLINE_HEADER: "100"}) == settings.REQUEST_DEADLINE_MS
+
+    trusted = TestClient(_app(), client=("10.1.2.3", 50000))
+    assert _budget(trusted, "/health", **{DEADLINE_HEADER: "100"}) == 100
+    assert _budget(trusted, "/health", **{DEADLINE_HEADER: "999999"}) == settings.REQUEST_DEADLINE_MAX_MS
+    left = trusted.get("/health", headers={DEADLINE_HEADER: "1"}).json()["budget_ms"]
+    assert settings.REQUEST_DEADLINE_MIN_MS // 2 < left <= settings.REQUEST_DEADLINE_MIN_MS
+    for ignored in ("soon", "0", "-5"):
+        assert _budget(trusted, "/health", **{DEADLINE_HEADER: ignored}) == settings.REQUEST_DEADLINE_MS
+
+
+def test_exceeded_deadline_is_a_504_naming_the_stage():
+    response = TestClient(_app()).get("/slow")
+    assert response.status_code == 504
+    assert response.json()["stage"] == "db"
@@ -0,0 +1,81 @@
+import asyncio
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.redis import RedisSingleton
+from app.db.shard_admin import create_schema
+from app.db.sharding import ShardRouter
+from app.events import publisher as publisher_module
+from app.events.constants import EVENT_URL_DELETED, EVENT_URL_DISABLED, EVENT_URL_ENABLED, STREAM_NAME
+from app.events.publisher import EventPublisher
+from app.events.schemas import UrlDeletedEvent
+from app.models.url_models import ShortUrl
+from app.repositories.short_url_repo import ShortUrlRepository
+from app.services import short_url_service as service_module
+from app.services.short_url_service import ShortUrlService
+
+
+def _event(short_code):
+    return UrlDeletedEvent(short_code=short_code, user_id=None, timestamp="2030-01-01T00:00:00Z")
+
+
+def test_spooled_events_reach_the_stream_before_newer_ones(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    r = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(RedisSingleton, "_instance", r)
+    available = {"redis": False}
+    monkeypatch.setattr(RedisSingleton, "is_available", lambda: available["redis"])
+    monkeypatch.setattr(publisher_module.settings, "EVENT_PUBLISH_DEGRADED_MODE", "spool")
+    publisher = EventPublisher()
+
+    async def _scenario():
+        await publisher.publish(EVENT_URL_DELETED, _event("first"))
+        await publisher.publish(EVENT_URL_DELETED, _event("second"))
+        assert publisher.spooled == 2
+
+        available["redis"] = True
+        await publisher.publish(EVENT_URL_DELETED, _event("third"))
+        await publisher._flush_task
+        await publisher.publish(EVENT_URL_DELETED, _event("fourth"))
+        return await r.xrange(STREAM_NAME)
+
+    entries = asyncio.run(_scenario())
+    assert [json.loads(fields["payload"])["short_code"] for _, fields in entries] == [
+        "first", "second", "third", "fourth",
+    ]
+    assert publisher.spooled == 0
+
+
+def test_changes_to_anonymous_links_are_published(tmp_path, monkeypatch):
+    published = []
+
+    async def _publish(event_type, event):
+        published.append((event_type, event.short_code, event.user_id))
+
+    async def _settle(short_code):
+        pass
+
+    monkeypatch.setattr(service_module.event_publisher, "publish", _publish)
+    monkeypatch.setattr(service_module.url_cache, "settle", _settle)
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'links.db'}")
+    create_schema(db_engine)
+
+    with Session(db_engine) as db:
+        service = ShortUrlService(ShortUrlRepository(db, shards=ShardRouter({})), RedisSingleton)
+        link = ShortUrl(short_code="anon", original_url="https://example.com", normalized_url="https://example.com")
+        db.add(link)
+        db.commit()
+
+        asyncio.run(service.disable_short_url(link))
+        asyncio.run(service.enable_short_url(link))
+        asyncio.run(service.delete_short_url(link))
+
+    assert published == [
+        (EVENT_URL_DISABLED, "anon", None),
+        (EVENT_URL_ENABLED, "anon", None),
+        (EVENT_URL_DELETED, "anon", None),
+    ]
+    db_engine.dispose()
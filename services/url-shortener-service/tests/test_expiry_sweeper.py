@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.db.shard_admin import create_schema
+from app.core.redis import RedisSingleton
+from app.core.settings import settings
+from app.db.sharding import ShardRouter
+from app.events.constants import EVENT_URL_EXPIRED
+from app.models.url_models import ShortUrl
+from app.repositories.short_url_repo import ShortUrlRepository
+from app.services import expiry_sweeper as sweeper_module
+from app.services import url_cache
+from app.services.expiry_sweeper import ExpirySweeper
+from app.services.short_url_service import ShortUrlService
+
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'links.db'}")
+    create_schema(db_engine)
+    yield db_engine
+    db_engine.dispose()
+
+
+@pytest.fixture
+def emitted(monkeypatch):
+    emitted = {"tombstones": {}, "events": []}
+
+    async def _tombstones(versions):
+        emitted["tombstones"].update(versions)
+
+    async def _publish(event_type, event):
+        emitted["events"].append((event_type, event))
+
+    monkeypatch.setattr(sweeper_module, "write_tombstones", _tombstones)
+    monkeypatch.setattr(sweeper_module.event_publisher, "publish", _publish)
+    return emitted
+
+
+def _sweeper(db_engine, monkeypatch, **options) -> ExpirySweeper:
+    sweeper = ExpirySweeper(**{"batch_size": 2, "max_batches": 10, "purge_after_days": 0, **options})
+    monkeypatch.setattr(sweeper, "_sessions", lambda: [Session(db_engine)])
+    return sweeper
+
+
+def _seed(db_engine, expired: int, live: int = 1, expired_at: datetime = NOW - timedelta(minutes=1)):
+    with Session(db_engine) as db:
+        for i in range(expired):
+            db.add(_link(f"gone{i}", expired_at, user_id=i % 2 or None))
+        for i in range(live):
+            db.add(_link(f"live{i}", NOW + timedelta(days=1), user_id=1))
+        db.commit()
+
+
+def _link(short_code, expires_at, user_id):
+    return ShortUrl(
+        short_code=short_code,
+        original_url="https://example.com",
+        normalized_url="https://example.com",
+        expires_at=expires_at,
+        user_id=user_id,
+    )
+
+
+def _active(db_engine) -> dict[str, tuple[bool, int]]:
+    with Session(db_engine) as db:
+        rows = db.execute(select(ShortUrl.short_code, ShortUrl.is_active, ShortUrl.version)).all()
+    return {row.short_code: (row.is_active, row.version) for row in rows}
+
+
+def test_sweep_deactivates_in_batches_and_bumps_versions(db_engine, monkeypatch, emitted):
+    _seed(db_engine, expired=5)
+    sweeper = _sweeper(db_engine, monkeypatch)
+
+    asyncio.run(sweeper.sweep_once())
+
+    links = _active(db_engine)
+    assert {code: links[code] for code in links if code.startswith("gone")} == {
+        f"gone{i}": (False, 2) for i in range(5)
+    }
+    assert links["live0"] == (True, 1)
+    assert sweeper.status()["deactivated"] == 5
+
+
+def test_sweep_stops_after_max_batches_and_resumes_next_tick(db_engine, monkeypatch, emitted):
+    _seed(db_engine, expired=5)
+    sweeper = _sweeper(db_engine, monkeypatch, max_batches=2)
+
+    asyncio.run(sweeper.sweep_once())
+    assert sweeper.deactivated == 4
+    asyncio.run(sweeper.sweep_once())
+    assert sweeper.deactivated == 5
+
+
+def test_sweep_tombstones_at_the_new_version_and_publishes_expiries(db_engine, monkeypatch, emitted):
+    _seed(db_engine, expired=3)
+    asyncio.run(_sweeper(db_engine, monkeypatch).sweep_once())
+
+    assert emitted["tombstones"] == {"gone0": 2, "gone1": 2, "gone2": 2}
+    assert sorted((event_type, event.short_code, event.user_id) for event_type, event in emitted["events"]) == [
+        (EVENT_URL_EXPIRED, "gone0", None),
+        (EVENT_URL_EXPIRED, "gone1", 1),
+        (EVENT_URL_EXPIRED, "gone2", None),
+    ]
+
+
+def test_swept_links_still_read_as_expired_and_are_cached_briefly(db_engine, monkeypatch, emitted):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    monkeypatch.setattr(RedisSingleton, "_binary_instance", fakeredis.aioredis.FakeRedis())
+    _seed(db_engine, expired=1, live=0)
+    asyncio.run(_sweeper(db_engine, monkeypatch).sweep_once())
+
+    with Session(db_engine) as db:
+        service = ShortUrlService(ShortUrlRepository(db, shards=ShardRouter({})), RedisSingleton)
+        link = asyncio.run(service.get_short_url_by_code("gone0"))
+        # The redirect answers 410 for it, not 404.
+        assert link is not None and link.is_expired()
+
+        cached = asyncio.run(url_cache.read_cached("gone0", hot=False))
+        assert cached.version == 2
+        ttl = asyncio.run(RedisSingleton._binary_instance.ttl(url_cache._location("gone0").key))
+        assert 0 < ttl <= settings.EXPIRED_CACHE_TTL_SECONDS
+
+
+def test_sweep_purges_links_expired_long_enough_ago(db_engine, monkeypatch, emitted):
+    _seed(db_engine, expired=3, expired_at=NOW - timedelta(days=2))
+    sweeper = _sweeper(db_engine, monkeypatch, purge_after_days=1)
+
+    asyncio.run(sweeper.sweep_once())
+
+    assert set(_active(db_engine)) == {"live0"}
+    assert sweeper.status()["purged"] == 3
@@ -0,0 +1,50 @@
+from redis.crc import key_slot
+
+from app.core import hot_keys as hot_keys_module
+from app.core.hot_keys import HotKeyTracker
+from app.core.redis_keys import url_cache_key, url_cache_replica_key
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hot_key_is_promoted_and_cools_down(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(hot_keys_module.time, "monotonic", clock)
+    tracker = HotKeyTracker(sample_rate=1.0, threshold_rps=100.0, decay_seconds=10.0, max_tracked=100)
+
+    # 1000 reads/s for two seconds: past the threshold, while a code read
+    # now and then never gets there.
+    for i in range(2000):
+        clock.now += 0.001
+        hot = tracker.record("viral")
+        if i % 100 == 0:
+            tracker.record("quiet")
+    assert hot
+    assert not tracker.is_hot("quiet")
+    assert list(tracker.status()["hot"]) == ["viral"]
+
+    # Half the threshold keeps it hot; after that it decays out.
+    clock.now += 5
+    assert tracker.is_hot("viral")
+    clock.now += 30
+    assert not tracker.is_hot("viral")
+    assert tracker.status()["promotions"] == 1
+
+
+def test_tracking_is_bounded():
+    tracker = HotKeyTracker(sample_rate=1.0, threshold_rps=1e9, decay_seconds=10.0, max_tracked=50)
+    for i in range(500):
+        tracker.record(f"code{i}")
+    assert tracker.status()["tracked"] <= 50
+
+
+def test_hot_key_copies_land_on_other_slots():
+    slots = {key_slot(url_cache_replica_key("viral", replica).encode()) for replica in range(8)}
+    slots.add(key_slot(url_cache_key("viral").encode()))
+    assert len(slots) == 9
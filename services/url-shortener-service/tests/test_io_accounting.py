@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core.io_accounting import IOBudgetExceeded, io_budget
+from app.db.session import _time_queries
+from app.db.shard_admin import create_schema
+from app.db.sharding import ShardRouter
+from app.models.url_models import ShortUrl
+from app.repositories.short_url_repo import ShortUrlRepository
+
+
+@pytest.fixture
+def repo(tmp_path):
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'links.db'}")
+    create_schema(db_engine)
+    _time_queries(db_engine, "test")
+    with Session(db_engine) as db:
+        repo = ShortUrlRepository(db, shards=ShardRouter({}))
+        for short_code in ("abc", "def", "ghi"):
+            repo.create(ShortUrl(short_code=short_code, original_url="https://example.com", normalized_url="https://example.com"))
+        yield repo
+
+
+def test_click_counting_is_a_single_statement(repo):
+    with io_budget(db=1, redis=0) as io:
+        repo.increment_clicks("abc")
+    assert io.db_statements == 1
+
+
+def test_budget_catches_one_query_per_code(repo):
+    with pytest.raises(IOBudgetExceeded, match="3 SQL statements"):
+        with io_budget(db=1):
+            for short_code in ("abc", "def", "ghi"):
+                repo.get_redirect_target(short_code)
+
+    with io_budget(db=1):
+        assert len(repo.get_redirect_targets(["abc", "def", "ghi"])) == 3
+
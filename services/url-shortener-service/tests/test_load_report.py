@@ -0,0 +1,33 @@
+from tests.load.report import compare, summarize_route
+
+
+def _run(latency_ms, requests=1000, errors=0):
+    latencies = [latency_ms / 1000] * requests
+    route = summarize_route("GET /{short_code}", latencies, {302: requests - errors, 500: errors}, errors, seconds=10)
+    return {"throughput_rps": route["throughput_rps"], "routes": {"redirect": route}}
+
+
+def test_summary_has_percentiles_per_route():
+    route = summarize_route("GET /{short_code}", [i / 1000 for i in range(1, 101)], {302: 100}, 0, seconds=2)
+    assert route["requests"] == 100
+    assert route["throughput_rps"] == 50.0
+    assert (route["p50_ms"], route["p99_ms"], route["max_ms"]) == (50.5, 99.01, 100.0)
+
+
+def test_regressions_past_the_threshold_are_reported():
+    baseline = _run(10)
+    assert compare(baseline, _run(11), max_regression=0.15) == []
+    assert compare(baseline, _run(12), max_regression=0.15) == [
+        "redirect: p50_ms 10.0 -> 12.0",
+        "redirect: p95_ms 10.0 -> 12.0",
+        "redirect: p99_ms 10.0 -> 12.0",
+    ]
+    assert compare(baseline, _run(10, errors=50), max_regression=0.15) == ["redirect: error_rate 0.0 -> 0.05"]
+
+
+def test_fewer_requests_and_sub_millisecond_noise_are_not_compared():
+    assert compare(_run(10, requests=50), _run(20, requests=50), max_regression=0.15) == [
+        "redirect: p50_ms 10.0 -> 20.0",
+        "redirect: p95_ms 10.0 -> 20.0",
+    ]
+    assert compare(_run(0.3), _run(0.5), max_regression=0.15) == []
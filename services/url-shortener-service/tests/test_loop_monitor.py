@@ -0,0 +1,32 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from app.core.loop_monitor import LoopMonitor
+
+
+def blocking_handler():
+    time.sleep(0.2)
+
+
+async def endpoint(scope):
+    blocking_handler()
+
+
+def test_blocked_loop_is_measured_and_caught_in_the_act():
+    monitor = LoopMonitor(block_threshold=0.05, capture_blocks=True)
+
+    async def _scenario():
+        task = asyncio.create_task(monitor.run(0.01))
+        await asyncio.sleep(0.05)
+        await endpoint({"type": "http", "route": SimpleNamespace(path="/{short_code}")})
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    asyncio.run(_scenario())
+
+    assert monitor.max_lag >= 0.15
+    assert monitor.stalls == 1
+    [block] = monitor.blocks
+    assert block["route"] == "/{short_code}"
+    assert "in blocking_handler" in block["stack"][-1]
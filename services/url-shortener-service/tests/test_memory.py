@@ -0,0 +1,177 @@
+from datetime import datetime, timezone
+import asyncio
+import gc
+import os
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
+
+from app.api.redirect import redirect_to_original
+from app.core import memory, metrics
+from app.core.redis import RedisSingleton
+from app.db.routing import RoutingSession
+from app.db.shard_admin import create_schema
+from app.events.constants import STREAM_NAME
+from app.events.publisher import EventPublisher
+from app.events.schemas import UrlAccessedEvent
+from app.models.url_models import ShortUrl
+
+
+def _gauge(name):
+    return metrics.REGISTRY.get_sample_value(name) or 0
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(RedisSingleton, "_instance", fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(RedisSingleton, "_binary_instance", fakeredis.aioredis.FakeRedis(server=server))
+    return RedisSingleton._instance
+
+
+def test_background_publishes_are_counted_until_they_finish(fake_redis):
+    publisher = EventPublisher()
+    event = UrlAccessedEvent(
+        short_code="abc",
+        ip_address=None,
+        user_agent=None,
+        referrer=None,
+        timestamp=datetime.now(timezone.utc),
+    )
+    before = _gauge("event_publish_pending_tasks")
+
+    async def _scenario():
+        for _ in range(3):
+            publisher.publish_in_background("url.accessed", event)
+        assert publisher.pending == 3
+        assert _gauge("event_publish_pending_tasks") == before + 3
+        await asyncio.sleep(0.05)
+
+    asyncio.run(_scenario())
+
+    assert publisher.pending == 0
+    assert _gauge("event_publish_pending_tasks") == before
+    assert asyncio.run(fake_redis.xlen(STREAM_NAME)) == 3
+
+
+def test_sessions_are_counted_until_collected():
+    SessionLocal = sessionmaker(bind=create_engine("sqlite://"), class_=RoutingSession)
+    before = _gauge("db_sessions_live")
+
+    sessions = [SessionLocal() for _ in range(3)]
+    assert _gauge("db_sessions_live") == before + 3
+    assert memory.orm_counters()["sessions"] >= 3
+
+    # Closed but still referenced is still live.
+    for db in sessions:
+        db.close()
+    assert _gauge("db_sessions_live") == before + 3
+
+    del sessions, db
+    gc.collect()
+    assert _gauge("db_sessions_live") == before
+
+
+def test_orm_counters_walk_the_heap_off_the_event_loop(monkeypatch):
+    from app.api.v1.routes import admin
+
+    threads = []
+
+    def _orm_counters():
+        threads.append(threading.get_ident())
+        return {"sessions": 0}
+
+    monkeypatch.setattr(memory, "orm_counters", _orm_counters)
+    result = asyncio.run(admin.memory_counters(orm=True, current_user=None))
+
+    assert result["orm"] == {"sessions": 0}
+    assert threads and threads[0] != threading.get_ident()
+
+
+def test_tracemalloc_reports_growth_since_baseline():
+    tracker = memory.AllocationTracker()
+    assert tracker.report() is None
+
+    tracker.start()
+    try:
+        retained = [bytearray(1024) for _ in range(1000)]
+        report = tracker.report(limit=5)
+    finally:
+        tracker.stop()
+
+    [site] = [site for site in report["growth"] if site["file"] == __file__]
+    assert site["size_diff_bytes"] >= 1024 * 1000
+    assert site["count_diff"] >= 1000
+    assert len(retained) == 1000
+
+
+# Soak mode: SOAK_REDIRECTS=2000000 pytest tests/test_memory.py -k soak
+#
+# Runs the redirect handler against SQLite and fakeredis with a fresh session
+# per request, as get_db does. After a warm-up that fills the caches, the
+# number of objects the garbage collector tracks and the resident size must
+# stay flat; SOAK_MAX_GROWTH_MB sets the tolerance for the latter, which
+# also absorbs allocator noise.
+@pytest.mark.skipif(not os.environ.get("SOAK_REDIRECTS"), reason="set SOAK_REDIRECTS to run the soak test")
+def test_soak_redirects_keep_memory_flat(fake_redis):
+    redirects = int(os.environ["SOAK_REDIRECTS"])
+    max_growth = float(os.environ.get("SOAK_MAX_GROWTH_MB", "20")) * 1024 * 1024
+    warmup = min(redirects // 10, 20000)
+    codes = [f"soak{i}" for i in range(200)]
+
+    # In memory, so the run measures the service rather than fsync.
+    db_engine = create_engine("sqlite://", poolclass=StaticPool)
+    create_schema(db_engine)
+    SessionLocal = sessionmaker(
+        bind=db_engine,
+        autoflush=False,
+        autocommit=False,
+        expire_on_commit=False,
+        class_=RoutingSession,
+    )
+    with SessionLocal() as db:
+        db.add_all(ShortUrl(short_code=code, original_url=f"https://example.com/{code}", normalized_url=f"https://example.com/{code}") for code in codes)
+        db.commit()
+
+    request = Request({
+        "type": "http",
+        "method": "GET",
+        "path": "/",
+        "headers": [(b"user-agent", b"soak"), (b"referer", b"https://example.com")],
+        "client": ("127.0.0.1", 40000),
+    })
+
+    async def _redirect(short_code):
+        db = SessionLocal()
+        try:
+            response = await redirect_to_original(short_code, request, db)
+        finally:
+            db.close()
+        assert response.status_code == 302
+
+    # The stream lives in fakeredis, in this process; it is emptied before
+    # each measurement and trimmed along the way.
+    async def _measure():
+        await fake_redis.xtrim(STREAM_NAME, maxlen=0)
+        gc.collect()
+        return len(gc.get_objects()), memory.rss_bytes() or 0
+
+    async def _soak():
+        baseline = None
+        for i in range(redirects):
+            await _redirect(codes[i % len(codes)])
+            if i % 1000 == 999:
+                await fake_redis.xtrim(STREAM_NAME, maxlen=0)
+            if i == warmup:
+                baseline = await _measure()
+        return baseline, await _measure()
+
+    (objects_before, rss_before), (objects_after, rss_after) = asyncio.run(_soak())
+
+    assert objects_after - objects_before < 1000, f"{objects_after - objects_before} more live objects"
+    assert rss_after - rss_before < max_growth, f"resident size grew by {(rss_after - rss_before) / 1e6:.1f}MB"
\ No newline at end of file
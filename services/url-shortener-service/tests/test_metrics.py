@@ -0,0 +1,35 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import metrics
+from app.middleware.logging_middleware import LoggingMiddleware
+
+
+def _count(route, status):
+    return metrics.REGISTRY.get_sample_value(
+        "http_request_duration_seconds_count",
+        {"method": "GET", "route": route, "status": str(status)},
+    ) or 0
+
+
+def test_requests_are_labelled_by_route_template():
+    app = FastAPI()
+    app.add_middleware(LoggingMiddleware)
+
+    @app.get("/{short_code}")
+    async def redirect(short_code: str):
+        return {"short_code": short_code}
+
+    before = _count("/{short_code}", 200)
+    client = TestClient(app)
+    for short_code in ("abc", "def", "ghi"):
+        assert client.get(f"/{short_code}").status_code == 200
+    assert client.get("/a/b").status_code == 404
+
+    assert _count("/{short_code}", 200) == before + 3
+    assert _count("/abc", 200) == 0
+    assert _count("unmatched", 404) >= 1
+
+    body, content_type = metrics.render()
+    assert content_type.startswith("text/plain")
+    assert b'route="/{short_code}"' in body
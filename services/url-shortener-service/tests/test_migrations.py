@@ -0,0 +1,79 @@
+import io
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+
+
+# Renders a revision range as the SQL alembic would run on Postgres, without
+# a database. No ini file, so env.py leaves the test run's logging alone.
+def _sql(revisions: str, downgrade: bool = False) -> str:
+    output = io.StringIO()
+    config = Config(output_buffer=output)
+    config.set_main_option("script_location", str(SERVICE_ROOT / "alembic"))
+    config.set_main_option("sqlalchemy.url", "postgresql://")
+    (command.downgrade if downgrade else command.upgrade)(config, revisions, sql=True)
+    return output.getvalue()
+
+
+def test_catch_up_builds_the_redirect_index_outside_the_transaction():
+    sql = _sql("2c3f6d51c164:7b1e4d9a3f20")
+
+    for column in ("click_count INTEGER", "is_active BOOLEAN", "user_id INTEGER", "updated_at TIMESTAMP WITH TIME ZONE"):
+        assert f"ALTER TABLE short_urls ADD COLUMN {column}" in sql
+    assert "CHECK (redirect_type IN (301, 302, 303))" in sql
+
+    index = (
+        "CREATE INDEX CONCURRENTLY ix_short_urls_redirect_lookup ON short_urls (short_code) "
+        "INCLUDE (original_url, redirect_type, expires_at) WHERE is_active;"
+    )
+    before, after = sql.split(index)
+    # CONCURRENTLY cannot run in a transaction block.
+    assert before.rstrip().endswith("COMMIT;")
+    assert after.lstrip().startswith("BEGIN;")
+
+
+def test_catch_up_downgrades_back_to_the_initial_schema():
+    sql = _sql("7b1e4d9a3f20:2c3f6d51c164", downgrade=True)
+
+    assert "DROP INDEX CONCURRENTLY ix_short_urls_redirect_lookup" in sql
+    assert "ALTER TABLE short_urls ADD CONSTRAINT short_urls_short_code_key UNIQUE (short_code)" in sql
+    assert "ALTER TABLE users DROP COLUMN role" in sql
+
+
+def test_expires_at_index_is_built_outside_the_transaction():
+    sql = _sql("7b1e4d9a3f20:4d8a2c6e9b15")
+
+    before, after = sql.split(
+        "CREATE INDEX CONCURRENTLY ix_short_urls_expires_at ON short_urls (expires_at) WHERE expires_at IS NOT NULL;"
+    )
+    assert before.rstrip().endswith("COMMIT;")
+    assert after.lstrip().startswith("BEGIN;")
+
+
+def test_archive_migration_keeps_an_unfinished_partition_migration_in_step():
+    sql = _sql("4d8a2c6e9b15:9c3e7f1a2b48")
+
+    assert "ALTER TABLE short_urls ADD COLUMN last_accessed_at TIMESTAMP WITH TIME ZONE DEFAULT now() NOT NULL" in sql
+    assert "ALTER TABLE short_urls_new ADD COLUMN IF NOT EXISTS last_accessed_at" in sql
+    assert "CREATE INDEX CONCURRENTLY ix_short_urls_last_accessed_at ON short_urls (last_accessed_at);" in sql
+
+    sql = _sql("9c3e7f1a2b48:4d8a2c6e9b15", downgrade=True)
+    assert "ALTER TABLE short_urls_new DROP COLUMN IF EXISTS last_accessed_at" in sql
+
+
+def test_version_migration_swaps_the_redirect_index_concurrently():
+    sql = _sql("9c3e7f1a2b48:e2b7c4f19a63")
+
+    assert (
+        "CREATE INDEX CONCURRENTLY ix_short_urls_redirect_lookup_v2 ON short_urls (short_code) "
+        "INCLUDE (original_url, redirect_type, expires_at, version) WHERE is_active;"
+    ) in sql
+    assert "DROP INDEX CONCURRENTLY ix_short_urls_redirect_lookup;" in sql
+    assert "ALTER INDEX ix_short_urls_redirect_lookup_v2 RENAME TO ix_short_urls_redirect_lookup" in sql
+
+    sql = _sql("e2b7c4f19a63:9c3e7f1a2b48", downgrade=True)
+    assert "ALTER INDEX ix_short_urls_redirect_lookup_v1 RENAME TO ix_short_urls_redirect_lookup" in sql
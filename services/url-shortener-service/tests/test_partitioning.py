@@ -0,0 +1,116 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from sqlalchemy.dialects import postgresql
+
+from app.db import partition_migration
+from app.db.partitioning import hash_partition_ddl, partition_name, partitioned_index_ddl
+
+
+SERVICE_ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_one_partition_per_remainder():
+    assert partition_name("short_urls", 7) == "short_urls_p007"
+    assert hash_partition_ddl("short_urls", 3) == [
+        "CREATE TABLE IF NOT EXISTS short_urls_p000 PARTITION OF short_urls FOR VALUES WITH (MODULUS 3, REMAINDER 0)",
+        "CREATE TABLE IF NOT EXISTS short_urls_p001 PARTITION OF short_urls FOR VALUES WITH (MODULUS 3, REMAINDER 1)",
+        "CREATE TABLE IF NOT EXISTS short_urls_p002 PARTITION OF short_urls FOR VALUES WITH (MODULUS 3, REMAINDER 2)",
+    ]
+
+
+def test_partitioned_indexes_are_built_per_partition_and_attached():
+    assert partitioned_index_ddl(
+        "ix_short_urls_expires_at", "short_urls", "(expires_at)", ["short_urls_p000", "short_urls_p001"]
+    ) == [
+        "CREATE INDEX IF NOT EXISTS ix_short_urls_expires_at ON ONLY short_urls (expires_at)",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_short_urls_p000_expires_at ON short_urls_p000 (expires_at)",
+        "ALTER INDEX ix_short_urls_expires_at ATTACH PARTITION ix_short_urls_p000_expires_at",
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_short_urls_p001_expires_at ON short_urls_p001 (expires_at)",
+        "ALTER INDEX ix_short_urls_expires_at ATTACH PARTITION ix_short_urls_p001_expires_at",
+    ]
+
+
+# The model reads SHORT_URL_PARTITION_COUNT at import, so each setting gets a
+# fresh interpreter.
+def _short_urls_ddl(partitions: int) -> str:
+    script = (
+        "from sqlalchemy.dialects import postgresql\n"
+        "from sqlalchemy.schema import CreateTable\n"
+        "from app.models.url_models import ShortUrl\n"
+        "print(CreateTable(ShortUrl.__table__).compile(dialect=postgresql.dialect()))\n"
+    )
+    env = {**os.environ, "SHORT_URL_PARTITION_COUNT": str(partitions)}
+    result = subprocess.run(
+        [sys.executable, "-c", script], cwd=SERVICE_ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    return result.stdout
+
+
+def test_partitioned_table_is_keyed_on_id_and_short_code():
+    ddl = _short_urls_ddl(4)
+    assert "PRIMARY KEY (id, short_code)" in ddl
+    assert ddl.rstrip().endswith("PARTITION BY HASH (short_code)")
+
+    ddl = _short_urls_ddl(0)
+    assert "PRIMARY KEY (id)" in ddl
+    assert "PARTITION BY" not in ddl
+
+
+class RecordingConnection:
+    def __init__(self, existing: set[str] = frozenset()):
+        self.existing = existing
+        self.statements: list[str] = []
+
+    def execute(self, statement, parameters=None):
+        if parameters and "name" in parameters:
+            return _Scalar(parameters["name"] in self.existing)
+        self.statements.append(str(statement.compile(dialect=postgresql.dialect())))
+        return _Scalar(0)
+
+    def exec_driver_sql(self, statement):
+        self.statements.append(statement)
+
+
+class _Scalar:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+def test_prepare_builds_partitioned_copy_and_mirror_trigger():
+    conn = RecordingConnection()
+    partition_migration.prepare(conn, 4)
+    create_table, *rest = conn.statements
+
+    assert create_table.startswith("\nCREATE TABLE short_urls_new")
+    assert "nextval('short_urls_id_seq')" in create_table
+    assert "PRIMARY KEY (id, short_code)" in create_table
+    assert "PARTITION BY HASH (short_code)" in create_table
+    assert rest[:4] == hash_partition_ddl("short_urls_new", 4)
+    assert any("ix_short_urls_new_redirect_lookup" in statement for statement in rest)
+    assert "ON CONFLICT (short_code) DO UPDATE" in rest[-3]
+    assert rest[-1].startswith("CREATE TRIGGER short_urls_mirror_to_new_trg AFTER INSERT OR UPDATE OR DELETE")
+
+    # A second prepare leaves the copy alone and only reinstalls the trigger.
+    conn = RecordingConnection(existing={"short_urls_new"})
+    partition_migration.prepare(conn, 4)
+    assert not any(statement.lstrip().startswith("CREATE TABLE") for statement in conn.statements)
+
+
+def test_swap_renames_tables_indexes_and_partitions():
+    conn = RecordingConnection()
+    partition_migration.swap(conn, 2)
+    statements = conn.statements
+
+    assert statements[0] == "LOCK TABLE short_urls IN ACCESS EXCLUSIVE MODE"
+    assert statements.index("ALTER TABLE short_urls RENAME TO short_urls_unpartitioned") < statements.index(
+        "ALTER TABLE short_urls_new RENAME TO short_urls"
+    )
+    assert "ALTER INDEX ix_short_urls_new_redirect_lookup RENAME TO ix_short_urls_redirect_lookup" in statements
+    assert "ALTER TABLE short_urls_new_p001 RENAME TO short_urls_p001" in statements
+    assert statements[-1] == "ALTER SEQUENCE short_urls_id_seq OWNED BY short_urls.id"
@@ -0,0 +1,109 @@
+import asyncio
+import sys
+import time
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+
+from app.core import profiler
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.core.redis_keys import request_profile_key
+from app.core.settings import settings
+from app.middleware.profiling_middleware import ProfilingMiddleware
+
+
+def profiled_work():
+    deadline = time.perf_counter() + 0.005
+    while time.perf_counter() < deadline:
+        pass
+
+
+def other_work():
+    deadline = time.perf_counter() + 0.005
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_signed_requests_are_profiled_without_their_neighbours(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(RedisSingleton, "_instance", fakeredis.aioredis.FakeRedis(decode_responses=True))
+    monkeypatch.setattr(settings, "PROFILING_SECRET", "test-secret")
+    monkeypatch.setattr(settings, "PROFILING_INTERVAL_MS", 1.0)
+
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    # The two handlers take turns on the event loop; only the signed
+    # request's stacks may end up in its profile.
+    @app.get("/{name}")
+    async def work(name: str):
+        spin = profiled_work if name == "profiled" else other_work
+        for _ in range(20):
+            spin()
+            await asyncio.sleep(0)
+        return {}
+
+    token = profiler.sign_token(60)
+
+    async def _requests():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(
+                client.get("/profiled", headers={"X-Profile-Token": token}),
+                client.get("/other"),
+                client.get("/forged", headers={"X-Profile-Token": "9999999999.nonce.forged"}),
+            )
+            replayed = await client.get("/profiled", headers={"X-Profile-Token": token})
+            return (*responses, replayed)
+
+    switch_interval = sys.getswitchinterval()
+    profiled, other, forged, replayed = asyncio.run(_requests())
+    assert "x-profile-id" not in other.headers
+    assert "x-profile-id" not in forged.headers
+    # Each token profiles one request.
+    assert "x-profile-id" not in replayed.headers
+    assert sys.getswitchinterval() == switch_interval
+
+    body = asyncio.run(RedisSingleton._instance.get(request_profile_key(profiled.headers["x-profile-id"])))
+    stacks = {line.rsplit(" ", 1)[0] for line in body.splitlines()}
+    assert any("profiled_work" in stack for stack in stacks), body
+    assert not any("other_work" in stack for stack in stacks), body
+
+
+def test_expired_and_altered_tokens_are_refused(monkeypatch):
+    monkeypatch.setattr(settings, "PROFILING_SECRET", "test-secret")
+    token = profiler.sign_token(60)
+    assert profiler.verify_token(token)
+    assert profiler.verify_token(profiler.sign_token(60)) and profiler.sign_token(60) != token
+    assert not profiler.verify_token(profiler.sign_token(-1))
+    expires, nonce, signature = token.split(".")
+    assert not profiler.verify_token(f"{expires}.{nonce[::-1]}.{signature}")
+    monkeypatch.setattr(settings, "PROFILING_SECRET", None)
+    assert not profiler.verify_token("9999999999.anything")
+
+
+def test_worker_profiles_leave_the_switch_interval_alone():
+    switch_interval = sys.getswitchinterval()
+
+    async def _scenario():
+        profile = asyncio.create_task(profiler.profile_worker(0.05, 0.0001))
+        await asyncio.sleep(0.01)
+        during = sys.getswitchinterval()
+        return during, await profile
+
+    during, samples = asyncio.run(_scenario())
+    assert samples is not None
+    assert during == switch_interval
+
+
+def test_stored_profiles_answer_503_while_redis_is_down(monkeypatch):
+    from app.api.v1.routes import admin
+
+    async def _down(command, **kwargs):
+        raise RedisUnavailableError("circuit open")
+
+    monkeypatch.setattr(RedisSingleton, "execute", _down)
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(admin.get_request_profile("abc", current_user=None))
+    assert raised.value.status_code == 503
@@ -0,0 +1,120 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+
+from app.core.redis import RedisSingleton, RedisUnavailableError
+from app.db import routing
+from app.db.base import Base
+from app.db.routing import ReplicaPool, pin_user_to_primary_if_recent_write, record_user_write
+from app.db.session import SessionLocal
+from app.models.url_models import ShortUrl
+from app.repositories.short_url_repo import ShortUrlRepository
+
+
+@pytest.fixture
+def engines(tmp_path):
+    primary = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    replica = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    for db_engine in (primary, replica):
+        Base.metadata.create_all(db_engine)
+    yield primary, replica
+    primary.dispose()
+    replica.dispose()
+
+
+@pytest.fixture
+def db(engines):
+    primary, replica = engines
+    pool = ReplicaPool([replica], max_lag_seconds=5)
+    pool._healthy = [replica]
+    with SessionLocal(bind=primary, replicas=pool) as session:
+        yield session
+
+
+def _add(db_engine, short_code, user_id=1):
+    with SessionLocal(bind=db_engine, replicas=None) as session:
+        session.add(ShortUrl(
+            short_code=short_code,
+            original_url=f"https://example.com/{short_code}",
+            normalized_url=f"https://example.com/{short_code}",
+            user_id=user_id,
+        ))
+        session.commit()
+
+
+def test_marked_reads_go_to_the_replica(engines, db):
+    primary, replica = engines
+    _add(primary, "onprim")
+    _add(replica, "onrepl")
+    repo = ShortUrlRepository(db)
+
+    assert repo.get_by_code("onprim") is not None
+    assert [link.short_code for link in repo.list_by_user(1)[0]] == ["onrepl"]
+
+
+def test_miss_on_the_replica_is_retried_on_the_primary(engines, db):
+    primary, _ = engines
+    _add(primary, "fresh")
+    repo = ShortUrlRepository(db)
+
+    assert repo.get_by_code_active("fresh").short_code == "fresh"
+    assert repo.get_redirect_target("fresh").short_code == "fresh"
+    assert repo.get_by_code_active("nowhere") is None
+    # list_by_user has no retry: an empty page from the replica stands.
+    assert repo.list_by_user(1)[0] == []
+
+
+def test_session_sticks_to_the_primary_once_it_writes(engines, db):
+    primary, replica = engines
+    _add(replica, "onrepl")
+    repo = ShortUrlRepository(db)
+    assert repo.get_by_code_active("onrepl") is not None
+
+    repo.increment_clicks("onrepl")
+    assert db.info["sticky_primary"]
+    assert repo.get_by_code_active("onrepl") is None
+    assert db.get_bind() is primary
+
+
+def test_unhealthy_replicas_leave_reads_on_the_primary(engines, db):
+    primary, replica = engines
+    _add(primary, "onprim")
+    db.replicas._healthy = []
+    assert [link.short_code for link in ShortUrlRepository(db).list_by_user(1)[0]] == ["onprim"]
+
+
+@pytest.fixture
+def marker(monkeypatch):
+    state = {"exists": 0, "down": False}
+
+    async def _execute(command, stage="redis", binary=False):
+        if state["down"]:
+            raise RedisUnavailableError("down")
+        return state["exists"]
+
+    monkeypatch.setattr(RedisSingleton, "execute", _execute)
+    monkeypatch.setattr(routing, "_recent_writes", {})
+    return state
+
+
+def test_recent_writers_are_pinned_to_the_primary(db, marker):
+    async def _pinned(user_id):
+        db.info.pop("sticky_primary", None)
+        await pin_user_to_primary_if_recent_write(db, user_id)
+        return db.info.get("sticky_primary", False)
+
+    async def _scenario():
+        assert not await _pinned(7)
+
+        # A write in this worker, then one seen only through the Redis marker.
+        record_user_write(7)
+        assert await _pinned(7)
+        marker["exists"] = 1
+        assert await _pinned(8)
+
+        # Without Redis there is no telling, so the read stays on the primary.
+        marker["exists"], marker["down"] = 0, True
+        assert await _pinned(9)
+
+    asyncio.run(_scenario())
@@ -0,0 +1,79 @@
+import asyncio
+import uuid
+
+import pytest
+from redis.crc import key_slot
+
+from app.core.redis import RedisSingleton
+from app.core.redis_keys import (
+    rate_limit_key,
+    refresh_token_index_key,
+    refresh_token_key,
+    url_cache_key,
+)
+from app.core.security import (
+    is_refresh_token_valid,
+    revoke_all_user_tokens,
+    store_refresh_token,
+)
+from app.core.settings import settings
+
+
+requires_cluster = pytest.mark.skipif(
+    not settings.REDIS_CLUSTER_MODE,
+    reason="set REDIS_CLUSTER_MODE=true and REDIS_CLUSTER_NODES to run against a cluster",
+)
+
+
+def test_user_token_keys_share_a_slot():
+    slots = {
+        key_slot(refresh_token_key(42, str(uuid.uuid4())).encode())
+        for _ in range(20)
+    }
+    slots.add(key_slot(refresh_token_index_key(42).encode()))
+    assert len(slots) == 1
+
+
+def test_cache_and_rate_limit_keys_spread_across_slots():
+    cache_slots = {key_slot(url_cache_key(f"code{i}").encode()) for i in range(200)}
+    limit_slots = {key_slot(rate_limit_key(f"10.0.0.{i}").encode()) for i in range(200)}
+    assert len(cache_slots) > 100
+    assert len(limit_slots) > 100
+
+
+@requires_cluster
+def test_refresh_tokens_round_trip_on_cluster():
+    async def scenario():
+        user_id = int(uuid.uuid4().int % 1_000_000)
+        jtis = [str(uuid.uuid4()) for _ in range(3)]
+        for jti in jtis:
+            await store_refresh_token(user_id, jti)
+
+        assert all([await is_refresh_token_valid(user_id, jti) for jti in jtis])
+
+        await revoke_all_user_tokens(user_id)
+        assert not any([await is_refresh_token_valid(user_id, jti) for jti in jtis])
+        await RedisSingleton.close()
+
+    asyncio.run(scenario())
+
+
+@requires_cluster
+def test_binary_pipeline_across_slots_on_cluster():
+    async def scenario():
+        keys = [url_cache_key(f"cluster-{uuid.uuid4().hex[:8]}") for _ in range(10)]
+
+        async def _write_and_read(r):
+            async with r.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.setex(key, 30, b"\x00payload")
+                for key in keys:
+                    pipe.get(key)
+                return await pipe.execute()
+
+        results = await RedisSingleton.execute(_write_and_read, binary=True)
+        assert results[len(keys):] == [b"\x00payload"] * len(keys)
+        await RedisSingleton.execute(lambda r: r.delete(*keys[:1]), binary=True)
+        await RedisSingleton.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,131 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from app.core.redis import RedisSingleton
+from app.db.session import get_db
+from app.db.shard_admin import create_schema
+from app.models.url_models import ArchivedShortUrl, ShortUrl
+from app.repositories.short_url_repo import ShortUrlRepository
+from app.services.url_cache import local_url_cache
+
+
+NOW = datetime.now(timezone.utc)
+
+
+@pytest.fixture
+def db_engine(tmp_path):
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'links.db'}")
+    create_schema(db_engine)
+    with Session(db_engine) as db:
+        db.add_all([
+            _link("live"),
+            _link("later", expires_at=NOW + timedelta(days=1)),
+            _link("stale", expires_at=NOW - timedelta(minutes=1)),
+            _link("swept", expires_at=NOW - timedelta(minutes=1), is_active=False),
+            _link("off", is_active=False),
+            _link("cold", last_accessed_at=NOW - timedelta(days=90)),
+        ])
+        db.commit()
+        ShortUrlRepository(db).archive_idle(NOW - timedelta(days=30), limit=10)
+    yield db_engine
+    db_engine.dispose()
+
+
+@pytest.fixture
+def client(db_engine, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    from app.main import app
+
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(RedisSingleton, "_instance", fakeredis.aioredis.FakeRedis(server=server, decode_responses=True))
+    monkeypatch.setattr(RedisSingleton, "_binary_instance", fakeredis.aioredis.FakeRedis(server=server))
+    local_url_cache.clear()
+
+    def _db():
+        with Session(db_engine) as db:
+            yield db
+
+    app.dependency_overrides[get_db] = _db
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db)
+    local_url_cache.clear()
+
+
+@pytest.fixture
+def database_reads(monkeypatch):
+    reads = []
+    original = ShortUrlRepository.get_redirect_targets
+
+    def _counted(self, short_codes, **options):
+        reads.append(list(short_codes))
+        return original(self, short_codes, **options)
+
+    monkeypatch.setattr(ShortUrlRepository, "get_redirect_targets", _counted)
+    return reads
+
+
+def _link(short_code, expires_at=None, is_active=True, last_accessed_at=NOW):
+    return ShortUrl(
+        short_code=short_code,
+        original_url=f"https://example.com/{short_code}",
+        normalized_url=f"https://example.com/{short_code}",
+        expires_at=expires_at,
+        is_active=is_active,
+        last_accessed_at=last_accessed_at,
+    )
+
+
+def _resolve(client, codes):
+    return client.post("/api/v1/short-urls/resolve", json={"codes": codes})
+
+
+def test_batches_are_capped_at_a_thousand_codes(client):
+    assert _resolve(client, [f"c{i}" for i in range(1001)]).status_code == 422
+    assert _resolve(client, []).status_code == 422
+
+    response = _resolve(client, [f"c{i}" for i in range(1000)])
+    assert response.status_code == 200
+    assert len(response.json()["missing"]) == 1000
+
+
+def test_links_are_sorted_into_resolved_missing_and_expired(client):
+    response = _resolve(client, ["live", "live", "nope", "stale", "swept", "off", "later", "nope"])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body["links"]) == {"live", "later"}
+    assert body["links"]["live"] == {"url": "https://example.com/live", "redirect_type": 302}
+    # Duplicates are answered once, in the order first asked.
+    assert body["missing"] == ["nope", "off"]
+    assert body["expired"] == ["stale", "swept"]
+
+
+def test_archived_links_resolve_without_being_promoted(client, db_engine):
+    body = _resolve(client, ["cold"]).json()
+
+    assert body["links"]["cold"]["url"] == "https://example.com/cold"
+    with Session(db_engine) as db:
+        assert db.execute(select(ArchivedShortUrl.short_code)).scalars().all() == ["cold"]
+        assert db.execute(select(ShortUrl.id).where(ShortUrl.short_code == "cold")).first() is None
+
+
+def test_the_second_call_is_served_from_redis(client, database_reads):
+    first = _resolve(client, ["live", "later"]).json()
+    assert database_reads == [["live", "later"]]
+
+    local_url_cache.clear()
+    assert _resolve(client, ["live", "later"]).json() == first
+    assert len(database_reads) == 1
+
+
+def test_a_redis_outage_falls_back_to_the_local_cache(client, database_reads, monkeypatch):
+    first = _resolve(client, ["live", "later"]).json()
+
+    monkeypatch.setattr(RedisSingleton, "is_available", classmethod(lambda cls: False))
+    assert _resolve(client, ["live", "later"]).json() == first
+    assert len(database_reads) == 1
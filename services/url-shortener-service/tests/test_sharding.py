@@ -0,0 +1,160 @@
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import threading
+
+import pytest
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.orm import Session
+
+from app.core.settings import settings
+from app.db.shard_admin import create_schema, rebalance
+from app.db.sharding import STRATEGY_PREFIX, ShardRouter
+from app.models.url_models import ShortUrl
+from app.repositories.short_url_repo import ShortUrlRepository
+
+
+CODES = [f"c{i:05d}x" for i in range(3000)]
+
+
+def _router(names, **kwargs):
+    engines = {name: create_engine("sqlite://") for name in names}
+    return ShardRouter(engines, **kwargs)
+
+
+def test_hash_ring_only_moves_codes_to_the_new_shard():
+    before = _router(["s0", "s1", "s2"])
+    after = _router(["s0", "s1", "s2", "s3"])
+
+    moved = [code for code in CODES if before.shard_for(code) != after.shard_for(code)]
+
+    assert {after.shard_for(code) for code in moved} == {"s3"}
+    assert 0.1 < len(moved) / len(CODES) < 0.45
+    assert set(Counter(before.shard_for(code) for code in CODES)) == {"s0", "s1", "s2"}
+
+
+def test_prefix_routing_and_overrides():
+    router = _router(["s0", "s1"], strategy=STRATEGY_PREFIX, prefix_map={"a": "s0"})
+
+    assert router.shard_for("0abc") == "s0"
+    assert router.shard_for("1abc") == "s1"
+    assert router.shard_for("abc") == "s0"
+    assert router.shard_for("-weird") in {"s0", "s1"}
+
+    with pytest.raises(ValueError):
+        _router(["s0"], strategy=STRATEGY_PREFIX, prefix_map={"a": "missing"})
+
+
+def test_fan_out_reuses_one_thread_per_shard():
+    router = _router(["s0", "s1", "s2"])
+    threads = set()
+
+    def _where(db):
+        threads.add(threading.current_thread())
+        return db.get_bind().url.database
+
+    for _ in range(5):
+        assert router.fan_out(_where) == [None, None, None]
+    assert len(threads) <= 3
+    assert all(thread.name.startswith("shard-fan-out") for thread in threads)
+
+
+@pytest.fixture
+def shard_engines(tmp_path):
+    # Real Postgres shards when SHARD_DATABASE_URLS is set (see
+    # docker-compose.shards.yml), otherwise one SQLite file per shard.
+    if settings.SHARD_DATABASE_URLS:
+        engines = {name: create_engine(url) for name, url in settings.SHARD_DATABASE_URLS.items()}
+    else:
+        engines = {
+            f"s{i}": create_engine(f"sqlite:///{tmp_path / f'shard{i}.db'}")
+            for i in range(3)
+        }
+
+    for db_engine in engines.values():
+        create_schema(db_engine)
+        with db_engine.begin() as conn:
+            conn.execute(delete(ShortUrl.__table__))
+    yield engines
+    for db_engine in engines.values():
+        with db_engine.begin() as conn:
+            conn.execute(delete(ShortUrl.__table__))
+        db_engine.dispose()
+
+
+def _link(code: str, user_id: int, created_at: datetime) -> ShortUrl:
+    return ShortUrl(
+        short_code=code,
+        original_url=f"https://example.com/{code}",
+        normalized_url=f"https://example.com/{code}",
+        redirect_type=302,
+        user_id=user_id,
+        created_at=created_at,
+    )
+
+
+def test_repository_routes_and_fans_out(shard_engines):
+    router = ShardRouter(shard_engines)
+    db = Session()
+    repo = ShortUrlRepository(db, shards=router)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    for i, code in enumerate(CODES[:45]):
+        repo.create(_link(code, user_id=7, created_at=start + timedelta(minutes=i)))
+    repo.create(_link("other", user_id=8, created_at=start))
+
+    for name, db_engine in shard_engines.items():
+        with db_engine.connect() as conn:
+            codes = conn.execute(select(ShortUrl.short_code)).scalars().all()
+        assert codes
+        assert all(router.shard_for(code) == name for code in codes)
+
+    assert repo.exists(CODES[10])
+    assert repo.get_redirect_target(CODES[10]).original_url.endswith(CODES[10])
+    batch = repo.get_redirect_targets(CODES[:45:3] + ["missing"])
+    assert sorted(row.short_code for row in batch) == sorted(CODES[:45:3])
+    repo.increment_clicks(CODES[10])
+    assert repo.get_by_code(CODES[10]).click_count == 1
+
+    newest_first = list(reversed(CODES[:45]))
+    pages = [repo.list_by_user(7, page=page, page_size=20) for page in (1, 2, 3)]
+    assert [total for _, total in pages] == [45, 45, 45]
+    assert [link.short_code for items, _ in pages for link in items] == newest_first
+
+    repo.soft_delete(repo.get_by_code(CODES[0]))
+    items, total = repo.list_by_user(7, page=3, page_size=20)
+    assert total == 44
+    assert [link.short_code for link in items] == newest_first[40:44]
+    assert repo.list_by_user(7, include_inactive=True, page=3, page_size=20)[1] == 45
+
+    router.close_sessions(db)
+
+
+def test_rebalance_moves_rows_to_their_owner(shard_engines):
+    names = sorted(shard_engines)
+    old_router = ShardRouter({name: shard_engines[name] for name in names[:-1]})
+    router = ShardRouter(shard_engines)
+
+    db = Session()
+    old_repo = ShortUrlRepository(db, shards=old_router)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for i, code in enumerate(CODES[:200]):
+        old_repo.create(_link(code, user_id=1, created_at=start + timedelta(seconds=i)))
+    old_router.close_sessions(db)
+
+    planned = rebalance(router, batch_size=25, dry_run=True)
+    assert planned
+    assert {target for _, target in planned} == {names[-1]}
+
+    assert rebalance(router, batch_size=25) == planned
+    assert not rebalance(router, batch_size=25)
+
+    counts = {}
+    for name, db_engine in shard_engines.items():
+        with db_engine.connect() as conn:
+            counts[name] = conn.execute(select(func.count()).select_from(ShortUrl.__table__)).scalar()
+    assert sum(counts.values()) == 200
+    assert counts[names[-1]] == sum(planned.values())
+
+    repo = ShortUrlRepository(db, shards=router)
+    assert all(repo.get_by_code(code) is not None for code in CODES[:200])
+    router.close_sessions(db)
@@ -0,0 +1,143 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.events.constants import (
+    EVENT_URL_ACCESSED,
+    EVENT_URL_CREATED,
+    EVENT_URL_DELETED,
+    EVENT_URL_DISABLED,
+    EVENT_URL_ENABLED,
+    EVENT_URL_UPDATED,
+)
+from app.snapshot.format import SnapshotReader, write_snapshot
+from app.snapshot.store import RedirectSnapshot
+
+
+EXPIRES = datetime(2030, 1, 1, 12, 30, tzinfo=timezone.utc)
+
+
+def _entries(count):
+    codes = sorted((f"code{i}" for i in range(count)), key=str.encode)
+    return [
+        (code, f"https://example.com/{code}", 301 if i % 2 else 302, EXPIRES if i % 3 == 0 else None, True)
+        for i, code in enumerate(codes)
+    ]
+
+
+def test_round_trip_and_binary_search(tmp_path):
+    path = str(tmp_path / "redirects.snap")
+    entries = _entries(500)
+    assert write_snapshot(path, entries, "1700000000000-3") == 500
+
+    reader = SnapshotReader(path)
+    assert reader.count == 500
+    assert reader.stream_id == "1700000000000-3"
+    for code, url, redirect_type, expires_at, _ in entries:
+        entry = reader.lookup(code)
+        assert entry == (url, redirect_type, expires_at)
+
+    assert reader.lookup("code") is None
+    assert reader.lookup("zzz") is None
+    assert reader.lookup("a-code-that-is-too-long") is None
+    reader.close()
+
+
+def test_writer_rejects_unsorted_input_and_keeps_old_file(tmp_path):
+    path = str(tmp_path / "redirects.snap")
+    write_snapshot(path, _entries(3), "1-0")
+
+    with pytest.raises(ValueError):
+        write_snapshot(path, [("b", "https://b", 302, None, True), ("a", "https://a", 302, None, True)], "2-0")
+
+    assert SnapshotReader(path).stream_id == "1-0"
+    assert [p.name for p in tmp_path.iterdir()] == ["redirects.snap"]
+
+
+def test_deltas_overlay_the_snapshot_and_survive_reload(tmp_path):
+    path = str(tmp_path / "redirects.snap")
+    write_snapshot(path, [
+        ("base", "https://example.com/base", 302, None, True),
+        ("off", "https://example.com/off", 302, None, False),
+    ], "100-0")
+
+    snapshot = RedirectSnapshot(path)
+    snapshot.load()
+    assert snapshot.lookup("base").original_url == "https://example.com/base"
+    assert snapshot.lookup("off") is None
+    snapshot.apply_event("100-1", EVENT_URL_ENABLED, {"short_code": "off"})
+    assert snapshot.lookup("off").original_url == "https://example.com/off"
+
+    snapshot.apply_event("101-0", EVENT_URL_CREATED, {
+        "short_code": "fresh", "original_url": "https://example.com/fresh",
+        "redirect_type": 301, "expires_at": EXPIRES.isoformat(),
+    })
+    snapshot.apply_event("102-0", EVENT_URL_UPDATED, {"short_code": "base", "changes": {"redirect_type": 301}})
+    snapshot.apply_event("103-0", EVENT_URL_DISABLED, {"short_code": "fresh"})
+    snapshot.apply_event("104-0", EVENT_URL_ACCESSED, {"short_code": "base"})
+
+    assert snapshot.lookup("base").redirect_type == 301
+    assert snapshot.lookup("fresh") is None
+
+    snapshot.apply_event("105-0", EVENT_URL_ENABLED, {"short_code": "fresh"})
+    assert snapshot.lookup("fresh") == ("https://example.com/fresh", 301, EXPIRES)
+
+    # A rebuilt snapshot that already contains events up to 103-0 replaces
+    # the file; only the later events are replayed on top of it.
+    write_snapshot(path, [
+        ("base", "https://example.com/base", 301, None, True),
+        ("fresh", "https://example.com/fresh", 301, EXPIRES, False),
+    ], "103-0")
+    snapshot.apply_event("106-0", EVENT_URL_DELETED, {"short_code": "base"})
+    snapshot.load()
+
+    assert snapshot.status()["pending_deltas"] == 2
+    assert snapshot.lookup("base") is None
+    assert snapshot.lookup("fresh") == ("https://example.com/fresh", 301, EXPIRES)
+
+
+def test_compacted_deltas_rebuild_the_same_overlay(tmp_path):
+    path = str(tmp_path / "redirects.snap")
+    write_snapshot(path, [
+        ("base", "https://example.com/base", 302, None, True),
+        ("off", "https://example.com/off", 302, None, False),
+    ], "100-0")
+
+    events = [
+        ("101-0", EVENT_URL_ENABLED, {"short_code": "off"}),
+        ("102-0", EVENT_URL_UPDATED, {"short_code": "off", "changes": {"redirect_type": 301}}),
+        ("103-0", EVENT_URL_CREATED, {"short_code": "fresh", "original_url": "https://example.com/fresh"}),
+        ("104-0", EVENT_URL_DISABLED, {"short_code": "fresh"}),
+        ("105-0", EVENT_URL_UPDATED, {"short_code": "base", "changes": {"expires_at": EXPIRES.isoformat()}}),
+        ("106-0", EVENT_URL_DELETED, {"short_code": "gone"}),
+        ("107-0", EVENT_URL_UPDATED, {"short_code": "base", "changes": {"redirect_type": 301}}),
+        ("108-0", EVENT_URL_ENABLED, {"short_code": "fresh"}),
+    ] + [
+        (f"{110 + i}-0", EVENT_URL_UPDATED, {"short_code": "off", "changes": {"redirect_type": 302 if i % 2 else 303}})
+        for i in range(10)
+    ]
+    full, compacted = RedirectSnapshot(path), RedirectSnapshot(path, max_pending_deltas=6)
+    for snapshot in (full, compacted):
+        snapshot.load()
+        for event in events:
+            snapshot.apply_event(*event)
+
+    assert full.status()["pending_deltas"] == 18
+    assert compacted.status()["pending_deltas"] < 18
+
+    def _state(snapshot):
+        return {code: snapshot.lookup(code) for code in ("base", "off", "fresh", "gone")}
+
+    assert _state(compacted) == _state(full)
+    # A rebuilt snapshot covering part of the events replays the rest.
+    write_snapshot(path, [
+        ("base", "https://example.com/base", 302, EXPIRES, True),
+        ("fresh", "https://example.com/fresh", 302, None, False),
+        ("off", "https://example.com/off", 301, None, True),
+    ], "105-0")
+    for snapshot in (full, compacted):
+        snapshot.load()
+    assert _state(compacted) == _state(full)
+    assert _state(full)["base"] == ("https://example.com/base", 301, EXPIRES)
+    assert _state(full)["fresh"] == ("https://example.com/fresh", 302, None)
+    assert _state(full)["off"].redirect_type == 302
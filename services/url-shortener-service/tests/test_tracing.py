@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.core import tracing
+from app.core.redis import RedisSingleton
+from app.db.shard_admin import create_schema
+from app.db.sharding import ShardRouter
+from app.events.constants import STREAM_NAME
+from app.events.publisher import EventPublisher
+from app.models.url_models import ShortUrl
+from app.repositories.short_url_repo import ShortUrlRepository
+
+
+@pytest.fixture(scope="module")
+def spans():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    assert tracing.setup_tracing(exporter=exporter, sample_ratio=1.0)
+    yield exporter
+    tracing.enabled = False
+
+
+def test_repository_calls_and_redis_round_trips_are_spans(spans, tmp_path, monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    monkeypatch.setattr(RedisSingleton, "_instance", fakeredis.aioredis.FakeRedis(decode_responses=True))
+    spans.clear()
+
+    db_engine = create_engine(f"sqlite:///{tmp_path / 'links.db'}")
+    create_schema(db_engine)
+
+    async def _request():
+        with tracing.tracer.start_as_current_span("request") as root:
+            with Session(db_engine) as db:
+                repo = ShortUrlRepository(db, shards=ShardRouter({}))
+                repo.create(ShortUrl(short_code="abc", original_url="https://example.com", normalized_url="https://example.com"))
+                assert repo.get_redirect_target("abc").original_url == "https://example.com"
+            await EventPublisher().publish_raw("url.clicked", {"short_code": "abc"})
+            return root.get_span_context()
+
+    root = asyncio.run(_request())
+
+    finished = {span.name: span for span in spans.get_finished_spans()}
+    for name in ("ShortUrlRepository.create", "ShortUrlRepository.get_redirect_target", "EventPublisher.publish", "redis.publish"):
+        assert finished[name].context.trace_id == root.trace_id
+    assert finished["redis.publish"].parent.span_id == finished["EventPublisher.publish"].context.span_id
+
+    # The event carries the publishing span's context for the consumer.
+    [(_, fields)] = asyncio.run(RedisSingleton._instance.xrange(STREAM_NAME))
+    trace_id, span_id = fields["traceparent"].split("-")[1:3]
+    assert int(trace_id, 16) == root.trace_id
+    assert int(span_id, 16) == finished["EventPublisher.publish"].context.span_id
+
+
+def test_remote_sampled_flag_does_not_force_sampling(spans):
+    from opentelemetry.sdk.trace.sampling import Decision
+
+    # The sampled flag as any client could send it.
+    carrier = {"traceparent": "00-0000000000000000ffffffffffffffff-00f067aa0ba902b7-01"}
+    parent = tracing.propagate.extract(carrier)
+    trace_id = tracing.trace.get_current_span(parent).get_span_context().trace_id
+
+    def _decision(ratio, context=None):
+        return tracing._sampler(ratio).should_sample(context, trace_id, "GET").decision
+
+    assert _decision(0.0, parent) == Decision.DROP
+    assert _decision(1.0, parent) == Decision.RECORD_AND_SAMPLE
+    # Same trace id, same answer as a fresh root at that ratio.
+    assert _decision(0.5, parent) == _decision(0.5)
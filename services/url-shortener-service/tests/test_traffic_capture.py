@@ -0,0 +1,65 @@
+import asyncio
+import json
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core import traffic_capture
+from app.core.settings import settings
+from app.middleware.logging_middleware import LoggingMiddleware
+from tests.load.replay import load_records, replay
+
+
+def test_requests_are_captured_without_credentials(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TRAFFIC_CAPTURE_ENABLED", True)
+    app = FastAPI()
+    app.add_middleware(LoggingMiddleware)
+
+    @app.get("/{short_code}")
+    async def redirect(short_code: str):
+        return {"short_code": short_code}
+
+    path = traffic_capture.start(str(tmp_path))
+    try:
+        client = TestClient(app)
+        client.get("/abc?page=2&token=s3cret&email=a%40b.c", headers={"User-Agent": "curl/8", "Authorization": "Bearer secret"})
+        client.get("/def")
+    finally:
+        traffic_capture.stop()
+
+    first, second = [json.loads(line) for line in open(path)]
+    assert (first["m"], first["p"], first["q"], first["r"], first["s"]) == ("GET", "/abc", "page=2&token=&email=", "/{short_code}", 200)
+    assert first["h"] == {"user-agent": "curl/8", "accept": "*/*", "accept-encoding": "gzip, deflate"}
+    assert first["c"] == traffic_capture.anonymize_ip("testclient") != "testclient"
+    assert "q" not in second and second["ts"] >= first["ts"]
+
+
+def test_replay_keeps_the_gaps_between_requests(tmp_path):
+    capture = tmp_path / "requests-1.jsonl"
+    capture.write_text("".join(
+        json.dumps({"ts": 1000.0 + gap, "m": method, "p": f"/{code}", "r": "/{short_code}", "s": 200, "c": "00ab12cd"}) + "\n"
+        for gap, method, code in [(0.4, "GET", "c"), (0.0, "GET", "a"), (0.2, "POST", "x"), (0.2, "GET", "b")]
+    ))
+    records = load_records([str(capture)], {"GET"})
+    assert [record["p"] for record in records] == ["/a", "/b", "/c"]
+
+    app = FastAPI()
+    seen = []
+
+    @app.get("/{short_code}")
+    async def redirect(short_code: str, request: Request):
+        seen.append((short_code, request.headers["x-forwarded-for"]))
+        return {}
+
+    async def _replay():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://target") as client:
+            return await replay(client, records, speed=2.0, forward_client=True)
+
+    results = asyncio.run(_replay())
+
+    assert seen == [("a", "10.0.171.18"), ("b", "10.0.171.18"), ("c", "10.0.171.18")]
+    assert 0.2 <= results["elapsed_seconds"] < 0.35
+    route = results["routes"]["GET /{short_code}"]
+    assert (route["requests"], route["errors"], route["status_mismatches"]) == (3, 0, 0)